@@ -5,9 +5,9 @@ import base64
 from django.conf.urls import url
 from django.contrib.gis import admin
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse
 
 from jane.documents import models
+from jane.documents.storage import blob_response
 
 
 @admin.register(models.DocumentType)
@@ -137,11 +137,8 @@ class DocumentAdmin(admin.ModelAdmin):
 
     def download_view(self, request, pk):
         document = self.get_object(request, pk)
-        response = HttpResponse(document.data,
-                                content_type=document.content_type)
-        response['Content-Disposition'] = \
-            'attachment; filename="%s"' % (document.name)
-        return response
+        return blob_response(document, content_type=document.content_type,
+                             filename=document.name, request=request)
 
     def format_data(self, obj):
         if obj.id is None:
@@ -187,7 +184,7 @@ class DocumentIndexAttachmentInline(admin.TabularInline):
     def format_small_preview_image(self, obj):
         if obj.content_type != "image/png":
             return b""
-        data = base64.b64encode(obj.data)
+        data = base64.b64encode(obj.get_data())
         return '<img height="50" src="data:image/png;base64,%s" />' % (
             data.decode())
     format_small_preview_image.allow_tags = True
@@ -286,7 +283,7 @@ class DocumentIndexAttachmentAdmin(admin.ModelAdmin):
     def format_preview_image(self, obj):
         if obj.content_type != "image/png":
             return b""
-        data = base64.b64encode(obj.data)
+        data = base64.b64encode(obj.get_data())
         return '<img height="500" src="data:image/png;base64,%s" />' % (
             data.decode())
     format_preview_image.allow_tags = True
@@ -295,7 +292,7 @@ class DocumentIndexAttachmentAdmin(admin.ModelAdmin):
     def format_small_preview_image(self, obj):
         if obj.content_type != "image/png":
             return b""
-        data = base64.b64encode(obj.data)
+        data = base64.b64encode(obj.get_data())
         return '<img height="50" src="data:image/png;base64,%s" />' % (
             data.decode())
     format_small_preview_image.allow_tags = True
@@ -312,11 +309,9 @@ class DocumentIndexAttachmentAdmin(admin.ModelAdmin):
 
     def download_view(self, request, pk):
         attachment = self.get_object(request, pk)
-        response = HttpResponse(attachment.data,
-                                content_type=attachment.content_type)
-        response['Content-Disposition'] = \
-            'attachment; filename="%d"' % (attachment.id)
-        return response
+        return blob_response(attachment,
+                             content_type=attachment.content_type,
+                             filename=str(attachment.id), request=request)
 
     def format_data(self, obj):
         if obj.id is None:
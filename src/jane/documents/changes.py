@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Feed of the changes to documents and indices.
+
+Every creation, modification, and deletion of a document or index is
+appended to the ``Change`` log. Clients remember the cursor of the last
+change they have seen and ask for everything after it, optionally waiting
+for new changes to arrive. Index changes that the user is not allowed to
+see are skipped.
+
+Transactions do not commit in the order in which they draw primary keys, so
+a change with a smaller primary key can become visible after the cursor
+already moved past it. The changes are thus ordered by the id of the
+writing transaction and only returned once all older transactions have
+finished. The cursor is still the primary key of the last change.
+"""
+import collections
+import json
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.reverse import reverse
+
+from jane.documents import models
+
+
+# Seconds between checks for new changes while waiting.
+POLL_INTERVAL = 1.0
+
+
+def _get_queryset(since, document_type=None):
+    """
+    The finished changes after a cursor in the order of the feed.
+
+    A change is finished if no older transaction is still running. Those of
+    the own transaction count as finished as well - uncommitted changes of
+    other transactions are not visible anyway.
+    """
+    queryset = models.Change.objects.extra(where=[
+        "documents_change.txid <= "
+        "txid_snapshot_xmin(txid_current_snapshot())"])
+    if since:
+        txid = models.Change.objects.filter(pk=since).values_list(
+            "txid", flat=True).first()
+        if txid is None:
+            queryset = queryset.filter(pk__gt=since)
+        else:
+            queryset = queryset.filter(
+                Q(txid__gt=txid) | Q(txid=txid, pk__gt=since))
+    if document_type:
+        queryset = queryset.filter(document_type=document_type)
+    return queryset.order_by("txid", "pk")
+
+
+def get_latest_cursor():
+    """
+    Cursor of the most recent change.
+    """
+    latest = _get_queryset(0).reverse().values_list("pk", flat=True).first()
+    return latest or 0
+
+
+def _hide_invisible_indices(changes, user):
+    """
+    Remove the creations and updates of indices the user cannot see. Those
+    of already deleted indices are removed as well - their deletion follows.
+    """
+    ids = collections.defaultdict(set)
+    for change in changes:
+        if change.object_type == models.Change.INDEX and \
+                change.action != models.Change.DELETE:
+            ids[change.document_type_id].add(change.object_id)
+
+    visible = set()
+    for document_type, pks in ids.items():
+        visible.update(
+            (document_type, _i) for _i in
+            models.DocumentIndex.objects.get_filtered_queryset(
+                document_type=document_type, user=user).filter(
+                pk__in=pks).values_list("pk", flat=True))
+
+    return [_i for _i in changes
+            if _i.object_type != models.Change.INDEX or
+            _i.action == models.Change.DELETE or
+            (_i.document_type_id, _i.object_id) in visible]
+
+
+def get_changes(since, user, document_type=None, limit=100):
+    """
+    The changes after a cursor.
+
+    Returns the changes visible to the user, the cursor to continue from,
+    and if there are more changes after it.
+
+    :param since: The cursor.
+    :param user: The user asking for the changes.
+    :param document_type: Only changes of this document type if given.
+    :param limit: Maximum number of changes to look at.
+    """
+    changes = list(_get_queryset(since, document_type)[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1].pk if changes else since
+    return _hide_invisible_indices(changes, user), cursor, has_more
+
+
+def wait_for_changes(since, document_type=None, timeout=None):
+    """
+    Wait until there are changes after a cursor or the timeout passed.
+    Returns True if there are new changes.
+    """
+    if timeout is None:
+        timeout = settings.JANE_CHANGES_MAX_WAIT
+    end = time.time() + timeout
+    while True:
+        # A new snapshot each time.
+        if _get_queryset(since, document_type).exists():
+            return True
+        if time.time() >= end:
+            return False
+        time.sleep(min(POLL_INTERVAL, max(end - time.time(), 0)))
+
+
+def serialize_change(change, request):
+    if change.action == models.Change.DELETE:
+        url = None
+    elif change.object_type == models.Change.DOCUMENT:
+        url = reverse("rest_documents-detail",
+                      kwargs={"document_type": change.document_type_id,
+                              "name": change.name}, request=request)
+    else:
+        url = reverse("rest_document_indices-detail",
+                      kwargs={"document_type": change.document_type_id,
+                              "pk": change.object_id}, request=request)
+    return collections.OrderedDict([
+        ("id", change.pk),
+        ("document_type", change.document_type_id),
+        ("object_type", change.object_type),
+        ("action", change.action),
+        ("object_id", change.object_id),
+        ("name", change.name),
+        ("url", url),
+        ("created_at", change.created_at)])
+
+
+def stream_changes(since, user, request, document_type=None):
+    """
+    Generator yielding the changes as server-sent events for
+    ``JANE_CHANGES_MAX_WAIT`` seconds. Browsers reconnect afterwards and
+    continue after the last event.
+    """
+    yield b"retry: 1000\n\n"
+    end = time.time() + settings.JANE_CHANGES_MAX_WAIT
+    while time.time() < end:
+        changes, since, has_more = get_changes(
+            since, user=user, document_type=document_type)
+        for change in changes:
+            yield ("id: %i\nevent: change\ndata: %s\n\n" % (
+                change.pk, json.dumps(serialize_change(change, request),
+                                      cls=DjangoJSONEncoder))).encode()
+        if not has_more:
+            # Keeps the connection alive.
+            yield b": ping\n\n"
+            time.sleep(POLL_INTERVAL)
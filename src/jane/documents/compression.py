@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Optional compression of the document data at rest.
+
+The XML documents stored in Jane compress very well. If the
+``JANE_DOCUMENT_COMPRESSION`` setting is set, the data of new documents is
+compressed before it is stored. The sha1 hash and the file size always refer
+to the uncompressed data. Clients accepting the used encoding are served the
+compressed data as is.
+
+``"gzip"`` only requires the standard library, ``"zstd"`` requires the
+``zstandard`` module.
+"""
+import gzip
+import io
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+COMPRESSION_METHODS = ("gzip", "zstd")
+
+
+def _get_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImproperlyConfigured(
+            "zstd compression requires the 'zstandard' module.")
+    return zstandard
+
+
+def get_compression_method():
+    """
+    Returns the compression method for new documents or None.
+    """
+    method = getattr(settings, "JANE_DOCUMENT_COMPRESSION", None)
+    if method and method not in COMPRESSION_METHODS:
+        raise ImproperlyConfigured(
+            "JANE_DOCUMENT_COMPRESSION must be one of %s." %
+            ", ".join(COMPRESSION_METHODS))
+    return method or None
+
+
+def compress(data, method):
+    """
+    Compress the data with the given method.
+    """
+    if method == "gzip":
+        # Fixed mtime so the same data always results in the same bytes.
+        # gzip.compress() only accepts the mtime from Python 3.8 on.
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6,
+                           mtime=0) as fh:
+            fh.write(data)
+        return buf.getvalue()
+    elif method == "zstd":
+        return _get_zstandard().ZstdCompressor(level=10).compress(data)
+    raise ValueError("Unknown compression method '%s'." % method)
+
+
+def open_decompressed(fh, method):
+    """
+    Wraps a binary file-like object with compressed data so it can be read
+    as uncompressed data. Closing the returned object closes ``fh``.
+    """
+    if not method:
+        return fh
+    elif method == "gzip":
+        # Decompresses while reading. Still seekable which is needed for the
+        # validators.
+        return _ClosingGzipFile(fh)
+    elif method == "zstd":
+        # Seeking backwards is not supported by the zstandard streams thus
+        # the data is decompressed all at once.
+        with fh:
+            reader = _get_zstandard().ZstdDecompressor().stream_reader(fh)
+            return io.BytesIO(reader.read())
+    raise ValueError("Unknown compression method '%s'." % method)
+
+
+def decompress(data, method):
+    """
+    Decompress bytes compressed with the given method.
+    """
+    with open_decompressed(io.BytesIO(data), method) as fh:
+        return fh.read()
+
+
+def accepts_encoding(request, method):
+    """
+    True if the client of the request accepts the given content encoding.
+    """
+    if request is None or not method:
+        return False
+    accept = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    for item in accept.split(","):
+        parts = [_i.strip() for _i in item.split(";")]
+        if parts[0].lower() != method:
+            continue
+        # Explicitly refused with q=0.
+        for param in parts[1:]:
+            match = re.match(r"^q=([0-9.]+)$", param)
+            if match and float(match.group(1)) == 0:
+                return False
+        return True
+    return False
+
+
+class _ClosingGzipFile(gzip.GzipFile):
+    """
+    GzipFile does not close a file object passed to it - this one does.
+    """
+    def __init__(self, fh):
+        super().__init__(fileobj=fh, mode="rb")
+        self._raw = fh
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw.close()
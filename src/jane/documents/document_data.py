@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+The data of a document while it is being validated and indexed.
+
+Upon saving a document, a single ``DocumentData`` object is passed to all
+validators and the indexer. It is a normal binary file-like object so
+plug-ins can treat it as such, but XML based plug-ins can additionally use
+the ``xml_tree`` attribute which is parsed at most once. Compiled XML
+schemas are cached for the lifetime of the process.
+"""
+import io
+import os
+import threading
+
+from lxml import etree
+
+
+class DocumentData(io.BytesIO):
+    """
+    In-memory file-like object with the uncompressed data of a document.
+    """
+    _xml_tree = None
+
+    @property
+    def xml_tree(self):
+        """
+        The data parsed as an lxml tree. Raises an XMLSyntaxError if it is
+        not a valid XML file.
+        """
+        if self._xml_tree is None:
+            # getvalue() does not copy the data as long as the buffer is not
+            # modified.
+            self._xml_tree = etree.ElementTree(
+                etree.fromstring(self.getvalue()))
+        return self._xml_tree
+
+
+def get_xml_tree(document):
+    """
+    Returns the parsed lxml tree of a document that is either a
+    ``DocumentData`` object or any other file-like object.
+    """
+    if isinstance(document, DocumentData):
+        return document.xml_tree
+    document.seek(0, 0)
+    return etree.parse(document)
+
+
+# Schemas must not be shared across threads.
+_SCHEMAS = threading.local()
+
+
+def get_xml_schema(filename):
+    """
+    Returns the compiled schema in a file. RelaxNG schemas must have the
+    ``.rng`` extension, all others are treated as XMLSchemas. Compiling the
+    large schemas takes a while thus they are cached.
+    """
+    cache = getattr(_SCHEMAS, "cache", None)
+    if cache is None:
+        cache = _SCHEMAS.cache = {}
+    if filename not in cache:
+        schema = etree.parse(filename)
+        if os.path.splitext(filename)[1].lower() == ".rng":
+            cache[filename] = etree.RelaxNG(schema)
+        else:
+            cache[filename] = etree.XMLSchema(schema)
+    return cache[filename]
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming export of document indices.
+
+The indices are written as a GeoJSON FeatureCollection or as newline
+delimited GeoJSON features (NDJSON) straight from a server-side cursor so
+the first feature is sent right away and the memory use does not depend on
+the number of indices. PostgreSQL creates the JSON of the properties and
+geometries - Python only concatenates strings.
+"""
+import uuid
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from jane.exceptions import JaneInvalidRequestException
+
+
+EXPORT_FORMATS = {
+    "geojson": "application/geo+json",
+    "ndjson": "application/x-ndjson"
+}
+
+# All geometries or only the first point of each index.
+GEOMETRY_SQL = {
+    "full": "ST_AsGeoJSON(geometry::geometry, 6)",
+    "point": "ST_AsGeoJSON(ST_GeometryN(ST_CollectionExtract("
+             "geometry::geometry, 1), 1), 6)"
+}
+
+# Number of rows fetched from the server-side cursor at once.
+FETCH_SIZE = 2000
+
+
+def get_export_queryset(queryset, meta, fields=None, geometry="full"):
+    """
+    Reduce a queryset of indices to the id, the properties, and the
+    geometry of each index as JSON strings.
+
+    :param queryset: The already filtered queryset.
+    :param meta: The meta attribute of the indexer.
+    :param fields: List of keys in the JSON to export. All if not given.
+    :param geometry: ``"full"`` or ``"point"``.
+    """
+    if geometry not in GEOMETRY_SQL:
+        raise JaneInvalidRequestException(
+            "'geometry' must be one of: %s" % ", ".join(
+                sorted(GEOMETRY_SQL.keys())))
+
+    if fields:
+        unknown = [_i for _i in fields if _i not in meta]
+        if unknown:
+            raise JaneInvalidRequestException(
+                "Unknown fields: %s" % ", ".join(unknown))
+        properties = RawSQL(
+            "jsonb_build_object(%s)::text" % ", ".join(
+                ["%s, json->%s"] * len(fields)),
+            [_j for _i in fields for _j in (_i, _i)])
+    else:
+        properties = RawSQL("json::text", [])
+
+    return queryset.annotate(
+        export_properties=properties,
+        export_geometry=RawSQL(GEOMETRY_SQL[geometry], [])).values_list(
+        "id", "export_properties", "export_geometry")
+
+
+def _iter_batches(queryset):
+    # Django 1.9 always fetches all rows of a query into memory, thus use a
+    # named cursor which has to live within a transaction.
+    sql, params = queryset.query.sql_with_params()
+    with transaction.atomic():
+        connection.ensure_connection()
+        cursor = connection.connection.cursor(
+            name="jane_export_%s" % uuid.uuid4().hex)
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
+def _feature(row):
+    return '{"type":"Feature","id":%i,"geometry":%s,"properties":%s}' % (
+        row[0], row[2] or "null", row[1])
+
+
+def stream_export(queryset, export_format):
+    """
+    Generator yielding the chunks of the export of an export queryset.
+
+    :param queryset: Queryset returned by ``get_export_queryset()``.
+    :param export_format: ``"geojson"`` or ``"ndjson"``.
+    """
+    if export_format == "ndjson":
+        for rows in _iter_batches(queryset):
+            yield "".join(_feature(_i) + "\n" for _i in rows).encode("utf-8")
+        return
+
+    yield b'{"type":"FeatureCollection","features":['
+    first = True
+    for rows in _iter_batches(queryset):
+        chunk = ",\n".join(_feature(_i) for _i in rows)
+        yield (("\n" if first else ",\n") + chunk).encode("utf-8")
+        first = False
+    yield b"\n]}\n"
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Asynchronous indexing of documents.
+
+Uploads with the ``Prefer: respond-async`` header are only validated and
+stored if ``JANE_ASYNC_INDEXING`` is enabled. Their indexing is queued as an
+``IndexingJob`` in the database and done by a pool of local worker
+processes started with the ``run_indexing_workers`` management command. No
+external message broker is needed - the workers claim jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of them can run in
+parallel. Jobs of the same document wait for each other as indexing locks
+the document.
+"""
+import datetime
+import multiprocessing
+import signal
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from jane.documents import models, signals
+
+
+class IndexingTimeout(Exception):
+    pass
+
+
+def wants_async_indexing(request):
+    """
+    True if the document of an upload request should be indexed
+    asynchronously.
+    """
+    if not settings.JANE_ASYNC_INDEXING:
+        return False
+    prefer = request.META.get("HTTP_PREFER", "")
+    return "respond-async" in [_i.strip().lower() for _i in
+                               prefer.split(",")]
+
+
+def enqueue(document, user):
+    """
+    Queue a document for indexing. Returns the job.
+    """
+    return models.IndexingJob.objects.create(document=document,
+                                             created_by=user)
+
+
+def get_queue_status():
+    """
+    The number of jobs per status.
+    """
+    counts = dict(models.IndexingJob.objects.order_by().values_list(
+        "status").annotate(count=Count("pk")))
+    return {_i[0]: counts.get(_i[0], 0)
+            for _i in models.IndexingJob.STATUS_CHOICES}
+
+
+def claim_job():
+    """
+    Claim the oldest queued job. Returns its id or None if the queue is
+    empty.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("""
+            UPDATE documents_indexingjob SET status = %s, started_at = %s
+            WHERE id = (
+                SELECT id FROM documents_indexingjob
+                WHERE status = %s
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1)
+            RETURNING id
+        """, [models.IndexingJob.RUNNING, timezone.now(),
+              models.IndexingJob.QUEUED])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def requeue_stale_jobs(timeout):
+    """
+    Put jobs back into the queue whose worker died without finishing them.
+    """
+    cutoff = timezone.now() - datetime.timedelta(seconds=2 * timeout)
+    return models.IndexingJob.objects.filter(
+        status=models.IndexingJob.RUNNING, started_at__lt=cutoff).update(
+        status=models.IndexingJob.QUEUED, started_at=None)
+
+
+def _raise_timeout(signum, frame):
+    raise IndexingTimeout()
+
+
+def run_job(job_id, timeout):
+    """
+    Index the document of a job in the current process.
+    """
+    job = models.IndexingJob.objects.select_related("document").get(
+        pk=job_id)
+    # The indices are written within a single transaction thus a timeout
+    # does not leave half-written indices behind.
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.alarm(timeout)
+    try:
+        signals.index_document(sender=None, instance=job.document,
+                               created=None)
+    except IndexingTimeout:
+        job.status = models.IndexingJob.FAILED
+        job.error = "Indexing did not finish within %i seconds." % timeout
+    except Exception:
+        job.status = models.IndexingJob.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = models.IndexingJob.DONE
+    finally:
+        signal.alarm(0)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+    return job
+
+
+def worker(timeout, poll_interval):
+    """
+    Main loop of a single worker process.
+    """
+    # Never share database connections with the parent process.
+    connections.close_all()
+    while True:
+        job_id = claim_job()
+        if job_id is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(job_id, timeout=timeout)
+
+
+def run_workers(count, timeout, poll_interval=1.0):
+    """
+    Start a number of worker processes and wait for them. Workers that die
+    are restarted.
+    """
+    requeue_stale_jobs(timeout)
+    connections.close_all()
+
+    def _start():
+        p = multiprocessing.Process(target=worker,
+                                    args=(timeout, poll_interval))
+        p.daemon = True
+        p.start()
+        return p
+
+    processes = [_start() for _ in range(count)]
+    while True:
+        time.sleep(poll_interval)
+        processes = [_i if _i.is_alive() else _start() for _i in processes]
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Expression indices for the JSON document indices.
+
+Each indexer plug-in declares the type of its searchable keys in its
+``meta`` attribute. The queries in the ``DocumentIndexManager`` cast the JSON
+values to exactly these types so Jane creates one matching expression index
+per key and type. Retrieve permission plug-ins that define an
+``index_predicate`` additionally get partial indices on all time keys so
+queries of users without that permission can also use an index.
+
+The indices are only built by the ``update_json_indices`` management
+command. Both creating and dropping them happens ``CONCURRENTLY`` so writes
+to the document indices are not blocked while an index is built, which
+however is not possible within a transaction.
+"""
+import hashlib
+import re
+
+from django.db import connection
+
+
+# All indices managed by Jane share this prefix. Indices with this prefix
+# that are no longer required will be dropped.
+INDEX_PREFIX = "documents_ji_"
+
+# The SQL expression for each type. The queries must use the very same
+# expressions, otherwise PostgreSQL will not use the indices. Casting a
+# string to a timestamp is not immutable in PostgreSQL and thus cannot be
+# indexed - the jane_to_timestamp() function is created in a migration.
+JSON_INDEX_EXPRESSIONS = {
+    "int": "CAST(json->>'%s' AS INTEGER)",
+    "float": "CAST(json->>'%s' AS REAL)",
+    "str": "LOWER(json->>'%s')",
+    "bool": "CAST(json->>'%s' AS BOOL)",
+    "UTCDateTime": "jane_to_timestamp(json->>'%s')"
+}
+
+# String keys are only queried for (in)equality and with LIKE patterns,
+# both of which can be served by the pattern operator class.
+JSON_INDEX_OPCLASSES = {
+    "str": "text_pattern_ops"
+}
+
+# Partial indices for the retrieve permissions are only created for keys of
+# these types.
+PARTIAL_INDEX_TYPES = ("UTCDateTime",)
+
+_VALID_KEY = re.compile(r"^\w+$")
+
+
+def get_json_index_definitions(meta, predicates=None):
+    """
+    Get the definitions of all expression indices for one document type.
+
+    Returns a dictionary mapping the index names to their CREATE INDEX
+    statements.
+
+    :param meta: The meta attribute of an indexer plug-in.
+    :param predicates: List of SQL predicates. For each, partial indices
+        will be defined for all time keys.
+    """
+    definitions = {}
+    for key, value_type in sorted(meta.items()):
+        if not _VALID_KEY.match(key):
+            raise ValueError("Invalid index key '%s'." % key)
+        expression = JSON_INDEX_EXPRESSIONS[value_type] % key
+        if value_type in JSON_INDEX_OPCLASSES:
+            expression = "(%s) %s" % (expression,
+                                      JSON_INDEX_OPCLASSES[value_type])
+        else:
+            expression = "(%s)" % expression
+
+        where = [None]
+        if value_type in PARTIAL_INDEX_TYPES:
+            where.extend(predicates or [])
+
+        for predicate in where:
+            identifier = "%s|%s" % (expression, predicate)
+            name = "%s%s_%s" % (
+                INDEX_PREFIX, key[:30],
+                hashlib.sha1(identifier.encode()).hexdigest()[:10])
+            sql = ("CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON "
+                   "documents_documentindex (%s)" % (name, expression))
+            if predicate:
+                sql += " WHERE %s" % predicate
+            definitions[name] = sql
+    return definitions
+
+
+def update_json_indices():
+    """
+    Make sure all expression indices required by the currently installed
+    plug-ins exist and drop the ones that are no longer needed.
+
+    Returns a tuple with the names of the created and the dropped indices.
+    """
+    if connection.in_atomic_block:
+        raise RuntimeError("The JSON expression indices cannot be updated "
+                           "within a transaction.")
+
+    # Avoid circular imports.
+    from jane.documents import models
+
+    required = {}
+    for document_type in models.DocumentType.objects.all():
+        meta = document_type.indexer.get_plugin().meta
+        predicates = []
+        for perm in document_type.retrieve_permissions.all():
+            predicate = getattr(perm.get_plugin(), "index_predicate", None)
+            if predicate:
+                predicates.append(predicate)
+        required.update(get_json_index_definitions(meta, predicates))
+
+    with connection.cursor() as cursor:
+        # Interrupted concurrent builds leave invalid indices behind. They
+        # are dropped and built again.
+        cursor.execute("""
+            SELECT c.relname, i.indisvalid FROM pg_index i
+            INNER JOIN pg_class c ON c.oid = i.indexrelid
+            INNER JOIN pg_class t ON t.oid = i.indrelid
+            WHERE t.relname = 'documents_documentindex'
+            AND c.relname LIKE %s
+        """, [INDEX_PREFIX.replace("_", r"\_") + "%"])
+        existing = dict(cursor.fetchall())
+
+        created = sorted(_i for _i in required if not existing.get(_i))
+        dropped = sorted(_i for _i in existing if _i not in required)
+
+        for name in dropped + [_i for _i in created if _i in existing]:
+            cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS %s" % name)
+        for name in created:
+            cursor.execute(required[name])
+
+    return created, dropped
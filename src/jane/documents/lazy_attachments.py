@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Attachments created on demand.
+
+Indexer plug-ins can declare attachments that are only created the first
+time they are requested, e.g. the response plots of the StationXML plug-in.
+They are cached on disk in ``JANE_LAZY_ATTACHMENT_ROOT`` under a key chosen
+by the plug-in so identical attachments of different indices are only
+created once. The ``render_lazy_attachments`` management command creates
+them in advance.
+"""
+from django.conf import settings
+
+from jane.documents.storage import FileSystemBlobStorage
+
+
+_STORAGE = {}
+
+
+def get_lazy_attachment_storage():
+    root = settings.JANE_LAZY_ATTACHMENT_ROOT
+    if root not in _STORAGE:
+        _STORAGE[root] = FileSystemBlobStorage(root=root)
+    return _STORAGE[root]
+
+
+def render_lazy_attachments(document, category, indices):
+    """
+    Create and cache the lazy attachments of some indices of a document
+    that are not yet cached. The document is only parsed once.
+
+    Returns a dictionary mapping the primary key of each index to the path
+    of its attachment, or None if it has none.
+
+    :param document: The document.
+    :param category: The category of the attachments.
+    :param indices: List of the indices of the document.
+    """
+    indexer = document.document_type.indexer.get_plugin()
+    storage = get_lazy_attachment_storage()
+
+    paths = {}
+    missing = {}
+    for index in indices:
+        key = indexer.get_lazy_attachment_key(category, index.json)
+        if key is None:
+            paths[index.pk] = None
+        elif storage.exists(key):
+            paths[index.pk] = storage.path(key)
+        else:
+            missing.setdefault(key, []).append(index)
+
+    if missing:
+        keys = sorted(missing.keys())
+        with document.open_data() as fh:
+            data = indexer.create_lazy_attachments(
+                category, fh, [missing[_i][0].json for _i in keys])
+        for key, value in zip(keys, data):
+            if value is not None:
+                storage.save(key, value)
+            path = storage.path(key) if value is not None else None
+            for index in missing[key]:
+                paths[index.pk] = path
+    return paths
+
+
+def get_lazy_attachment(index, category):
+    """
+    Path of the lazy attachment of a single index, created if necessary.
+    None if the index has no such attachment.
+    """
+    return render_lazy_attachments(index.document, category,
+                                   [index])[index.pk]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from jane.documents import models, serializer
+from jane.jane import renderers
+
+
+def _serialize_default(document_type, request, limit):
+    indices = models.DocumentIndex.objects.get_filtered_queryset(
+        document_type=document_type)[:limit]
+    data = serializer.DocumentIndexSerializer(
+        indices, many=True, context={"request": request}).data
+    return JSONRenderer().render(data)
+
+
+def _serialize_fast(document_type, request, limit):
+    fast_serializer = serializer.FastDocumentIndexSerializer(
+        document_type=document_type, request=request)
+    indices = models.DocumentIndex.objects.get_filtered_queryset(
+        document_type=document_type).values(*fast_serializer.values)[:limit]
+    data = fast_serializer.serialize(indices)
+    if renderers.orjson is not None:
+        return renderers.ORJSONRenderer().render(data)
+    return JSONRenderer().render(data)
+
+
+class Command(BaseCommand):
+    help = ("Compare the speed of the default and the fast serialization "
+            "of document indices.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'document_type', type=str,
+            choices=[_i.name for _i in models.DocumentType.objects.all()],
+            help='The document type.')
+        parser.add_argument(
+            '--limit', type=int, default=10000,
+            help='Number of indices to serialize.')
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Number of runs. The fastest one counts.')
+
+    def handle(self, *args, **kwargs):
+        document_type = kwargs["document_type"]
+        limit = kwargs["limit"]
+        request = RequestFactory().get(
+            "/rest/document_indices/%s" % document_type)
+
+        results = []
+        for name, function in (("default", _serialize_default),
+                               ("fast", _serialize_fast)):
+            times = []
+            for _ in range(max(kwargs["repeat"], 1)):
+                start = time.time()
+                output = function(document_type, request, limit)
+                times.append(time.time() - start)
+            results.append(output)
+            count = len(json.loads(output.decode()))
+            print("%-8s %i indices in %.3f seconds (%.0f indices/s, "
+                  "%.1f MB)" % (name, count, min(times),
+                                count / min(times) if min(times) else 0.0,
+                                len(output) / 1024.0 ** 2))
+
+        if json.loads(results[0].decode()) != json.loads(results[1].decode()):
+            print("WARNING: The outputs differ!")
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from jane.documents import models
+from jane.documents.compression import compress, get_compression_method
+from jane.documents.storage import get_blob_key, get_blob_storage, open_blob
+
+
+CHUNK_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = ("Compress the data of all existing uncompressed documents with "
+            "the method set in JANE_DOCUMENT_COMPRESSION.")
+
+    def handle(self, *args, **kwargs):
+        method = get_compression_method()
+        if not method:
+            raise CommandError("JANE_DOCUMENT_COMPRESSION is not set.")
+        storage = get_blob_storage()
+
+        count = 0
+        queryset = models.Document.objects.filter(compression="")
+        while True:
+            # The compressed documents no longer match the queryset.
+            pks = list(queryset.values_list("pk", flat=True)[:CHUNK_SIZE])
+            if not pks:
+                break
+            values = models.Document.objects.filter(pk__in=pks).values_list(
+                "pk", "data", "sha1")
+            with transaction.atomic():
+                for pk, data, sha1 in values:
+                    with open_blob(data, sha1) as fh:
+                        compressed = compress(fh.read(), method)
+                    # Update so nothing is validated or reindexed. The
+                    # sha1 hash and file size refer to the uncompressed data
+                    # and stay the same.
+                    if data is None:
+                        storage.save(get_blob_key(sha1, method), compressed)
+                        models.Document.objects.filter(pk=pk).update(
+                            compression=method)
+                    else:
+                        models.Document.objects.filter(pk=pk).update(
+                            data=compressed, compression=method)
+                    count += 1
+            print('.', end='', flush=True)
+
+        print("\nCompressed %i documents." % count)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from jane.documents import models
+from jane.documents.storage import get_blob_key, get_blob_storage
+
+
+CHUNK_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = ("Move the data of all documents and attachments between the "
+            "database and the configured blob storage.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to-database', action='store_true',
+            help='Move the data from the blob storage back to the database. '
+                 'Do this before switching back to the database backend.')
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Delete all files in the blob storage that are no longer '
+                 'referenced by any document or attachment.')
+
+    def handle(self, *args, **kwargs):
+        storage = get_blob_storage()
+        if storage.stores_in_database:
+            raise CommandError(
+                "The configured blob storage backend stores the data in the "
+                "database. Set JANE_BLOB_STORAGE_BACKEND first.")
+
+        for model in (models.Document, models.DocumentIndexAttachment):
+            if kwargs["to_database"]:
+                count = self._to_database(model, storage)
+            else:
+                count = self._to_storage(model, storage)
+            print("Moved the data of %i %s objects." % (
+                count, model.__name__))
+
+        if kwargs["prune"]:
+            print("Pruned %i unreferenced blobs." % self._prune(storage))
+
+    def _chunks(self, queryset):
+        # Always query the first chunk again as the moved objects no longer
+        # match the queryset.
+        while True:
+            pks = list(queryset.values_list("pk", flat=True)[:CHUNK_SIZE])
+            if not pks:
+                break
+            yield pks
+
+    def _fields(self, model, *fields):
+        # Only documents can be compressed.
+        fields = list(fields) + ["sha1"]
+        if model is models.Document:
+            fields.append("compression")
+        return fields
+
+    def _to_storage(self, model, storage):
+        count = 0
+        for pks in self._chunks(model.objects.filter(data__isnull=False)):
+            values = model.objects.filter(pk__in=pks).values(
+                *self._fields(model, "pk", "data"))
+            with transaction.atomic():
+                for value in values:
+                    pk = value["pk"]
+                    data = bytes(value["data"])
+                    sha1 = value["sha1"]
+                    if not sha1:
+                        sha1 = hashlib.sha1(data).hexdigest()
+                    storage.save(
+                        get_blob_key(sha1, value.get("compression")), data)
+                    # Update so nothing is validated or reindexed.
+                    model.objects.filter(pk=pk).update(data=None, sha1=sha1)
+                    count += 1
+        return count
+
+    def _to_database(self, model, storage):
+        count = 0
+        for pks in self._chunks(model.objects.filter(data__isnull=True)):
+            values = model.objects.filter(pk__in=pks).values(
+                *self._fields(model, "pk"))
+            with transaction.atomic():
+                for value in values:
+                    key = get_blob_key(value["sha1"],
+                                       value.get("compression"))
+                    with storage.open(key) as fh:
+                        model.objects.filter(pk=value["pk"]).update(
+                            data=fh.read())
+                    count += 1
+        return count
+
+    def _prune(self, storage):
+        referenced = set()
+        for model in (models.Document, models.DocumentIndexAttachment):
+            for value in model.objects.filter(data__isnull=True).values(
+                    *self._fields(model)):
+                referenced.add(get_blob_key(value["sha1"],
+                                            value.get("compression")))
+
+        count = 0
+        for dirpath, _, filenames in os.walk(storage.root):
+            for filename in filenames:
+                if filename in referenced:
+                    continue
+                os.remove(os.path.join(dirpath, filename))
+                count += 1
+        return count
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from jane.documents import models
+
+
+class Command(BaseCommand):
+    help = ("Count the values of the facet keys of all indices from scratch, "
+            "e.g. after changing the facets of an indexer.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'document_type', type=str, nargs='*',
+            choices=[_i.name for _i in models.DocumentType.objects.all()],
+            help='The document types. All if not given.')
+
+    def handle(self, *args, **kwargs):
+        document_types = models.DocumentType.objects.all()
+        if kwargs["document_type"]:
+            document_types = document_types.filter(
+                name__in=kwargs["document_type"])
+
+        for document_type in document_types:
+            keys = document_type.indexer.get_plugin().facets
+            models.Facet.objects.rebuild(document_type.name, keys)
+            print("%s: %i values of %i keys" % (
+                document_type.name, models.Facet.objects.filter(
+                    document_type=document_type).count(), len(keys)))
@@ -1,9 +1,36 @@
 # -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import time
+import traceback
+
 from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
 
 from jane.documents import models, signals
 
 
+def _reindex_chunk(pks):
+    """
+    Reindex a chunk of documents. Returns the ids of the reindexed documents
+    and a list of errors.
+    """
+    done = []
+    errors = []
+    # The data is deferred by default - fetch it with a single query.
+    documents = models.Document.objects.filter(pk__in=pks).defer(None)\
+        .select_related("document_type")
+    for doc in documents:
+        try:
+            signals.index_document(sender=None, instance=doc, created=None)
+        except Exception:
+            errors.append((doc.pk, traceback.format_exc()))
+        else:
+            done.append(doc.pk)
+    return done, errors
+
+
 class Command(BaseCommand):
     help = "Reindex all documents in Jane's document database."
 
@@ -12,6 +39,26 @@ class Command(BaseCommand):
             'document_type', type=str,
             choices=[_i.name for _i in models.DocumentType.objects.all()],
             help='The document type of the files to upload.')
+        parser.add_argument(
+            '--missing-key', type=str, action='append', default=[],
+            help='Only reindex documents whose indices do not yet have this '
+                 'key. Useful to backfill keys newly added to an indexer. '
+                 'Can be given multiple times.')
+        parser.add_argument(
+            '--stale', action='store_true',
+            help='Only reindex documents indexed by an older version of the '
+                 'indexer, the oldest first.')
+        parser.add_argument(
+            '--jobs', type=int, default=1,
+            help='Number of worker processes.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=50,
+            help='Number of documents fetched and reindexed at once.')
+        parser.add_argument(
+            '--resume-file', type=str,
+            help='The id of each reindexed document is appended to this '
+                 'file. Documents already in it are skipped so an '
+                 'interrupted run can be resumed by passing the same file.')
 
     def handle(self, *args, **kwargs):
         # Cannot easily fail as the model type settings are enforced by
@@ -19,6 +66,68 @@ class Command(BaseCommand):
         document_type = models.DocumentType.objects.get(
             name=kwargs["document_type"])
 
-        for doc in models.Document.objects.filter(document_type=document_type):
-            signals.index_document(sender=None, instance=doc, created=None)
-            print('.', end='')
+        queryset = models.Document.objects.filter(document_type=document_type)
+
+        missing_keys = kwargs["missing_key"]
+        if missing_keys:
+            missing = Q()
+            for key in missing_keys:
+                missing |= ~Q(indices__json__has_key=key)
+            queryset = queryset.filter(missing)
+
+        ordering = ["pk"]
+        if kwargs["stale"]:
+            version = document_type.indexer.get_plugin().version
+            queryset = queryset.filter(indexer_version__lt=version)
+            ordering = ["indexer_version", "indexed_at", "pk"]
+
+        pks = [_i[0] for _i in queryset.order_by(*ordering).values_list(
+            *(["pk"] + ordering[:-1])).distinct()]
+
+        resume_file = kwargs["resume_file"]
+        if resume_file and os.path.exists(resume_file):
+            with open(resume_file, "rt") as fh:
+                finished = set(int(_i) for _i in fh.read().split())
+            pks = [_i for _i in pks if _i not in finished]
+            print("Skipping %i already reindexed documents." % len(finished))
+
+        chunk_size = max(kwargs["chunk_size"], 1)
+        chunks = [pks[_i:_i + chunk_size]
+                  for _i in range(0, len(pks), chunk_size)]
+
+        if kwargs["jobs"] > 1:
+            # Each process must open its own database connection.
+            connections.close_all()
+            pool = multiprocessing.Pool(kwargs["jobs"])
+            results = pool.imap_unordered(_reindex_chunk, chunks)
+        else:
+            pool = None
+            results = map(_reindex_chunk, chunks)
+
+        total = len(pks)
+        count = 0
+        failed = 0
+        start = time.time()
+        resume_fh = open(resume_file, "at") if resume_file else None
+        try:
+            for done, errors in results:
+                if resume_fh:
+                    resume_fh.write("".join("%i\n" % _i for _i in done))
+                    resume_fh.flush()
+                for pk, error in errors:
+                    print("\nFailed to reindex document %i:\n%s" % (pk,
+                                                                    error))
+                count += len(done) + len(errors)
+                failed += len(errors)
+                elapsed = time.time() - start
+                print("\r%i/%i documents (%.1f%%), %.1f documents/s, "
+                      "%i failed" % (count, total, 100.0 * count / total,
+                                     count / elapsed if elapsed else 0.0,
+                                     failed),
+                      end="", flush=True)
+        finally:
+            if resume_fh:
+                resume_fh.close()
+            if pool:
+                pool.terminate()
+        print("")
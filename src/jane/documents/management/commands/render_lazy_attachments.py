@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jane.documents import lazy_attachments, models
+
+
+def _render_document(args):
+    pk, category = args
+    document = models.Document.objects.select_related("document_type").get(
+        pk=pk)
+    indices = models.DocumentIndex.objects.filter(
+        document=document)
+    paths = lazy_attachments.render_lazy_attachments(
+        document, category, list(indices))
+    return len([_i for _i in paths.values() if _i])
+
+
+class Command(BaseCommand):
+    help = ("Create the attachments that are otherwise only created when "
+            "first requested, e.g. the StationXML response plots.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'document_type', type=str,
+            choices=[_i.name for _i in models.DocumentType.objects.all()],
+            help='The document type.')
+        parser.add_argument(
+            '--jobs', type=int, default=1,
+            help='Number of worker processes.')
+
+    def handle(self, *args, **kwargs):
+        document_type = models.DocumentType.objects.get(
+            name=kwargs["document_type"])
+        categories = document_type.indexer.get_plugin().lazy_attachments
+        if not categories:
+            raise CommandError("Document type '%s' has no lazy attachments." %
+                               document_type.name)
+
+        pks = list(models.Document.objects.filter(
+            document_type=document_type).order_by("pk").values_list(
+            "pk", flat=True))
+        tasks = [(_i, _j) for _i in pks for _j in sorted(categories)]
+
+        if kwargs["jobs"] > 1:
+            # Each process must open its own database connection.
+            connections.close_all()
+            pool = multiprocessing.Pool(kwargs["jobs"])
+            results = pool.imap_unordered(_render_document, tasks)
+        else:
+            pool = None
+            results = map(_render_document, tasks)
+
+        count = 0
+        try:
+            for i, result in enumerate(results):
+                count += result
+                print("\r%i/%i documents" % (i + 1, len(tasks)), end="",
+                      flush=True)
+        finally:
+            if pool:
+                pool.terminate()
+        print("\n%i attachments available." % count)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jane.documents import indexing_queue, models
+
+
+class Command(BaseCommand):
+    help = ("Run a pool of worker processes indexing the documents uploaded "
+            "asynchronously.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.JANE_INDEXING_WORKERS,
+            help='Number of worker processes.')
+        parser.add_argument(
+            '--timeout', type=int, default=settings.JANE_INDEXING_TIMEOUT,
+            help='Maximum time in seconds to index a single document.')
+        parser.add_argument(
+            '--purge', action='store_true',
+            help='Delete all finished jobs and exit.')
+
+    def handle(self, *args, **kwargs):
+        if kwargs["purge"]:
+            count, _ = models.IndexingJob.objects.filter(status__in=[
+                models.IndexingJob.DONE,
+                models.IndexingJob.FAILED]).delete()
+            print("Deleted %i finished jobs." % count)
+            return
+
+        print("Starting %i indexing workers." % kwargs["workers"])
+        indexing_queue.run_workers(count=kwargs["workers"],
+                                   timeout=kwargs["timeout"])
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from jane.documents.json_indices import update_json_indices
+
+
+class Command(BaseCommand):
+    help = ("Create the expression indices required by the meta attributes "
+            "of the installed indexer plug-ins and drop stale ones.")
+
+    def handle(self, *args, **kwargs):
+        created, dropped = update_json_indices()
+        for name in created:
+            print("Created index %s" % name)
+        for name in dropped:
+            print("Dropped index %s" % name)
+        if not created and not dropped:
+            print("All JSON expression indices are up to date.")
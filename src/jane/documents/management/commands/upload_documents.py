@@ -1,14 +1,77 @@
 # -*- coding: utf-8 -*-
+import contextlib
 import glob
-import io
+import hashlib
+import multiprocessing
 import os
+import time
 
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.db import connections, transaction
 
 from jane.documents import models
 
 
+def _upload_chunk(args):
+    """
+    Upload a chunk of files. Files whose data already is in the database
+    are skipped with a single query.
+
+    With ``single_transaction`` the changes of the data version and the
+    counts of the document type are applied once for the whole chunk so
+    parallel workers do not wait for each other's locks on its row.
+
+    Returns the number of uploaded and skipped files, the number of uploaded
+    bytes, and a list of errors.
+    """
+    filenames, document_type, username, single_transaction = args
+    user = get_user_model().objects.get(username=username)
+
+    files = []
+    for filename in filenames:
+        with open(filename, "rb") as fh:
+            data = fh.read()
+        files.append((filename, data, hashlib.sha1(data).hexdigest()))
+
+    existing = set(models.Document.objects.filter(
+        sha1__in=[_i[2] for _i in files]).values_list("sha1", flat=True))
+
+    uploaded = 0
+    skipped = 0
+    size = 0
+    errors = []
+    with contextlib.ExitStack() as stack:
+        if single_transaction:
+            stack.enter_context(transaction.atomic())
+            # Applied right before the commit.
+            stack.enter_context(models.DocumentType.defer_data_versions())
+        for filename, data, sha1 in files:
+            if sha1 in existing:
+                skipped += 1
+                continue
+            # Each document in its own savepoint so a failure does not
+            # affect the others. Its data version changes are discarded
+            # with it.
+            try:
+                with transaction.atomic(), \
+                        models.DocumentType.defer_data_versions():
+                    models.Document.objects.add_or_modify_document(
+                        document_type=document_type,
+                        name=os.path.basename(filename),
+                        data=data,
+                        user=user,
+                        sha1=sha1)
+            except Exception as e:
+                errors.append((filename, str(e)))
+            else:
+                uploaded += 1
+                size += len(data)
+                # Identical files within the same chunk.
+                existing.add(sha1)
+    return uploaded, skipped, size, errors
+
+
 class Command(BaseCommand):
     help = "Upload documents to Jane's document database."
 
@@ -25,6 +88,18 @@ class Command(BaseCommand):
         parser.add_argument(
             'path', type=str, nargs='+',
             help='The files to upload.')
+        parser.add_argument(
+            '--jobs', type=int, default=1,
+            help='Number of worker processes.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=50,
+            help='Number of files checked for duplicates with a single '
+                 'query and uploaded by a worker at once.')
+        parser.add_argument(
+            '--batch-transactions', action='store_true',
+            help='Commit each chunk of files in a single transaction. '
+                 'Faster but the files of a chunk only become visible '
+                 'together.')
 
     def handle(self, *args, **kwargs):
         # Cannot easily fail as the model type settings are enforced by
@@ -40,15 +115,50 @@ class Command(BaseCommand):
         for pattern in paths:
             all_files.extend(glob.glob(pattern))
 
-        for filename in all_files:
-            print('Uploading %s...' % filename)
-            with open(filename, "rb") as fh:
-                with io.BytesIO(fh.read()) as data:
-                    try:
-                        models.Document.objects.add_or_modify_document(
-                            document_type=document_type,
-                            name=os.path.basename(filename),
-                            data=data.read(),
-                            user=user)
-                    except Exception as e:
-                        print("Failed uploading due to: %s" % str(e))
+        chunk_size = max(kwargs["chunk_size"], 1)
+        tasks = [(all_files[_i:_i + chunk_size], document_type.name,
+                  user.username, kwargs["batch_transactions"])
+                 for _i in range(0, len(all_files), chunk_size)]
+
+        if kwargs["jobs"] > 1:
+            # Each process must open its own database connection.
+            connections.close_all()
+            pool = multiprocessing.Pool(kwargs["jobs"])
+            results = pool.imap_unordered(_upload_chunk, tasks)
+        else:
+            pool = None
+            results = map(_upload_chunk, tasks)
+
+        total = len(all_files)
+        uploaded = 0
+        skipped = 0
+        size = 0
+        errors = []
+        start = time.time()
+        try:
+            for _uploaded, _skipped, _size, _errors in results:
+                uploaded += _uploaded
+                skipped += _skipped
+                size += _size
+                for filename, error in _errors:
+                    print("\nFailed uploading %s due to: %s" % (
+                        filename, error))
+                errors.extend(_errors)
+                done = uploaded + skipped + len(errors)
+                elapsed = time.time() - start
+                print("\r%i/%i files (%.1f%%), %.1f files/s" % (
+                      done, total, 100.0 * done / total,
+                      done / elapsed if elapsed else 0.0),
+                      end="", flush=True)
+        finally:
+            if pool:
+                pool.terminate()
+
+        elapsed = time.time() - start
+        print("\n\nUploaded %i files (%.1f MB) in %.1f seconds "
+              "(%.1f files/s, %.2f MB/s)." % (
+                  uploaded, size / 1024.0 ** 2, elapsed,
+                  uploaded / elapsed if elapsed else 0.0,
+                  size / 1024.0 ** 2 / elapsed if elapsed else 0.0))
+        print("Skipped %i files that are already in the database." % skipped)
+        print("Failed to upload %i files." % len(errors))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_auto_20161018_0646'),
+    ]
+
+    operations = [
+        # Casting text to a timestamp depends on the DateStyle setting and is
+        # thus not immutable. Jane only stores ISO 8601 strings so it is safe
+        # to declare it as immutable which in turn allows indexing it.
+        migrations.RunSQL(
+            sql="""
+                CREATE OR REPLACE FUNCTION jane_to_timestamp(text)
+                RETURNS timestamp AS $$
+                    SELECT CAST($1 AS TIMESTAMP)
+                $$ LANGUAGE sql IMMUTABLE STRICT;
+            """,
+            reverse_sql="DROP FUNCTION IF EXISTS jane_to_timestamp(text);"),
+    ]
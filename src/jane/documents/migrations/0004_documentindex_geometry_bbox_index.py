@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_jane_to_timestamp_function'),
+    ]
+
+    operations = [
+        # Bounding box queries operate on the planar geometry - the edges
+        # of a geography box would be great circles and not lines of equal
+        # latitude.
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX documents_documentindex_geometry_bbox
+                ON documents_documentindex
+                USING GIST ((geometry::geometry));
+            """,
+            reverse_sql="""
+                DROP INDEX IF EXISTS documents_documentindex_geometry_bbox;
+            """),
+    ]
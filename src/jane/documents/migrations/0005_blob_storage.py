@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def set_attachment_metadata(apps, schema_editor):
+    DocumentIndexAttachment = apps.get_model("documents",
+                                             "DocumentIndexAttachment")
+    for attachment in DocumentIndexAttachment.objects.all().iterator():
+        data = bytes(attachment.data)
+        DocumentIndexAttachment.objects.filter(pk=attachment.pk).update(
+            filesize=len(data), sha1=hashlib.sha1(data).hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_documentindex_geometry_bbox_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='data',
+            field=models.BinaryField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='documentindexattachment',
+            name='data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='documentindexattachment',
+            name='filesize',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='documentindexattachment',
+            name='sha1',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=40),
+        ),
+        migrations.RunPython(set_attachment_metadata,
+                             migrations.RunPython.noop),
+    ]
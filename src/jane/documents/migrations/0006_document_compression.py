@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='compression',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_indexingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='indexed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='indexer_version',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_document_indexer_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentindex',
+            name='attachments_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE documents_documentindex SET attachments_count = (
+                    SELECT COUNT(*) FROM documents_documentindexattachment
+                    WHERE index_id = documents_documentindex.id);
+            """,
+            reverse_sql=migrations.RunSQL.noop),
+    ]
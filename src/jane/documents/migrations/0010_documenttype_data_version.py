@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_documentindex_attachments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttype',
+            name='data_version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
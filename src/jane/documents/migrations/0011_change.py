@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_documenttype_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('document', 'Document'), ('index', 'Index')], max_length=10)),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='documents.DocumentType')),
+            ],
+            options={
+                'ordering': ['pk'],
+                'verbose_name': 'Change',
+                'verbose_name_plural': 'Changes',
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.module_loading import import_string
+
+
+def count_facets(apps, schema_editor):
+    # The historical models cannot load the plugins, thus import the
+    # indexers by their python path.
+    DocumentType = apps.get_model("documents", "DocumentType")
+    for document_type in DocumentType.objects.all():
+        try:
+            indexer = import_string(document_type.indexer.pythonpath)
+        except ImportError:
+            continue
+        for key in getattr(indexer, "facets", ()):
+            schema_editor.execute("""
+                INSERT INTO documents_facet
+                    (document_type_id, key, value, count)
+                SELECT %s, %s, documents_documentindex.json->>%s, COUNT(*)
+                FROM documents_documentindex
+                INNER JOIN documents_document
+                ON (documents_documentindex.document_id =
+                    documents_document.id)
+                WHERE documents_document.document_type_id = %s AND
+                      documents_documentindex.json->>%s IS NOT NULL
+                GROUP BY 3
+            """, [document_type.name, key, key, document_type.name, key])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Facet',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('value', models.TextField()),
+                ('count', models.IntegerField(default=0)),
+                ('document_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='documents.DocumentType')),
+            ],
+            options={
+                'ordering': ['document_type', 'key', '-count'],
+                'verbose_name': 'Facet',
+                'verbose_name_plural': 'Facets',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='facet',
+            unique_together=set([('document_type', 'key', 'value')]),
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
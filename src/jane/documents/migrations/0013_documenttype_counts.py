@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# The index trigger looks up the document which still exists when its
+# indices are deleted as Django deletes them first.
+COUNT_TRIGGERS = """
+CREATE OR REPLACE FUNCTION jane_count_documents() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE documents_documenttype SET document_count = document_count + 1
+        WHERE name = NEW.document_type_id;
+    ELSE
+        UPDATE documents_documenttype SET document_count = document_count - 1
+        WHERE name = OLD.document_type_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION jane_count_indices() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE documents_documenttype SET index_count = index_count + 1
+        WHERE name = (SELECT document_type_id FROM documents_document
+                      WHERE id = NEW.document_id);
+    ELSE
+        UPDATE documents_documenttype SET index_count = index_count - 1
+        WHERE name = (SELECT document_type_id FROM documents_document
+                      WHERE id = OLD.document_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER documents_document_count
+AFTER INSERT OR DELETE ON documents_document
+FOR EACH ROW EXECUTE PROCEDURE jane_count_documents();
+
+CREATE TRIGGER documents_documentindex_count
+AFTER INSERT OR DELETE ON documents_documentindex
+FOR EACH ROW EXECUTE PROCEDURE jane_count_indices();
+
+UPDATE documents_documenttype SET
+    document_count = (
+        SELECT COUNT(*) FROM documents_document
+        WHERE document_type_id = documents_documenttype.name),
+    index_count = (
+        SELECT COUNT(*) FROM documents_documentindex
+        INNER JOIN documents_document
+        ON (documents_documentindex.document_id = documents_document.id)
+        WHERE document_type_id = documents_documenttype.name);
+"""
+
+DROP_COUNT_TRIGGERS = """
+DROP TRIGGER IF EXISTS documents_document_count ON documents_document;
+DROP TRIGGER IF EXISTS documents_documentindex_count
+    ON documents_documentindex;
+DROP FUNCTION IF EXISTS jane_count_documents();
+DROP FUNCTION IF EXISTS jane_count_indices();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_facet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttype',
+            name='document_count',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='documenttype',
+            name='index_count',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(sql=COUNT_TRIGGERS, reverse_sql=DROP_COUNT_TRIGGERS),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0013_documenttype_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttype',
+            name='data_modified_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
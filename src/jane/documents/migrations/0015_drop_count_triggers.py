@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from importlib import import_module
+
+from django.db import migrations
+
+
+# The triggers updated the row of the document type once per inserted or
+# deleted row. The counts are now changed once per document together with
+# the data version.
+counts = import_module("jane.documents.migrations.0013_documenttype_counts")
+
+RECOUNT = """
+UPDATE documents_documenttype SET
+    document_count = (
+        SELECT COUNT(*) FROM documents_document
+        WHERE document_type_id = documents_documenttype.name),
+    index_count = (
+        SELECT COUNT(*) FROM documents_documentindex
+        INNER JOIN documents_document
+        ON (documents_documentindex.document_id = documents_document.id)
+        WHERE document_type_id = documents_documenttype.name);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0014_documenttype_data_modified_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(counts.DROP_COUNT_TRIGGERS + RECOUNT,
+                          reverse_sql=counts.COUNT_TRIGGERS),
+    ]
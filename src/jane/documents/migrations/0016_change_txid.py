@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0015_drop_count_triggers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='txid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='change',
+            index_together=set([('txid', 'id')]),
+        ),
+    ]
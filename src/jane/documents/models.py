@@ -15,30 +15,44 @@ The hierarchy is fairly simple:
 
 New document types can be defined by adding new plug-ins.
 """
+import collections
+import contextlib
 import hashlib
+import json
+import threading
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.gis.db import models
+from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import Distance
 from django.contrib.postgres.fields import jsonb
 from django.core.urlresolvers import reverse
-from django.db import connection
-from django.db.models.aggregates import Count
-from django.db.models.expressions import OrderBy, RawSQL
+from django.db import connection, transaction
+from django.db.models.expressions import F, OrderBy, RawSQL
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
 from djangoplugins.fields import PluginField, ManyPluginField
 from obspy.core.utcdatetime import UTCDateTime
 from rest_framework import status
 
 from jane.documents import plugins, signals
+from jane.documents.compression import compress, get_compression_method
+from jane.documents.document_data import DocumentData
+from jane.documents.json_indices import JSON_INDEX_EXPRESSIONS
+from jane.documents.storage import BlobMixin
 from jane.documents.utils import deg2km
 from jane.exceptions import (JaneDocumentAlreadyExists,
                              JaneNotAuthorizedException)
 
 
+# Data version changes collected by DocumentType.defer_data_versions() in
+# this thread.
+_DEFERRED_DATA_VERSIONS = threading.local()
+
+
 class DocumentType(models.Model):
     """
     Document category. Will be determined from the registered plugins.
@@ -61,19 +75,108 @@ class DocumentType(models.Model):
     upload_permissions = ManyPluginField(
         plugins.UploadPermissionPluginPoint, blank=True,
         related_name='upload_permissions')
+    # Incremented whenever a document, index, or attachment of this type
+    # changes. Cached data derived from them is keyed on it.
+    data_version = models.IntegerField(default=0, editable=False)
+    # When the data version was last incremented, the Last-Modified time of
+    # responses derived from the whole document type.
+    data_modified_at = models.DateTimeField(null=True, editable=False)
+    # Number of documents and indices of this type so they never have to be
+    # counted. Maintained with the data version.
+    document_count = models.BigIntegerField(default=0, editable=False)
+    index_count = models.BigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def bump_data_version(name=None, documents=0, indices=0):
+        """
+        Invalidate all cached data of a document type and change its number
+        of documents and indices in the same statement.
+
+        Writers lock the row of the document type until they commit, call
+        it once and at the very end of a transaction.
+
+        Within ``defer_data_versions()`` the changes are collected and
+        applied together when it ends.
+
+        :param name: The name of the document type. All if not given.
+        :param documents: The change of the number of documents.
+        :param indices: The change of the number of indices.
+        """
+        stack = getattr(_DEFERRED_DATA_VERSIONS, "stack", None)
+        if stack and name is not None:
+            stack[-1][name][0] += documents
+            stack[-1][name][1] += indices
+            return
+        queryset = DocumentType.objects.all()
+        if name is not None:
+            queryset = queryset.filter(name=name)
+        queryset.update(data_version=F("data_version") + 1,
+                        data_modified_at=timezone.now(),
+                        document_count=F("document_count") + documents,
+                        index_count=F("index_count") + indices)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def defer_data_versions():
+        """
+        Context manager collecting the calls to ``bump_data_version()`` and
+        applying them with a single one per document type at its end, e.g.
+        right before a transaction with many documents commits. The row of
+        the document type is then only locked briefly.
+
+        Nested blocks hand their changes to the enclosing one. The changes
+        of a block ending with an exception are discarded, so enter it
+        within the transaction or savepoint that is rolled back.
+        """
+        stack = getattr(_DEFERRED_DATA_VERSIONS, "stack", None)
+        if stack is None:
+            stack = _DEFERRED_DATA_VERSIONS.stack = []
+        changes = collections.defaultdict(lambda: [0, 0])
+        stack.append(changes)
+        try:
+            yield
+        finally:
+            stack.pop()
+        for name, (documents, indices) in sorted(changes.items()):
+            DocumentType.bump_data_version(name, documents=documents,
+                                           indices=indices)
+
+    @staticmethod
+    def get_data_version(name):
+        """
+        The current data version of a document type.
+
+        :param name: The name of the document type.
+        """
+        return get_object_or_404(DocumentType.objects.values_list(
+            "data_version", flat=True), name=name)
+
     class Meta:
         ordering = ['name']
         verbose_name = 'Document Type'
         verbose_name_plural = 'Document Types'
 
 
+class DocumentQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Delete the documents one by one, e.g. in the admin, as
+        Document.delete() also updates the counts, the facets, and the
+        change log.
+        """
+        count = 0
+        for document in self.select_related("document_type"):
+            document.delete()
+            count += 1
+        return count, {self.model._meta.label: count}
+
+
 class DocumentManager(models.Manager):
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = DocumentQuerySet(self.model, using=self._db)
         # defer data
         queryset = queryset.defer('data')
         return queryset
@@ -107,7 +210,8 @@ class DocumentManager(models.Manager):
                                 name=name)
         obj.delete()
 
-    def add_or_modify_document(self, document_type, name, data, user):
+    def add_or_modify_document(self, document_type, name, data, user,
+                               index=True, sha1=None):
         """
         Add a new or modify an existing document.
 
@@ -121,6 +225,11 @@ class DocumentManager(models.Manager):
         :param data: The data as a byte string.
         :param user: The user object responsible for the action. Must be
             passed to ensure a consistent handling of permissions.
+        :param index: If False, the document is validated and stored but
+            not indexed, e.g. to index it later in a worker process.
+        :param sha1: The sha1 hash of the data if the caller already
+            calculated it and made sure that the data is not yet in the
+            database, e.g. for a whole batch of files at once.
         """
         # Works with strings and DocumentType instances.
         if not isinstance(document_type, DocumentType):
@@ -136,11 +245,12 @@ class DocumentManager(models.Manager):
                 "No permission to upload documents of that type")
 
         # Calculate the hash upfront to not upload any duplicates.
-        sha1 = hashlib.sha1(data).hexdigest()
-        if Document.objects.filter(sha1=sha1).exists():
-            raise JaneDocumentAlreadyExists(
-                "Data already exists in the database and document is "
-                "identical according to its hash.")
+        if sha1 is None:
+            sha1 = hashlib.sha1(data).hexdigest()
+            if Document.objects.filter(sha1=sha1).exists():
+                raise JaneDocumentAlreadyExists(
+                    "Data already exists in the database and document is "
+                    "identical according to its hash.")
 
         try:
             document = Document.objects.get(
@@ -156,14 +266,16 @@ class DocumentManager(models.Manager):
             stat = status.HTTP_201_CREATED
 
         document.data = data
-        document.save()
+        # New data is always uncompressed.
+        document.compression = ""
+        document.save(index=index, sha1=sha1)
 
         # Return the status to be able to generate good HTTP responses. Can
         # be ignored if not needed.
         return stat
 
 
-class Document(models.Model):
+class Document(BlobMixin, models.Model):
     """
     A document of a particular type.
 
@@ -178,13 +290,21 @@ class Document(models.Model):
     # The content type of the data. Must be given to be able to provide a
     # reasonable HTTP view of the data.
     content_type = models.CharField(max_length=255)
-    # The actual data as a binary field.
-    data = models.BinaryField(editable=False)
+    # The actual data as a binary field. Null if the data is kept in the
+    # blob storage.
+    data = models.BinaryField(editable=False, null=True)
+    # The compression method of the stored data, empty if uncompressed.
+    compression = models.CharField(max_length=10, blank=True, default="",
+                                   editable=False)
     # The file's size in bytes.
     filesize = models.IntegerField(editable=False)
     # sha1 hash of the data to avoid duplicates.
     sha1 = models.CharField(max_length=40, db_index=True, unique=True,
                             editable=False)
+    # Version of the indexer that created the current indices and when.
+    indexer_version = models.IntegerField(default=0, db_index=True,
+                                          editable=False)
+    indexed_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     modified_at = models.DateTimeField(auto_now=True, editable=False)
     # Users responsible for the aforementioned actions.
@@ -217,35 +337,96 @@ class Document(models.Model):
     format_filesize.short_description = 'File size'
     format_filesize.admin_order_field = 'filesize'
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, index=True, sha1=None, **kwargs):
         """
         Manually trigger the signals as they are for some reason unreliable
         and for example do not get called when a model is updated.
+
+        Pass ``index=False`` to not index the document right away and the
+        ``sha1`` hash of the data if it is already known.
         """
-        signals.validate_document(sender=None, instance=self)
-        signals.set_document_metadata(sender=None, instance=self)
-        super().save(*args, **kwargs)
-        signals.index_document(sender=None, instance=self, created=None)
+        # Shared by the validators and the indexer so the document is only
+        # read and parsed once.
+        data = DocumentData(self.get_data())
+        signals.validate_document(sender=None, instance=self, data=data)
+        signals.set_document_metadata(sender=None, instance=self, data=data,
+                                      sha1=sha1)
+        self.compress_data()
+        self.store_data()
+        created = self.pk is None
+        # Together so a document is never stored without being indexed and
+        # counted, e.g. if the indexer raises.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Change.objects.record(
+                self.document_type_id, Change.DOCUMENT,
+                Change.CREATE if created else Change.UPDATE,
+                [(self.pk, self.name)])
+            if index:
+                signals.index_document(sender=None, instance=self,
+                                       created=created, data=data)
+            elif created:
+                DocumentType.bump_data_version(self.document_type_id,
+                                               documents=1)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        indices = list(self.indices.values_list("pk", "json"))
+        with transaction.atomic():
+            super().delete(*args, **kwargs)
+            Facet.objects.update_counts(
+                self.document_type_id,
+                self.document_type.indexer.get_plugin().facets,
+                removed=[_i[1] for _i in indices])
+            Change.objects.record(self.document_type_id, Change.INDEX,
+                                  Change.DELETE,
+                                  [(_i[0], self.name) for _i in indices])
+            Change.objects.record(self.document_type_id, Change.DOCUMENT,
+                                  Change.DELETE, [(pk, self.name)])
+            DocumentType.bump_data_version(
+                self.document_type_id, documents=-1, indices=-len(indices))
+
+    def compress_data(self):
+        """
+        Compress the data if requested by the JANE_DOCUMENT_COMPRESSION
+        setting. Call after the size and hash have been calculated.
+        """
+        method = get_compression_method()
+        if not method or self.compression or self.data is None:
+            return
+        self.data = compress(bytes(self.data), method)
+        self.compression = method
 
 
 class DocumentIndexManager(models.GeoManager):
     """
     Custom queryset manager for the document indices.
     """
+    # The left hand side of all queries must match the expressions of the
+    # indices in jane.documents.json_indices.
     JSON_QUERY_TEMPLATE_MAP = {
-        "int": "CAST(json->>'%s' AS INTEGER) %s %s",
-        "float": "CAST(json->>'%s' AS REAL) %s %s",
-        "str": "LOWER(json->>'%s') %s LOWER('%s')",
-        "bool": "CAST(json->>'%s' AS BOOL) %s %s",
-        "UTCDateTime": "CAST(json->>'%s' AS TIMESTAMP) %s TIMESTAMP '%s'"
+        "int": JSON_INDEX_EXPRESSIONS["int"] + " %s %s",
+        "float": JSON_INDEX_EXPRESSIONS["float"] + " %s %s",
+        "str": JSON_INDEX_EXPRESSIONS["str"] + " %s LOWER('%s')",
+        "bool": JSON_INDEX_EXPRESSIONS["bool"] + " %s %s",
+        "UTCDateTime": JSON_INDEX_EXPRESSIONS["UTCDateTime"] +
+        " %s TIMESTAMP '%s'"
     }
 
     JSON_ORDERING_TEMPLATE = {
-        "int": "CAST(json->>'%s' AS INTEGER)",
-        "float": "CAST(json->>'%s' AS REAL)",
+        "int": JSON_INDEX_EXPRESSIONS["int"],
+        "float": JSON_INDEX_EXPRESSIONS["float"],
         "str": "json->>'%s'",
-        "bool": "CAST(json->>'%s' AS BOOL)",
-        "UTCDateTime": "CAST(json->>'%s' AS TIMESTAMP)"
+        "bool": JSON_INDEX_EXPRESSIONS["bool"],
+        "UTCDateTime": JSON_INDEX_EXPRESSIONS["UTCDateTime"]
+    }
+
+    JSON_ORDERING_FIELD_MAP = {
+        "int": models.BigIntegerField,
+        "float": models.FloatField,
+        "str": models.TextField,
+        "bool": models.BooleanField,
+        "UTCDateTime": models.DateTimeField
     }
 
     def get_queryset(self):
@@ -255,14 +436,47 @@ class DocumentIndexManager(models.GeoManager):
             select_related('document', 'document__document_type')
         # defer data
         queryset = queryset.defer('document__data')
-        # annotate number of attachments
-        queryset = queryset.\
-            annotate(attachments_count=Count('attachments'))
         return queryset
 
+    def update_attachments_count(self, pks):
+        """
+        Recount the attachments of some indices.
+
+        :param pks: The primary keys of the indices.
+        """
+        pks = list(pks)
+        if not pks:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE documents_documentindex SET attachments_count = (
+                    SELECT COUNT(*) FROM documents_documentindexattachment
+                    WHERE index_id = documents_documentindex.id)
+                WHERE id = ANY(%s)
+            """, [pks])
+
     def _get_json_query(self, key, operator, type, value):
         return self.JSON_QUERY_TEMPLATE_MAP[type] % (key, operator, str(value))
 
+    def _get_ordering_expression(self, meta, key):
+        if key not in meta:
+            return None
+        return RawSQL(self.JSON_ORDERING_TEMPLATE[meta[key]] % key, [],
+                      output_field=self.JSON_ORDERING_FIELD_MAP[meta[key]]())
+
+    def get_ordering_expression(self, document_type, key):
+        """
+        Expression of a key in the indexed JSON suitable to order the indices
+        of a document type by. It can use the expression index of the key.
+        None if the indexer of the document type has no such key.
+
+        :param document_type: The name of the document type.
+        :param key: The key in the JSON.
+        """
+        res_type = get_object_or_404(DocumentType, name=document_type)
+        return self._get_ordering_expression(
+            res_type.indexer.get_plugin().meta, key)
+
     def apply_retrieve_permission(self, document_type, queryset, user):
         """
         Apply potential additional restrictions based on the permissions.
@@ -286,12 +500,34 @@ class DocumentIndexManager(models.GeoManager):
                             queryset=queryset, model_type="index", user=user)
         return queryset
 
+    def get_retrieve_permission_scope(self, document_type, user):
+        """
+        The retrieve permissions of a document type a user has. Users with
+        the same scope see the same indices, so it can be part of the keys
+        of cached query results.
+
+        :param document_type: The document type.
+        :param user: The user, None for anonymous users.
+        """
+        if user is None:
+            user = AnonymousUser()
+        app_label = DocumentType._meta.app_label
+        return tuple(sorted(
+            _i.get_plugin().permission_codename
+            for _i in document_type.retrieve_permissions.all()
+            if user.has_perm("%s.%s" % (
+                app_label, _i.get_plugin().permission_codename))))
+
     def get_distinct_values(self, document_type, json_key):
         """
         Get distinct values for a certain field in the JSON document.
+
+        Values of the facet keys of the indexer come from the facet store,
+        all others require a scan of the indices.
         """
         res_type = get_object_or_404(DocumentType, name=document_type)
-        meta = res_type.indexer.get_plugin().meta
+        indexer = res_type.indexer.get_plugin()
+        meta = indexer.meta
         if json_key not in meta:
             raise Http404("Key '%s' not in the meta attribute of the '%s' "
                           "resource type." % (json_key, document_type))
@@ -299,6 +535,10 @@ class DocumentIndexManager(models.GeoManager):
         if meta[json_key] != "str":
             raise Http404("Currently only implemented for string index keys")
 
+        if json_key in indexer.facets:
+            return sorted(_i[0] for _i in Facet.objects.get_counts(
+                document_type, json_key))
+
         # XXX: I am not sure how to formulate this within Django's ORM...
         # Should be a safe enough query especially with the checks above but
         # one might still want to change it.
@@ -346,18 +586,82 @@ class DocumentIndexManager(models.GeoManager):
                                                   queryset=queryset,
                                                   user=user)
 
-        central_point = 'POINT({lng} {lat})'.format(lng=central_longitude,
-                                                    lat=central_latitude)
-        if min_radius is not None:
-            queryset = queryset.filter(
-                geometry__distance_gt=(central_point,
-                                       Distance(km=deg2km(min_radius))))
+        # ST_DWithin() uses the spatial index - the distance functions would
+        # have to compute the distance for every single row.
+        central_point = Point(central_longitude, central_latitude,
+                              srid=4326)
         if max_radius is not None:
             queryset = queryset.filter(
-                geometry__distance_lt=(central_point,
-                                       Distance(km=deg2km(max_radius))))
+                geometry__dwithin=(central_point,
+                                   Distance(km=deg2km(max_radius))))
+        if min_radius:
+            queryset = queryset.filter(geometry__isnull=False).exclude(
+                geometry__dwithin=(central_point,
+                                   Distance(km=deg2km(min_radius))))
         return queryset
 
+    def filter_by_bounding_box(self, queryset, min_latitude=None,
+                               max_latitude=None, min_longitude=None,
+                               max_longitude=None):
+        """
+        Filter a queryset to only contain indices within a bounding box.
+
+        Useful for the rectangular queries at the FDSN station and event
+        service. Contrary to the other methods this does not filter on the
+        document type or apply any permissions.
+
+        If ``min_longitude`` is larger than ``max_longitude`` the box is
+        assumed to cross the antimeridian.
+
+        :param queryset: The queryset to filter.
+        :param min_latitude: The minimum latitude in degree.
+        :param max_latitude: The maximum latitude in degree.
+        :param min_longitude: The minimum longitude in degree.
+        :param max_longitude: The maximum longitude in degree.
+        """
+        if min_latitude is None and max_latitude is None and \
+                min_longitude is None and max_longitude is None:
+            return queryset
+
+        south = -90.0 if min_latitude is None else float(min_latitude)
+        north = 90.0 if max_latitude is None else float(max_latitude)
+        west = -180.0 if min_longitude is None else float(min_longitude)
+        east = 180.0 if max_longitude is None else float(max_longitude)
+
+        if west <= east:
+            boxes = [(west, south, east, north)]
+        else:
+            boxes = [(west, south, 180.0, north), (-180.0, south, east, north)]
+
+        # The bounding box operator can use the GiST index on the geometry
+        # cast of the geography column.
+        where = [" OR ".join(
+            ["(geometry::geometry && "
+             "ST_MakeEnvelope(%s, %s, %s, %s, 4326))"] * len(boxes))]
+        params = [_i for box in boxes for _i in box]
+
+        # The geometry of events also contains the uncertainty ellipses so
+        # the bounding boxes might be a bit larger - check the actual
+        # coordinates as well.
+        if min_latitude is not None:
+            where.append(self._get_json_query("latitude", ">=", "float",
+                                              south))
+        if max_latitude is not None:
+            where.append(self._get_json_query("latitude", "<=", "float",
+                                              north))
+        lon_queries = []
+        if min_longitude is not None:
+            lon_queries.append(self._get_json_query("longitude", ">=",
+                                                    "float", west))
+        if max_longitude is not None:
+            lon_queries.append(self._get_json_query("longitude", "<=",
+                                                    "float", east))
+        if lon_queries:
+            where.append((" OR " if west > east else " AND ").join(
+                "(%s)" % _i for _i in lon_queries))
+
+        return queryset.extra(where=where, params=params)
+
     def get_filtered_queryset(self, document_type, queryset=None, user=None,
                               **kwargs):
         """
@@ -446,13 +750,16 @@ class DocumentIndexManager(models.GeoManager):
                     # Possible wildcards.
                     if "*" in value or "?" in value:
                         value = value.replace("?", "_").replace("*", r"%%")
-                        # PostgreSQL specific case insensitive LIKE statement.
+                        # Case insensitive LIKE statement written so it can
+                        # use the expression index of that key.
                         if operator == "=":
-                            where.append("json->>'%s' ILIKE '%s'" % (key,
-                                                                     value))
+                            where.append(
+                                "LOWER(json->>'%s') LIKE LOWER('%s')" % (
+                                    key, value))
                         elif operator == "!=":
-                            where.append("json->>'%s' NOT ILIKE '%s'" % (
-                                key, value))
+                            where.append(
+                                "LOWER(json->>'%s') NOT LIKE LOWER('%s')" % (
+                                    key, value))
                         else:
                             raise NotImplementedError()  # pragma: no cover
                     else:
@@ -493,10 +800,8 @@ class DocumentIndexManager(models.GeoManager):
         queryset = queryset.extra(where=where)
 
         if "ordering" in kwargs and kwargs["ordering"] in meta:
-            ord = kwargs["ordering"]
-            queryset = queryset.order_by(
-                OrderBy(
-                    RawSQL(self.JSON_ORDERING_TEMPLATE[meta[ord]] % ord, [])))
+            queryset = queryset.order_by(OrderBy(
+                self._get_ordering_expression(meta, kwargs["ordering"])))
         return queryset
 
 
@@ -508,6 +813,9 @@ class DocumentIndex(models.Model):
     json = jsonb.JSONField(verbose_name="JSON")
     geometry = models.GeometryCollectionField(blank=True, null=True,
                                               geography=True)
+    # Kept up to date by the attachment manager and the indexing so lists of
+    # indices do not have to count them.
+    attachments_count = models.IntegerField(default=0, editable=False)
 
     objects = DocumentIndexManager()
 
@@ -583,7 +891,10 @@ class DocumentIndexAttachmentManager(models.Manager):
                 "type")
 
         obj = get_object_or_404(DocumentIndexAttachment, pk=pk)
-        obj.delete()
+        with transaction.atomic():
+            obj.delete()
+            DocumentIndex.objects.update_attachments_count([obj.index_id])
+            DocumentType.bump_data_version(document_type_str)
 
     def add_or_modify_attachment(self, document_type, index_id,
                                  content_type, category,
@@ -642,21 +953,31 @@ class DocumentIndexAttachmentManager(models.Manager):
         attachment.modified_by = user
         attachment.data = data
 
-        attachment.save()
+        with transaction.atomic():
+            attachment.save()
+            if method == "create":
+                DocumentIndex.objects.update_attachments_count([index.pk])
+            DocumentType.bump_data_version(document_type_str)
 
         # Return the status to be able to generate good HTTP responses. Can
         # be ignored if not needed.
         return stat
 
 
-class DocumentIndexAttachment(models.Model):
+class DocumentIndexAttachment(BlobMixin, models.Model):
     """
     Attachments for one Document.
     """
     index = models.ForeignKey(DocumentIndex, related_name='attachments')
     category = models.CharField(max_length=50, db_index=True)
     content_type = models.CharField(max_length=255)
-    data = models.BinaryField()
+    # Null if the data is kept in the blob storage.
+    data = models.BinaryField(null=True)
+    # The size in bytes and the sha1 hash which also serves as the key in
+    # the blob storage.
+    filesize = models.IntegerField(editable=False, default=0)
+    sha1 = models.CharField(max_length=40, db_index=True, editable=False,
+                            default="")
     # Attachments are almost independent from Documents thus they should
     # have people responsible for them.
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
@@ -690,6 +1011,234 @@ class DocumentIndexAttachment(models.Model):
     format_attachment_id.short_description = 'Attachment ID'
 
     def format_filesize(self):
-        return filesizeformat(len(self.data))
+        return filesizeformat(self.filesize)
     format_filesize.short_description = 'File size'
     format_filesize.admin_order_field = 'filesize'
+
+    def prepare_data(self):
+        """
+        Set the size and the hash and move the data to the blob storage.
+        Must also be called before inserting attachments in bulk.
+        """
+        if self.data is not None:
+            self.filesize = len(self.data)
+            self.sha1 = hashlib.sha1(self.data).hexdigest()
+        self.store_data()
+
+    def save(self, *args, **kwargs):
+        self.prepare_data()
+        super().save(*args, **kwargs)
+
+
+class IndexingJob(models.Model):
+    """
+    A document waiting to be indexed by the indexing workers.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = ((QUEUED, "Queued"), (RUNNING, "Running"),
+                      (DONE, "Done"), (FAILED, "Failed"))
+
+    document = models.ForeignKey(Document, related_name='indexing_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=QUEUED, db_index=True)
+    # The error message of failed jobs.
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True, editable=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                   related_name='indexing_jobs_created')
+
+    class Meta:
+        ordering = ['pk']
+        verbose_name = 'Indexing Job'
+        verbose_name_plural = 'Indexing Jobs'
+
+    def __str__(self):
+        return str(self.id)
+
+
+class ChangeManager(models.Manager):
+    def record(self, document_type, object_type, action, objects):
+        """
+        Append changes to the log.
+
+        :param document_type: The name of the document type.
+        :param object_type: ``Change.DOCUMENT`` or ``Change.INDEX``.
+        :param action: ``Change.CREATE``, ``Change.UPDATE``, or
+            ``Change.DELETE``.
+        :param objects: List of tuples with the primary key of each changed
+            object and the name of its document.
+        """
+        if not objects:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT txid_current()")
+            txid = cursor.fetchone()[0]
+        self.bulk_create([
+            Change(document_type_id=document_type, object_type=object_type,
+                   action=action, object_id=pk, name=name, txid=txid)
+            for pk, name in objects], batch_size=500)
+
+
+class Change(models.Model):
+    """
+    Append-only log of the created, updated, and deleted documents and
+    indices so clients can ask for what changed since they last looked.
+    """
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+    ACTION_CHOICES = ((CREATE, "Create"), (UPDATE, "Update"),
+                      (DELETE, "Delete"))
+
+    DOCUMENT = "document"
+    INDEX = "index"
+    OBJECT_TYPE_CHOICES = ((DOCUMENT, "Document"), (INDEX, "Index"))
+
+    document_type = models.ForeignKey(DocumentType, related_name='changes')
+    object_type = models.CharField(max_length=10,
+                                   choices=OBJECT_TYPE_CHOICES)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Not a foreign key as the object might no longer exist.
+    object_id = models.IntegerField()
+    # The name of the document, also of the document of an index.
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    # The id of the transaction that wrote the change. Transactions commit
+    # in a different order than they draw primary keys, so the feed is
+    # ordered by (txid, pk) instead.
+    txid = models.BigIntegerField(default=0, editable=False)
+
+    objects = ChangeManager()
+
+    class Meta:
+        ordering = ['pk']
+        index_together = [('txid', 'id')]
+        verbose_name = 'Change'
+        verbose_name_plural = 'Changes'
+
+    def __str__(self):
+        return str(self.id)
+
+
+class FacetManager(models.Manager):
+    def update_counts(self, document_type, keys, added=(), removed=()):
+        """
+        Apply the difference between removed and added indices to the
+        counts. Values whose count drops to zero are removed.
+
+        The values are rendered by ``json->>key`` in the database, just like
+        in ``rebuild()``, so booleans and numbers end up in the same rows.
+
+        :param document_type: The name of the document type.
+        :param keys: The facet keys of the indexer.
+        :param added: List with the JSON of the new indices.
+        :param removed: List with the JSON of the removed indices.
+        """
+        if not keys or not (added or removed):
+            return
+        indices = [json.dumps(_i) for _i in added] + \
+            [json.dumps(_i) for _i in removed]
+        signs = [1] * len(added) + [-1] * len(removed)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents_facet
+                    (document_type_id, key, value, count)
+                SELECT %s, keys.key, indices.json->>keys.key,
+                       SUM(indices.sign)
+                FROM unnest(%s::jsonb[], %s::integer[])
+                    AS indices(json, sign)
+                CROSS JOIN unnest(%s::text[]) AS keys(key)
+                WHERE indices.json->>keys.key IS NOT NULL
+                GROUP BY 2, 3
+                HAVING SUM(indices.sign) <> 0
+                ON CONFLICT (document_type_id, key, value)
+                DO UPDATE SET count = documents_facet.count + EXCLUDED.count
+            """, [document_type, indices, signs, list(keys)])
+            cursor.execute("""
+                DELETE FROM documents_facet
+                WHERE document_type_id = %s AND count <= 0
+            """, [document_type])
+
+    def rebuild(self, document_type, keys):
+        """
+        Count the values of all indices of a document type from scratch.
+
+        :param document_type: The name of the document type.
+        :param keys: The facet keys of the indexer.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM documents_facet WHERE document_type_id = %s
+            """, [document_type])
+            for key in keys:
+                cursor.execute("""
+                    INSERT INTO documents_facet
+                        (document_type_id, key, value, count)
+                    SELECT %s, %s, documents_documentindex.json->>%s,
+                           COUNT(*)
+                    FROM documents_documentindex
+                    INNER JOIN documents_document
+                    ON (documents_documentindex.document_id =
+                        documents_document.id)
+                    WHERE documents_document.document_type_id = %s AND
+                          documents_documentindex.json->>%s IS NOT NULL
+                    GROUP BY 3
+                """, [document_type, key, key, document_type, key])
+
+    def get_counts(self, document_type, key):
+        """
+        List of (value, count) tuples of a facet, most frequent first.
+
+        :param document_type: The name of the document type.
+        :param key: The facet key.
+        """
+        return list(self.filter(document_type=document_type, key=key)
+                    .order_by("-count", "value")
+                    .values_list("value", "count"))
+
+    def count_values(self, queryset, key):
+        """
+        Like ``get_counts()`` but counts the values in a queryset of indices,
+        e.g. of a search or of the indices visible to a user.
+
+        :param queryset: The queryset of indices.
+        :param key: The key in the JSON.
+        """
+        return list(
+            queryset.extra(
+                where=["documents_documentindex.json->>%s IS NOT NULL"],
+                params=[key])
+            .annotate(facet_value=RawSQL(
+                "documents_documentindex.json->>%s", [key],
+                output_field=models.TextField()))
+            .order_by().values("facet_value")
+            .annotate(facet_count=models.Count("id"))
+            .order_by("-facet_count", "facet_value")
+            .values_list("facet_value", "facet_count"))
+
+
+class Facet(models.Model):
+    """
+    Number of indices of a document type with a certain value of a key.
+    Kept for the keys in the ``facets`` attribute of the indexer.
+    """
+    document_type = models.ForeignKey(DocumentType, related_name='facets')
+    key = models.CharField(max_length=255)
+    value = models.TextField()
+    count = models.IntegerField(default=0)
+
+    objects = FacetManager()
+
+    class Meta:
+        ordering = ['document_type', 'key', '-count']
+        unique_together = ['document_type', 'key', 'value']
+        verbose_name = 'Facet'
+        verbose_name_plural = 'Facets'
+
+    def __str__(self):
+        return "%s: %s" % (self.key, self.value)
@@ -39,11 +39,54 @@ class IndexerPluginPoint(PluginPoint):
     """
     group_name = "indexer"
 
+    # Version of the indexer. Increase it whenever the indices it creates
+    # change so the affected documents can be found and reindexed with
+    # "reindex_all_documents --stale".
+    version = 1
+
+    # Optional tuple of keys that identify an index within a document, e.g.
+    # the event id. If given, indices are matched on these keys when a
+    # document is reindexed and updated in place so their ids and
+    # attachments survive. Otherwise they are matched on their content.
+    index_key = None
+
+    # Attachments that are only created the first time they are requested,
+    # e.g. because they are expensive to create and rarely needed. Maps the
+    # category to the content type.
+    lazy_attachments = {}
+
+    # String keys of the indices whose values are counted in the facet
+    # store. The counts are kept up to date during indexing so the distinct
+    # values of these keys and their frequencies are known without scanning
+    # all indices.
+    facets = ()
+
     def index(self):
         """
         """
         raise NotImplementedError
 
+    def get_lazy_attachment_key(self, category, index):
+        """
+        Returns the cache key of a lazy attachment as a sha1 hash or None if
+        the index has no such attachment.
+
+        :param category: The category of the attachment.
+        :param index: The JSON of the index.
+        """
+        raise NotImplementedError
+
+    def create_lazy_attachments(self, category, document, indices):
+        """
+        Creates a lazy attachment for each of the given indices of a single
+        document. Returns a list with the data for each index.
+
+        :param category: The category of the attachment.
+        :param document: The document data as a file-like object.
+        :param indices: List with the JSON of the indices.
+        """
+        raise NotImplementedError
+
     @property
     def meta(self):
         """
@@ -61,6 +104,12 @@ class RetrievePermissionPluginPoint(PluginPoint):
     """
     group_name = "retrieve_permissions"
 
+    # Optional SQL predicate on the document indices that users without the
+    # permission are restricted to. If given, partial expression indices
+    # with this predicate will be maintained and the queryset filter should
+    # use exactly this predicate so PostgreSQL can use them.
+    index_predicate = None
+
     def filter_queryset_user_has_permission(self, queryset, model_type):
         raise NotImplementedError
 
@@ -174,7 +223,8 @@ def initialize_plugins():
         resource_type.validators = validators
         resource_type.retrieve_permissions = retrieve_permissions
         resource_type.upload_permissions = upload_permissions
-        resource_type.save()
+        # Do not overwrite the counters maintained by the database.
+        resource_type.save(update_fields=["definition", "indexer"])
 
     # Permissions.
     permissions = []
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import collections
 
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from rest_framework_gis.fields import GeometryField
 
 from jane.documents import models
 
@@ -108,8 +111,6 @@ class DocumentIndexSerializer(serializers.ModelSerializer):
         read_only=True
     )
 
-    attachments_count = serializers.IntegerField()
-
     class Meta:
         model = models.DocumentIndex
         fields = [
@@ -125,6 +126,72 @@ class DocumentIndexSerializer(serializers.ModelSerializer):
         ]
 
 
+class _URLTemplate(object):
+    """
+    URL of a view with a single variable part, reversed only once.
+    """
+    # Matches all URL patterns of the indices and documents.
+    SENTINEL = "9876543210"
+
+    def __init__(self, view_name, kwargs, variable, request, format=None):
+        kwargs = dict(kwargs)
+        kwargs[variable] = self.SENTINEL
+        url = reverse(view_name, kwargs=kwargs, request=request,
+                      format=format)
+        if url.count(self.SENTINEL) != 1:  # pragma: no cover
+            raise ValueError("Cannot create a template for the URL %s." %
+                             url)
+        self.prefix, self.suffix = url.split(self.SENTINEL)
+
+    def __call__(self, value):
+        return self.prefix + str(value) + self.suffix
+
+
+class FastDocumentIndexSerializer(object):
+    """
+    Serializes many indices of a single document type a lot faster than the
+    DocumentIndexSerializer with identical results.
+
+    It works on dictionaries returned by a values queryset with the
+    ``values`` fields and builds the URLs from templates that are only
+    reversed once instead of four times per index. Pass the format suffix
+    of the request as ``format``, like the ``format`` in the context of
+    the serializer.
+    """
+    values = ("id", "document__name", "document__content_type", "json",
+              "geometry", "attachments_count")
+
+    def __init__(self, document_type, request, format=None):
+        kwargs = {"document_type": document_type}
+        self.url = _URLTemplate("rest_document_indices-detail", kwargs,
+                                "pk", request, format)
+        self.document_url = _URLTemplate("rest_documents-detail", kwargs,
+                                         "name", request, format)
+        self.document_data_url = _URLTemplate("document_data", kwargs,
+                                              "name", request, format)
+        self.attachments_url = _URLTemplate(
+            "rest_document_index_attachments-list", kwargs, "idx", request,
+            format)
+        self.geometry = GeometryField()
+
+    def to_representation(self, row):
+        return collections.OrderedDict([
+            ("id", row["id"]),
+            ("url", self.url(row["id"])),
+            ("containing_document_url",
+             self.document_url(row["document__name"])),
+            ("containing_document_data_url",
+             self.document_data_url(row["document__name"])),
+            ("data_content_type", row["document__content_type"]),
+            ("indexed_data", row["json"]),
+            ("geometry", self.geometry.to_representation(row["geometry"])),
+            ("attachments_url", self.attachments_url(row["id"])),
+            ("attachments_count", row["attachments_count"])])
+
+    def serialize(self, rows):
+        return [self.to_representation(_i) for _i in rows]
+
+
 class DocumentSerializer(serializers.ModelSerializer):
     data_url = DocumentTypeHyperlinkedIdentifyField(
         view_name='document_data',
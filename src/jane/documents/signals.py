@@ -5,94 +5,268 @@ Signals - all are called directly from within an overwritten save() method.
 Otherwise they do not get reliably triggered during a model update for example.
 """
 
+import collections
 import hashlib
-import io
+import json
 
-from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
 from django.contrib.gis.geos.collections import GeometryCollection
 
 from jane.documents import JaneDocumentsValidationException
+from jane.documents.document_data import DocumentData
 
 
 # @receiver(pre_save, sender=models.Document)
-def validate_document(sender, instance, **kwargs):
+def validate_document(sender, instance, data=None, **kwargs):
     """
     Validate document before saving using validators of specified document type
+
+    :param data: Optional DocumentData object shared with the indexer so the
+        document is only parsed once.
     """
     plugins = instance.document_type.validators.all()
     if not plugins:
         raise Exception("At least one ValidatorPlugin must be defined for "
                         "document type '%s'." %
                         instance.document_type.name)
-    with io.BytesIO(bytes(instance.data)) as data:
-        for plugin in plugins:
-            data.seek(0, 0)
-            # raise if not valid
-            if not plugin.get_plugin().validate(data):
-                raise JaneDocumentsValidationException(
-                    "Not a valid document of type %s." %
-                    instance.document_type.name)
+    if data is None:
+        data = DocumentData(instance.get_data())
+    for plugin in plugins:
+        data.seek(0, 0)
+        # raise if not valid
+        if not plugin.get_plugin().validate(data):
+            raise JaneDocumentsValidationException(
+                "Not a valid document of type %s." %
+                instance.document_type.name)
 
 
 # @receiver(pre_save, sender=models.Document)
-def set_document_metadata(sender, instance, **kwargs):
+def set_document_metadata(sender, instance, data=None, sha1=None,
+                          **kwargs):
     # If not set, use the default content type for that particular document
     # type.
     if not instance.content_type:
         instance.content_type = \
             instance.document_type.definition.get_plugin().default_content_type
 
-    # Set the filesize and calculate the hash. No need to check the hash as
-    # the database constraints will enforce its uniqueness.
-    instance.filesize = len(instance.data)
-    instance.sha1 = hashlib.sha1(instance.data).hexdigest()
+    # Set the filesize and calculate the hash unless it is passed. No need
+    # to check the hash as the database constraints will enforce its
+    # uniqueness.
+    data = data.getvalue() if data is not None else instance.get_data()
+    instance.filesize = len(data)
+    instance.sha1 = sha1 or hashlib.sha1(data).hexdigest()
+
+
+# Number of objects per INSERT statement.
+BULK_BATCH_SIZE = 500
+
+
+def _get_next_ids(model, count):
+    """
+    Reserve ``count`` primary keys for a model.
+
+    Django only sets the primary keys of objects inserted with bulk_create()
+    starting with Django 1.10 but they are needed for the attachments.
+    """
+    if not count:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)", [model._meta.db_table, count])
+        return [_i[0] for _i in cursor.fetchall()]
+
+
+def _get_index_key(indexer, index):
+    """
+    The key to match old and new indices of a document on.
+    """
+    if indexer.index_key:
+        return tuple(index.get(_i) for _i in indexer.index_key)
+    return json.dumps(index, sort_keys=True)
+
+
+def _geometries_equal(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return bytes(a.wkb) == bytes(b.wkb)
 
 
 # @receiver(post_save, sender=models.Document)
-def index_document(sender, instance, created, **kwargs):  # @UnusedVariable
+def index_document(sender, instance, created, data=None,
+                   **kwargs):  # @UnusedVariable
     """
     Index data
+
+    Pass the DocumentData object used for the validation as ``data`` to not
+    read and parse the document again.
+
+    Pass ``created=True`` for new documents so they are counted.
+
+    Only indices that changed are written. Existing indices are matched with
+    the new ones on the index key of the indexer. Unchanged indices and their
+    attachments are left alone, changed ones are updated in place, and
+    everything else is deleted or inserted in bulk.
     """
     # Avoid circular imports.
     from jane.documents import models
 
-    # delete all existing indexed data
-    instance.indices.all().delete()
-    indexer = instance.document_type.indexer.get_plugin()
-    # index data
-    with io.BytesIO(bytes(instance.data)) as data:
+    # Concurrent indexing of the same document, e.g. by two queued jobs,
+    # would diff against the same old indices and insert them twice. The
+    # document row is thus locked for the whole run and, unless the data is
+    # passed, its current data is indexed.
+    with transaction.atomic():
+        sha1 = models.Document.objects.select_for_update().filter(
+            pk=instance.pk).values_list("sha1", flat=True).first()
+        if sha1 is None:
+            # Deleted in the meanwhile.
+            return
+        if data is None and sha1 != instance.sha1:
+            instance.refresh_from_db()
+
+        indexer = instance.document_type.indexer.get_plugin()
+        if data is None:
+            data = DocumentData(instance.get_data())
+        data.seek(0, 0)
         indices = indexer.index(data)
+
+        new_indices = []
         for index in indices:
-            # attachments
-            attachments = index.get('attachments')
-            try:
-                del index['attachments']
-            except:
-                pass
-            # geometry
-            geometry = index.get('geometry')
-            try:
-                del index['geometry']
-            except:
-                pass
-            # add index
-            obj = models.DocumentIndex(document=instance, json=index)
-            if geometry:
-                obj.geometry = GeometryCollection(geometry)
-            obj.save()
-            # add attachments
-            if attachments:
-                for key, value in attachments.items():
-                    data = value['data']
-                    if hasattr(data, 'seek'):
-                        data.seek(0)
-                        data = data.read()
-                    models.DocumentIndexAttachment(
-                        index=obj, category=key,
-                        content_type=value['content-type'],
-                        data=data,
-                        created_by=instance.created_by,
-                        modified_by=instance.modified_by,
-                    ).save()
-    # invalidate cache
-    cache.delete('record_list_json')
+            # Neither the attachments nor the geometry are part of the JSON.
+            attachments = index.pop('attachments', None) or {}
+            geometry = index.pop('geometry', None)
+            geometry = GeometryCollection(geometry, srid=4326) \
+                if geometry else None
+            # Round trip so it can be compared to the JSON from the database.
+            index = json.loads(json.dumps(index))
+            new_indices.append((index, geometry, attachments))
+
+        existing = collections.defaultdict(list)
+        for pk, index, geometry in models.DocumentIndex.objects.filter(
+                document=instance).values_list("pk", "json", "geometry"):
+            existing[_get_index_key(indexer, index)].append(
+                (pk, index, geometry))
+
+        # (index pk, attachments) for matched indices and (index, geometry,
+        # attachments) for the new ones.
+        matched = []
+        updated = []
+        to_create = []
+        # JSON of the removed and added indices for the facet counts.
+        removed = []
+        added = []
+        for index, geometry, attachments in new_indices:
+            candidates = existing.get(_get_index_key(indexer, index))
+            if not candidates:
+                to_create.append((index, geometry, attachments))
+                continue
+            pk, old_index, old_geometry = candidates.pop(0)
+            if old_index != index or \
+                    not _geometries_equal(old_geometry, geometry):
+                models.DocumentIndex.objects.filter(pk=pk).update(
+                    json=index, geometry=geometry)
+                updated.append(pk)
+                removed.append(old_index)
+                added.append(index)
+            matched.append((pk, attachments))
+
+        # Delete the indices that no longer exist.
+        stale = [_i[0] for _j in existing.values() for _i in _j]
+        removed.extend(_i[1] for _j in existing.values() for _i in _j)
+        added.extend(_i[0] for _i in to_create)
+        if stale:
+            models.DocumentIndex.objects.filter(pk__in=stale).delete()
+
+        ids = _get_next_ids(models.DocumentIndex, len(to_create))
+        models.DocumentIndex.objects.bulk_create([
+            models.DocumentIndex(id=pk, document=instance, json=index,
+                                 geometry=geometry)
+            for pk, (index, geometry, _) in zip(ids, to_create)],
+            batch_size=BULK_BATCH_SIZE)
+        matched.extend((pk, _i[2]) for pk, _i in zip(ids, to_create))
+
+        models.DocumentIndex.objects.update_attachments_count(
+            _write_attachments(instance, matched,
+                               lazy_categories=indexer.lazy_attachments))
+
+        # Update directly so the document is not saved again.
+        instance.indexer_version = indexer.version
+        instance.indexed_at = timezone.now()
+        models.Document.objects.filter(pk=instance.pk).update(
+            indexer_version=instance.indexer_version,
+            indexed_at=instance.indexed_at)
+        # Append to the change log.
+        for action, pks in ((models.Change.DELETE, stale),
+                            (models.Change.UPDATE, updated),
+                            (models.Change.CREATE, ids)):
+            models.Change.objects.record(
+                instance.document_type_id, models.Change.INDEX, action,
+                [(_i, instance.name) for _i in pks])
+        models.Facet.objects.update_counts(
+            instance.document_type_id, indexer.facets, added=added,
+            removed=removed)
+        # Last so the row of the document type is only locked briefly.
+        models.DocumentType.bump_data_version(
+            instance.document_type_id, documents=1 if created else 0,
+            indices=len(ids) - len(stale))
+
+
+def _write_attachments(instance, indices, lazy_categories=()):
+    """
+    Write the attachments created by the indexer. Attachments of a category
+    whose data did not change are kept.
+
+    :param indices: List of tuples with the primary key of each index and
+        its attachments as returned by the indexer.
+    :param lazy_categories: Categories the indexer no longer creates but
+        only renders on request. Stored attachments of these categories,
+        e.g. from older versions of the indexer, are deleted unless the
+        indexer still returned them.
+
+    Returns the primary keys of the indices whose attachments changed.
+    """
+    # Avoid circular imports.
+    from jane.documents import models
+
+    existing = collections.defaultdict(list)
+    for pk, index_id, category, sha1 in \
+            models.DocumentIndexAttachment.objects.filter(
+                index__document=instance).values_list(
+                "pk", "index_id", "category", "sha1"):
+        existing[(index_id, category)].append((pk, sha1))
+
+    to_delete = []
+    to_create = []
+    changed = set()
+    for index_id, attachments in indices:
+        for category in lazy_categories:
+            old = existing.get((index_id, category))
+            if old and category not in attachments:
+                to_delete.extend(_i[0] for _i in old)
+                changed.add(index_id)
+        for category, value in attachments.items():
+            data = value['data']
+            if hasattr(data, 'seek'):
+                data.seek(0)
+                data = data.read()
+            old = existing.get((index_id, category), [])
+            if hashlib.sha1(data).hexdigest() in [_i[1] for _i in old]:
+                continue
+            to_delete.extend(_i[0] for _i in old)
+            changed.add(index_id)
+            attachment = models.DocumentIndexAttachment(
+                index_id=index_id, category=category,
+                content_type=value['content-type'],
+                data=data,
+                created_by=instance.created_by,
+                modified_by=instance.modified_by)
+            attachment.prepare_data()
+            to_create.append(attachment)
+
+    if to_delete:
+        models.DocumentIndexAttachment.objects.filter(
+            pk__in=to_delete).delete()
+    models.DocumentIndexAttachment.objects.bulk_create(
+        to_create, batch_size=BULK_BATCH_SIZE)
+    return changed
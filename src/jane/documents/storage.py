@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Pluggable storage of the actual data of documents and attachments.
+
+By default the data is stored in the database. The filesystem backend
+stores each blob as a file named after its sha1 hash. The database then only
+holds the metadata and the data can be streamed from disk or served
+directly by the web server.
+
+The backend is chosen with the ``JANE_BLOB_STORAGE_BACKEND`` setting.
+"""
+import io
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.module_loading import import_string
+
+from jane.documents.compression import accepts_encoding, open_decompressed
+
+
+# The sha1 hash, optionally followed by the compression method.
+_VALID_KEY = re.compile(r"^[0-9a-f]{40}(\.[a-z0-9]+)?$")
+
+
+class BlobStorage(object):
+    """
+    Base class for all blob storage backends.
+    """
+    # If True, the data is kept in the data fields of the models.
+    stores_in_database = True
+
+    def save(self, key, data):
+        raise NotImplementedError
+
+    def open(self, key):
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def path(self, key):
+        """
+        Local path of a blob if available, otherwise None.
+        """
+        return None
+
+
+class DatabaseBlobStorage(BlobStorage):
+    """
+    Keeps the data in the database - this backend does not do anything.
+    """
+    stores_in_database = True
+
+    def save(self, key, data):
+        pass
+
+    def open(self, key):
+        raise IOError("Blob %s is not available in the database storage "
+                      "backend." % key)
+
+    def exists(self, key):
+        return False
+
+    def delete(self, key):
+        pass
+
+
+class FileSystemBlobStorage(BlobStorage):
+    """
+    Content-addressed storage of the blobs on the filesystem.
+
+    Each blob is stored in ``ROOT/ab/cd/abcd...`` where ``abcd...`` is the
+    sha1 hash of the data. Compressed blobs additionally have the
+    compression method as the suffix.
+    """
+    stores_in_database = False
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        if not _VALID_KEY.match(key):
+            raise ValueError("Invalid blob key '%s'." % key)
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def save(self, key, data):
+        filename = self.path(key)
+        # Content-addressed - if it exists, it is identical.
+        if os.path.exists(filename):
+            return
+        directory = os.path.dirname(filename)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so no partial blobs can ever be
+        # seen by readers.
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, filename)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        filename = self.path(key)
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+_STORAGE = {}
+
+
+def get_blob_key(sha1, compression=None):
+    """
+    The key of a blob in the storage. The same data compressed with
+    different methods results in different blobs.
+    """
+    if compression:
+        return "%s.%s" % (sha1, compression)
+    return sha1
+
+
+def get_blob_storage():
+    """
+    Returns the configured blob storage backend.
+    """
+    backend = settings.JANE_BLOB_STORAGE_BACKEND
+    if backend not in _STORAGE:
+        cls = import_string(backend)
+        if issubclass(cls, FileSystemBlobStorage):
+            _STORAGE[backend] = cls(root=settings.JANE_BLOB_STORAGE_ROOT)
+        else:
+            _STORAGE[backend] = cls()
+    return _STORAGE[backend]
+
+
+def open_blob(data, sha1, compression=None):
+    """
+    Returns a binary file-like object with the uncompressed data of a
+    document or attachment given the values of its fields. Useful with
+    ``values_list()`` querysets.
+    """
+    if data is not None:
+        fh = io.BytesIO(bytes(data))
+    else:
+        fh = get_blob_storage().open(get_blob_key(sha1, compression))
+    return open_decompressed(fh, compression)
+
+
+class BlobMixin(object):
+    """
+    Mixin for models with a ``data`` and a ``sha1`` field whose data might
+    live in the blob storage. Models with a ``compression`` field can store
+    their data compressed.
+    """
+    compression = ""
+
+    @property
+    def blob_key(self):
+        return get_blob_key(self.sha1, self.compression)
+
+    def store_data(self):
+        """
+        Move the data to the blob storage if the configured backend does
+        not store it in the database. Call right before saving.
+        """
+        storage = get_blob_storage()
+        if storage.stores_in_database or self.data is None:
+            return
+        storage.save(self.blob_key, bytes(self.data))
+        self.data = None
+
+    def open_raw_data(self):
+        """
+        Returns a binary file-like object with the data as stored, e.g.
+        still compressed.
+        """
+        if self.data is not None:
+            return io.BytesIO(bytes(self.data))
+        return get_blob_storage().open(self.blob_key)
+
+    def open_data(self):
+        """
+        Returns a binary file-like object with the uncompressed data.
+        """
+        return open_blob(self.data, self.sha1, self.compression)
+
+    def get_data(self):
+        """
+        Returns the uncompressed data as bytes.
+        """
+        with self.open_data() as fh:
+            return fh.read()
+
+
+def get_blob_etag(sha1, compression, request):
+    """
+    Strong ETag of the served data of a document or attachment, without the
+    quotes. The same data sent with a content encoding is a different
+    representation and gets its own ETag.
+
+    :param sha1: The sha1 hash of the uncompressed data.
+    :param compression: The compression method of the stored data.
+    :param request: The request the data is served for.
+    """
+    if accepts_encoding(request, compression):
+        return "%s-%s" % (sha1, compression)
+    return sha1
+
+
+def blob_response(obj, content_type, filename=None, request=None):
+    """
+    HTTP response serving the data of a document or attachment.
+
+    Blobs on disk are streamed or, depending on the
+    ``JANE_BLOB_STORAGE_SERVE_METHOD`` setting, handed off to the web server
+    with the ``X-Sendfile`` or ``X-Accel-Redirect`` headers. Compressed data
+    is served as is if the client of the request accepts its encoding.
+    """
+    passthrough = accepts_encoding(request, obj.compression)
+
+    path = None
+    if obj.data is None:
+        path = get_blob_storage().path(obj.blob_key)
+
+    method = settings.JANE_BLOB_STORAGE_SERVE_METHOD
+    if obj.compression and not passthrough:
+        response = FileResponse(obj.open_data(), content_type=content_type)
+    elif path is None:
+        response = HttpResponse(content=bytes(obj.data),
+                                content_type=content_type)
+    elif method == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+    elif method == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = \
+            settings.JANE_BLOB_STORAGE_SERVE_URL.rstrip("/") + "/" + \
+            os.path.relpath(path, get_blob_storage().root)
+    else:
+        # Uses the wsgi.file_wrapper, and thus sendfile(), if available.
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+
+    if obj.compression:
+        response["Vary"] = "Accept-Encoding"
+        if passthrough:
+            response["Content-Encoding"] = obj.compression
+    if filename is not None:
+        response["Content-Disposition"] = \
+            'attachment; filename="%s"' % filename
+    return response
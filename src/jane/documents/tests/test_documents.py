@@ -1,8 +1,23 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import os
+import tempfile
+import threading
+
 import django
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
 
+from jane.documents import changes
+from jane.documents.document_data import DocumentData, get_xml_schema
+from jane.documents.json_indices import (get_json_index_definitions,
+                                         update_json_indices)
+from jane.documents.models import Change
 from jane.documents.plugins import initialize_plugins
+from jane.documents.storage import FileSystemBlobStorage
+from jane.quakeml.plugins import QuakeMLIndexerPlugin
 
 
 django.setup()
@@ -57,3 +72,133 @@ class JaneDocumentsTestCase(TestCase):
              'description': "StationXML Plugin for Jane's Document Database",
              'document_type': 'stationxml',
              'url': 'http://testserver/rest/documents/stationxml'}])
+
+    def test_filesystem_blob_storage(self):
+        data = b"Hello Jane"
+        sha1 = hashlib.sha1(data).hexdigest()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            storage = FileSystemBlobStorage(root=tmpdir)
+            self.assertEqual(storage.path(sha1), os.path.join(
+                tmpdir, sha1[:2], sha1[2:4], sha1))
+            self.assertFalse(storage.exists(sha1))
+
+            storage.save(sha1, data)
+            # Saving again is a no-op.
+            storage.save(sha1, data)
+            self.assertTrue(storage.exists(sha1))
+            with storage.open(sha1) as fh:
+                self.assertEqual(fh.read(), data)
+
+            storage.delete(sha1)
+            self.assertFalse(storage.exists(sha1))
+
+            # No paths outside of the root.
+            with self.assertRaises(ValueError):
+                storage.path("../../etc/passwd")
+
+    def test_document_data(self):
+        data = DocumentData(b"<?xml version='1.0'?><a><b>1</b></a>")
+        # Still a normal file-like object.
+        self.assertEqual(data.read(5), b"<?xml")
+        # Parsed only once.
+        tree = data.xml_tree
+        self.assertEqual(tree.getroot().tag, "a")
+        self.assertIs(data.xml_tree, tree)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "schema.xsd")
+            with open(filename, "wt") as fh:
+                fh.write(
+                    '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">'
+                    '<xs:element name="a"><xs:complexType><xs:sequence>'
+                    '<xs:element name="b" type="xs:integer"/>'
+                    '</xs:sequence></xs:complexType></xs:element>'
+                    '</xs:schema>')
+            schema = get_xml_schema(filename)
+            # Compiled only once.
+            self.assertIs(get_xml_schema(filename), schema)
+            self.assertTrue(schema.validate(tree))
+            self.assertFalse(schema.validate(DocumentData(
+                b"<a><b>x</b></a>").xml_tree))
+
+
+class JSONIndicesTestCase(TransactionTestCase):
+    """
+    The indices are built concurrently and thus outside of a transaction.
+    """
+    def setUp(self):
+        initialize_plugins()
+
+    def test_json_expression_indices(self):
+        """
+        Each typed key of the indexer plug-ins must have an index.
+        """
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                update_json_indices()
+
+        call_command("update_json_indices")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes "
+                           "WHERE tablename = 'documents_documentindex'")
+            existing = set(_i[0] for _i in cursor.fetchall())
+
+        definitions = get_json_index_definitions(
+            QuakeMLIndexerPlugin.meta,
+            predicates=["(json->'public') = 'true'::jsonb"])
+        # One per key and one additional partial index per time key.
+        self.assertEqual(len(definitions),
+                         len(QuakeMLIndexerPlugin.meta) + 3)
+        for name in definitions:
+            self.assertIn(name, existing)
+
+        # Nothing left to do.
+        self.assertEqual(update_json_indices(), ([], []))
+
+
+class ChangesTestCase(TransactionTestCase):
+    """
+    The change feed with concurrently committing transactions.
+    """
+    def setUp(self):
+        initialize_plugins()
+
+    def test_late_commits_are_not_skipped(self):
+        written = threading.Event()
+        commit = threading.Event()
+
+        def write_slowly():
+            try:
+                with transaction.atomic():
+                    Change.objects.record("quakeml", Change.DOCUMENT,
+                                          Change.CREATE, [(1, "slow.xml")])
+                    written.set()
+                    commit.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=write_slowly)
+        thread.start()
+        try:
+            self.assertTrue(written.wait(10))
+            # Started later but committed first.
+            Change.objects.record("quakeml", Change.DOCUMENT,
+                                  Change.CREATE, [(2, "fast.xml")])
+            # Held back until the older transaction finished.
+            results, cursor, _ = changes.get_changes(0, user=AnonymousUser())
+            self.assertEqual(results, [])
+            self.assertEqual(cursor, 0)
+            self.assertFalse(changes.wait_for_changes(0, timeout=0))
+        finally:
+            commit.set()
+            thread.join()
+
+        results, cursor, _ = changes.get_changes(0, user=AnonymousUser())
+        self.assertEqual([_i.name for _i in results],
+                         ["slow.xml", "fast.xml"])
+        # Which a cursor on the primary key alone would have skipped.
+        self.assertLess(results[0].pk, results[1].pk)
+        self.assertEqual(cursor, results[-1].pk)
+        self.assertEqual(changes.get_latest_cursor(), cursor)
+        self.assertEqual(changes.get_changes(
+            cursor, user=AnonymousUser())[0], [])
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Map tiles of the document indices.
+
+Instead of sending all indices to the browser, the map requests tiles in
+the usual ``z/x/y`` scheme of the web mercator projection. PostGIS clusters
+the indices of a tile on a grid and each tile contains one point per
+non-empty cell with the number of indices in it, either as GeoJSON or as a
+Mapbox Vector Tile. The first point of the geometry of an index is its
+location.
+
+Tiles are cached with keys containing the data version of the document
+type, the search parameters, and the retrieve permissions of the user, so
+they never have to be invalidated explicitly.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from jane.documents import models
+
+
+TILE_FORMATS = {
+    "geojson": "application/geo+json",
+    "mvt": "application/vnd.mapbox-vector-tile"
+}
+
+# Half the circumference of the earth in web mercator coordinates.
+WEB_MERCATOR_EXTENT = 20037508.342789244
+
+# Location of an index in web mercator coordinates.
+POINT_SQL = ("ST_Transform(ST_GeometryN(ST_CollectionExtract("
+             "documents_documentindex.geometry::geometry, 1), 1), 3857)")
+
+# Resolution of Mapbox Vector Tiles.
+MVT_EXTENT = 4096
+
+
+def get_tile_bounds(z, x, y):
+    """
+    Web mercator bounds of a tile as (xmin, ymin, xmax, ymax).
+    """
+    size = 2 * WEB_MERCATOR_EXTENT / 2 ** z
+    xmin = -WEB_MERCATOR_EXTENT + x * size
+    ymax = WEB_MERCATOR_EXTENT - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def _get_cache_key(document_type, z, x, y, tile_format, params, user):
+    doctype = models.DocumentType.objects.get(name=document_type)
+    scope = models.DocumentIndex.objects.get_retrieve_permission_scope(
+        doctype, user)
+    query = hashlib.sha1(json.dumps(
+        [sorted(params.items()), scope]).encode()).hexdigest()
+    return "jane_tile:%s:%i:%s:%i:%i:%i:%s" % (
+        document_type, doctype.data_version, query, z, x, y, tile_format)
+
+
+def _get_cluster_sql(queryset, z, x, y):
+    """
+    SQL and parameters of the clusters of a tile with the columns ``count``,
+    ``id`` (of the index if the cluster has only one), and ``geom`` in web
+    mercator coordinates.
+    """
+    xmin, ymin, xmax, ymax = get_tile_bounds(z, x, y)
+    cell = (xmax - xmin) / settings.JANE_TILE_GRID_SIZE
+
+    # Planar bounding box test which can use the spatial index on the
+    # geometries - geographic boxes spanning half the world or more do not
+    # work.
+    queryset = queryset.extra(
+        where=["documents_documentindex.geometry::geometry && ST_Transform("
+               "ST_MakeEnvelope(%s, %s, %s, %s, 3857), 4326)"],
+        params=[xmin, ymin, xmax, ymax])
+    queryset = queryset.annotate(tile_point=RawSQL(POINT_SQL, [])) \
+        .order_by().values_list("id", "tile_point")
+    inner_sql, inner_params = queryset.query.sql_with_params()
+
+    sql = """
+        SELECT COUNT(*) AS count,
+               CASE WHEN COUNT(*) = 1 THEN MIN(id) END AS id,
+               ST_SetSRID(ST_MakePoint(AVG(ST_X(tile_point)),
+                                       AVG(ST_Y(tile_point))), 3857) AS geom
+        FROM ({inner}) AS indices
+        WHERE tile_point IS NOT NULL AND
+              ST_X(tile_point) >= %s AND ST_X(tile_point) < %s AND
+              ST_Y(tile_point) >= %s AND ST_Y(tile_point) < %s
+        GROUP BY FLOOR((ST_X(tile_point) - %s) / %s),
+                 FLOOR((ST_Y(tile_point) - %s) / %s)
+    """.format(inner=inner_sql)
+    params = list(inner_params) + [xmin, xmax, ymin, ymax,
+                                   xmin, cell, ymin, cell]
+    return sql, params
+
+
+def _render_geojson(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT count, id, ST_AsGeoJSON(ST_Transform(geom, 4326), 6)
+            FROM ({sql}) AS clusters
+        """.format(sql=sql), params)
+        rows = cursor.fetchall()
+    features = ",".join(
+        '{"type":"Feature","geometry":%s,"properties":%s}' % (
+            geometry, json.dumps({"count": count, "id": id}))
+        for count, id, geometry in rows)
+    return ('{"type":"FeatureCollection","features":[%s]}' %
+            features).encode()
+
+
+def _render_mvt(sql, params, z, x, y):
+    xmin, ymin, xmax, ymax = get_tile_bounds(z, x, y)
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT ST_AsMVT(tile, 'indices', %s, 'geom') FROM (
+                SELECT count, id, ST_AsMVTGeom(
+                    geom, ST_MakeEnvelope(%s, %s, %s, %s, 3857)::box2d,
+                    %s, 0, true) AS geom
+                FROM ({sql}) AS clusters) AS tile
+        """.format(sql=sql), [MVT_EXTENT, xmin, ymin, xmax, ymax,
+                              MVT_EXTENT] + params)
+        return bytes(cursor.fetchone()[0] or b"")
+
+
+def get_tile(document_type, z, x, y, tile_format, params, user):
+    """
+    The data of a tile, from the cache if possible.
+
+    :param document_type: The name of the document type.
+    :param z: The zoom level.
+    :param x: The column of the tile.
+    :param y: The row of the tile.
+    :param tile_format: ``"geojson"`` or ``"mvt"``.
+    :param params: Dictionary with the search parameters for the indices.
+    :param user: The user requesting the tile.
+    """
+    key = _get_cache_key(document_type, z, x, y, tile_format, params, user)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    queryset = models.DocumentIndex.objects.get_filtered_queryset(
+        document_type=document_type, user=user, **params)
+    sql, sql_params = _get_cluster_sql(queryset, z, x, y)
+    if tile_format == "mvt":
+        data = _render_mvt(sql, sql_params, z, x, y)
+    else:
+        data = _render_geojson(sql, sql_params)
+    cache.set(key, data, settings.JANE_TILE_CACHE_TIMEOUT)
+    return data
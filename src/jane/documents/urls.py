@@ -27,11 +27,45 @@ urlpatterns = [
     url(r'^rest/document_indices/(?P<document_type>[a-zA-Z0-9]+)'
         r'/(?P<idx>[0-9]+)/attachments/(?P<pk>[0-9]+)/data$',
         view=views.attachment_data,
-        name='attachment_data')
-
+        name='attachment_data'),
+    # Attachments created on demand.
+    url(r'^rest/document_indices/(?P<document_type>[a-zA-Z0-9]+)'
+        r'/(?P<idx>[0-9]+)/lazy_attachments/(?P<category>[a-zA-Z0-9_]+)$',
+        view=views.lazy_attachment_data,
+        name='lazy_attachment_data'),
+    # Status of the asynchronous indexing.
+    url(r'^rest/indexing_jobs/?$',
+        view=views.indexing_jobs,
+        name='indexing_jobs'),
+    url(r'^rest/indexing_jobs/(?P<pk>[0-9]+)/?$',
+        view=views.indexing_job,
+        name='indexing_job'),
+    # Value counts of the facet keys.
+    url(r'^rest/document_indices/(?P<document_type>[a-zA-Z0-9]+)'
+        r'/facets(?:/(?P<key>[a-zA-Z0-9_]+))?/?$',
+        view=views.facets,
+        name='facets'),
+    # Feed of the changes to documents and indices.
+    url(r'^rest/changes/?$',
+        view=views.changes_feed,
+        name='changes'),
 ]
 urlpatterns = format_suffix_patterns(urlpatterns)
 
+# Streaming export and tiles - their file extensions are not format
+# suffixes.
+urlpatterns.append(
+    url(r'^rest/document_indices/(?P<document_type>[a-zA-Z0-9]+)'
+        r'/export\.(?P<export_format>geojson|ndjson)$',
+        view=views.export_indices,
+        name='export_indices'))
+urlpatterns.append(
+    url(r'^rest/tiles/(?P<document_type>[a-zA-Z0-9]+)'
+        r'/(?P<z>[0-9]+)/(?P<x>[0-9]+)/(?P<y>[0-9]+)'
+        r'(?:\.(?P<tile_format>geojson|mvt))?$',
+        view=views.tile,
+        name='tile'))
+
 
 # Route documents and document indices.
 router = OptionalTrailingSlashSimpleRouter(trailing_slash=False)
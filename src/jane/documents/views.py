@@ -1,23 +1,46 @@
 # -*- coding: utf-8 -*-
 import collections
+import json
 
-from django.db.models.aggregates import Count
-from django.http import HttpResponse
-from django.http.response import Http404
+from django.conf import settings
+from django.http.response import (FileResponse, Http404, HttpResponse,
+                                  StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from rest_framework import status
-from rest_framework import viewsets, generics, mixins
-from rest_framework.decorators import api_view
+from rest_framework import renderers, viewsets, generics, mixins
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
-from jane.documents import models, serializer, DOCUMENT_FILENAME_REGEX
+from jane.documents import (models, serializer, indexing_queue,
+                            lazy_attachments, export, tiles, changes,
+                            DOCUMENT_FILENAME_REGEX)
+from jane.documents.storage import blob_response, get_blob_etag
 from jane.exceptions import JaneInvalidRequestException
+from jane.jane.pagination import KeysetPagination
+from jane.jane.utils import get_not_modified_response, set_validators
 
 
 CACHE_TIMEOUT = 60 * 60 * 24
 
 
+class EventStreamRenderer(renderers.BaseRenderer):
+    """
+    Lets clients accept server-sent events - the views stream them
+    themselves.
+    """
+    media_type = "text/event-stream"
+    format = "sse"
+
+    def render(self, data, media_type=None, renderer_context=None):
+        # Only errors end up here.
+        if data is None:
+            return b""
+        return ("event: error\ndata: %s\n\n" % json.dumps(data)).encode()
+
+
 class DocumentsView(mixins.RetrieveModelMixin, mixins.ListModelMixin,
                     viewsets.ViewSetMixin, generics.GenericAPIView):
     serializer_class = serializer.DocumentSerializer
@@ -35,8 +58,31 @@ class DocumentsView(mixins.RetrieveModelMixin, mixins.ListModelMixin,
         """
         Method called upon "PUT"ting a new document. Creates a new or
         replaces an existing document.
+
+        If enabled and requested, the document is only validated and stored
+        and a job indexing it in the background is returned.
         """
-        status = models.Document.objects.add_or_modify_document(
+        if indexing_queue.wants_async_indexing(request):
+            models.Document.objects.add_or_modify_document(
+                document_type=document_type,
+                name=name,
+                data=request.data.body,
+                user=request.user,
+                index=False)
+            document = models.Document.objects.get(
+                document_type__name=document_type, name=name)
+            job = indexing_queue.enqueue(document, user=request.user)
+            url = reverse("indexing_job", kwargs={"pk": job.pk},
+                          request=request)
+            return Response(
+                {"status": "Successfully stored the document. It will be "
+                           "indexed in the background.",
+                 "status_code": status.HTTP_202_ACCEPTED,
+                 "job": url},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": url})
+
+        stat = models.Document.objects.add_or_modify_document(
             document_type=document_type,
             name=name,
             data=request.data.body,
@@ -44,8 +90,8 @@ class DocumentsView(mixins.RetrieveModelMixin, mixins.ListModelMixin,
 
         return Response(
             {"status": "Successfully created or updated the document",
-             "status_code": status},
-            status=status)
+             "status_code": stat},
+            status=stat)
 
     def destroy(self, request, document_type, name):
         """
@@ -62,15 +108,15 @@ class DocumentsView(mixins.RetrieveModelMixin, mixins.ListModelMixin,
 
 class DocumentIndicesView(viewsets.ReadOnlyModelViewSet):
     serializer_class = serializer.DocumentIndexSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         # Get the query dictionary.
         params = dict(self.request.query_params)
         # Remove some that might be due to the API.
-        if "offset" in params:
-            del params["offset"]
-        if "format" in params:
-            del params["format"]
+        for key in ("offset", "limit", "cursor", "count", "format"):
+            if key in params:
+                del params[key]
         # Flatten the rest.
         params = {key: value[0] for key, value in params.items()}
 
@@ -78,12 +124,37 @@ class DocumentIndicesView(viewsets.ReadOnlyModelViewSet):
             document_type=self.kwargs["document_type"],
             user=self.request.user, **params)
 
-        # annotate number of attachments
-        queryset = queryset.\
-            annotate(attachments_count=Count('attachments'))
-
         return queryset
 
+    def get_keyset_ordering(self):
+        """
+        The indices are paginated by the key given with ``ordering``.
+        """
+        key = self.request.query_params.get("ordering")
+        if not key:
+            return None
+        expression = models.DocumentIndex.objects.get_ordering_expression(
+            self.kwargs["document_type"], key)
+        if expression is None:
+            return None
+        return expression, False
+
+    def list(self, request, *args, **kwargs):
+        """
+        Lists are serialized with the fast serializer from values only.
+        """
+        fast_serializer = serializer.FastDocumentIndexSerializer(
+            document_type=self.kwargs["document_type"], request=request,
+            format=self.format_kwarg)
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *fast_serializer.values)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                fast_serializer.serialize(page))
+        return Response(fast_serializer.serialize(queryset))
+
 
 class DocumentIndexAttachmentsView(mixins.RetrieveModelMixin,
                                    mixins.ListModelMixin,
@@ -151,22 +222,21 @@ def documents_rest_root(request, format=None):
     Index of all document types.
     """
     if request.method == "GET":
-        document_types = [_i.name for _i in models.DocumentType.objects.all()]
-
-        data = [(_i, reverse("rest_documents-list",
-                             kwargs={"document_type": _i}, request=request))
-                for _i in document_types]
+        # The counts are maintained by the database - a single query
+        # suffices.
+        document_types = models.DocumentType.objects.select_related(
+            "definition").order_by("name")
 
         # Use OrderedDict to force order in browseable REST API.
         return Response([
             collections.OrderedDict([
-                ('document_type', i[0]),
-                ('url', i[1]),
-                ('description', models.DocumentType.objects.get(name=i[0])
-                 .definition.get_plugin().title),
-                ('available_documents',
-                 models.Document.objects.filter(document_type=i[0]).count())]
-            ) for i in sorted(data, key=lambda x: x[0])
+                ('document_type', _i.name),
+                ('url', reverse("rest_documents-list",
+                                kwargs={"document_type": _i.name},
+                                request=request)),
+                ('description', _i.definition.get_plugin().title),
+                ('available_documents', _i.document_count)]
+            ) for _i in document_types
         ])
     else:  # pragma: no cover
         raise Http404
@@ -178,23 +248,19 @@ def documents_indices_rest_root(request, format=None):
     Index of all document types for the document indices.
     """
     if request.method == "GET":
-        document_types = [_i.name for _i in models.DocumentType.objects.all()]
-
-        data = [(_i, reverse("rest_document_indices-list",
-                             kwargs={"document_type": _i}, request=request))
-                for _i in document_types]
+        document_types = models.DocumentType.objects.select_related(
+            "definition").order_by("name")
 
         # Use OrderedDict to force order in browseable REST API.
         return Response([
             collections.OrderedDict([
-                ('document_type', i[0]),
-                ('url', i[1]),
-                ('description', models.DocumentType.objects.get(name=i[0])
-                 .definition.get_plugin().title),
-                ('available_documents',
-                 models.DocumentIndex.objects.filter(
-                     document__document_type=i[0]).count())]
-            ) for i in sorted(data, key=lambda x: x[0])
+                ('document_type', _i.name),
+                ('url', reverse("rest_document_indices-list",
+                                kwargs={"document_type": _i.name},
+                                request=request)),
+                ('description', _i.definition.get_plugin().title),
+                ('available_documents', _i.index_count)]
+            ) for _i in document_types
         ])
     else:  # pragma: no cover
         raise Http404
@@ -205,16 +271,217 @@ def document_data(request, document_type, name, *args, **kwargs):
     Get the data for the document corresponding to a certain document type
     and name.
     """
+    # The validators are checked before the data is loaded.
+    sha1, compression, modified_at = get_object_or_404(
+        models.Document.objects.values_list(
+            "sha1", "compression", "modified_at"),
+        document_type__name=document_type, name=name)
+    etag = get_blob_etag(sha1, compression, request)
+    response = get_not_modified_response(request, etag, modified_at)
+    if response is not None:
+        return response
+
     document = get_object_or_404(models.Document,
                                  document_type__name=document_type, name=name)
-    return HttpResponse(content=document.data,
-                        content_type=document.content_type)
+    response = blob_response(document, content_type=document.content_type,
+                             request=request)
+    return set_validators(response, etag, modified_at)
+
+
+def lazy_attachment_data(request, document_type, idx, category):
+    """
+    Get the data of an attachment that is created on demand, e.g. the
+    response plot of a channel.
+    """
+    doctype = get_object_or_404(models.DocumentType, name=document_type)
+    indexer = doctype.indexer.get_plugin()
+    if category not in indexer.lazy_attachments:
+        raise Http404
+    # The index has to be visible to the user.
+    queryset = models.DocumentIndex.objects.get_filtered_queryset(
+        document_type=document_type, user=request.user)
+    index = get_object_or_404(queryset, pk=idx)
+    path = lazy_attachments.get_lazy_attachment(index, category)
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, "rb"),
+                        content_type=indexer.lazy_attachments[category])
+
+
+@api_view(['GET'])
+def export_indices(request, document_type, export_format):
+    """
+    Stream all indices of a document type as GeoJSON or NDJSON.
+
+    Accepts the same filters as the document indices list, ``fields`` with a
+    comma separated list of keys to export, and ``geometry=point`` to only
+    export the first point of each index.
+    """
+    doctype = get_object_or_404(models.DocumentType, name=document_type)
+    params = {key: value for key, value in request.query_params.items()
+              if key not in ("fields", "geometry")}
+    fields = [_i.strip() for _i in
+              request.query_params.get("fields", "").split(",") if _i.strip()]
+
+    queryset = models.DocumentIndex.objects.get_filtered_queryset(
+        document_type=document_type, user=request.user, **params)
+    queryset = export.get_export_queryset(
+        queryset, meta=doctype.indexer.get_plugin().meta, fields=fields,
+        geometry=request.query_params.get("geometry", "full"))
+
+    response = StreamingHttpResponse(
+        export.stream_export(queryset, export_format),
+        content_type=export.EXPORT_FORMATS[export_format])
+    response["Content-Disposition"] = \
+        'attachment; filename="%s.%s"' % (document_type, export_format)
+    return response
+
+
+@api_view(['GET'])
+def facets(request, document_type, key=None, format=None):
+    """
+    Number of indices per value of the facet keys of a document type.
+
+    The counts come from the facet store unless filters are given or the
+    user is not allowed to see all indices - they are then counted in the
+    matching indices.
+    """
+    doctype = get_object_or_404(models.DocumentType, name=document_type)
+    keys = doctype.indexer.get_plugin().facets
+    if key is not None:
+        if key not in keys:
+            raise Http404("'%s' is not a facet of the '%s' document type." % (
+                key, document_type))
+        keys = [key]
+
+    params = {_k: _v for _k, _v in request.query_params.items()
+              if _k != "format"}
+    scope = models.DocumentIndex.objects.get_retrieve_permission_scope(
+        doctype, request.user)
+    if not params and len(scope) == doctype.retrieve_permissions.count():
+        counts = {_k: models.Facet.objects.get_counts(document_type, _k)
+                  for _k in keys}
+    else:
+        queryset = models.DocumentIndex.objects.get_filtered_queryset(
+            document_type=document_type, user=request.user, **params)
+        counts = {_k: models.Facet.objects.count_values(queryset, _k)
+                  for _k in keys}
+
+    return Response(collections.OrderedDict(
+        (_k, [collections.OrderedDict([("value", value), ("count", count)])
+              for value, count in counts[_k]])
+        for _k in keys))
+
+
+@api_view(['GET'])
+def tile(request, document_type, z, x, y, tile_format=None):
+    """
+    Map tile with the clustered indices of a document type. Accepts the
+    same filters as the document indices list.
+    """
+    z, x, y = int(z), int(x), int(y)
+    if z > 30 or x >= 2 ** z or y >= 2 ** z:
+        raise Http404
+    tile_format = tile_format or "geojson"
+    get_object_or_404(models.DocumentType, name=document_type)
+    data = tiles.get_tile(document_type, z, x, y, tile_format,
+                          params=request.query_params.dict(),
+                          user=request.user)
+    return HttpResponse(data,
+                        content_type=tiles.TILE_FORMATS[tile_format])
 
 
 def attachment_data(request, pk, *args, **kwargs):
     """
     Get the data for the attachment with a certain id.
     """
+    # The validators are checked before the data is loaded. Attachments
+    # are never stored compressed.
+    sha1, modified_at = get_object_or_404(
+        models.DocumentIndexAttachment.objects.values_list(
+            "sha1", "modified_at"), pk=pk)
+    response = get_not_modified_response(request, sha1, modified_at)
+    if response is not None:
+        return response
+
     attachment = get_object_or_404(models.DocumentIndexAttachment, pk=pk)
-    return HttpResponse(content=attachment.data,
-                        content_type=attachment.content_type)
+    response = blob_response(attachment, content_type=attachment.content_type,
+                             request=request)
+    return set_validators(response, sha1, modified_at)
+
+
+@api_view(['GET'])
+def indexing_jobs(request, format=None):
+    """
+    Number of indexing jobs per status.
+    """
+    return Response(indexing_queue.get_queue_status())
+
+
+@api_view(['GET'])
+def indexing_job(request, pk, format=None):
+    """
+    Status of a single indexing job.
+    """
+    job = get_object_or_404(models.IndexingJob.objects.select_related(
+        "document", "document__document_type"), pk=pk)
+    return Response(collections.OrderedDict([
+        ("id", job.pk),
+        ("status", job.status),
+        ("error", job.error or None),
+        ("document", reverse(
+            "rest_documents-detail",
+            kwargs={"document_type": job.document.document_type.name,
+                    "name": job.document.name}, request=request)),
+        ("created_at", job.created_at),
+        ("started_at", job.started_at),
+        ("finished_at", job.finished_at)]))
+
+
+@api_view(['GET'])
+@renderer_classes(list(api_settings.DEFAULT_RENDERER_CLASSES) +
+                  [EventStreamRenderer])
+def changes_feed(request, format=None):
+    """
+    Changes to the documents and indices after the ``since`` cursor.
+
+    Pass ``wait`` to wait up to that many seconds for new changes if there
+    are none. Clients accepting ``text/event-stream`` get the changes as
+    server-sent events.
+    """
+    document_type = request.query_params.get("document_type")
+    since = request.query_params.get(
+        "since", request.META.get("HTTP_LAST_EVENT_ID", "0"))
+    try:
+        since = changes.get_latest_cursor() if since == "now" else int(since)
+        limit = int(request.query_params.get("limit", 100))
+        wait = min(float(request.query_params.get("wait", 0)),
+                   settings.JANE_CHANGES_MAX_WAIT)
+    except ValueError:
+        raise JaneInvalidRequestException(
+            "'since', 'limit', and 'wait' must be numbers.")
+    if limit < 1:
+        raise JaneInvalidRequestException("'limit' must be at least 1.")
+    limit = min(limit, settings.JANE_CHANGES_MAX_LIMIT)
+
+    if request.accepted_renderer.format == "sse":
+        return StreamingHttpResponse(
+            changes.stream_changes(since, user=request.user, request=request,
+                                   document_type=document_type),
+            content_type="text/event-stream")
+
+    results, cursor, has_more = changes.get_changes(
+        since, user=request.user, document_type=document_type, limit=limit)
+    if cursor == since and wait > 0 and changes.wait_for_changes(
+            since, document_type=document_type, timeout=wait):
+        results, cursor, has_more = changes.get_changes(
+            since, user=request.user, document_type=document_type,
+            limit=limit)
+
+    url = request.build_absolute_uri()
+    return Response(collections.OrderedDict([
+        ("cursor", cursor),
+        ("next", replace_query_param(url, "since", cursor)),
+        ("has_more", has_more),
+        ("results", [changes.serialize_change(_i, request)
+                     for _i in results])]))
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import collections
 import csv
 import io
 
@@ -7,18 +8,34 @@ from lxml import etree
 from obspy import UTCDateTime
 from obspy.geodetics import FlinnEngdahl
 
-from jane.documents.models import DocumentIndex
+from django.db.models.expressions import OrderBy, RawSQL
+
+from jane.documents.models import Document, DocumentIndex
+from jane.documents.storage import open_blob
 
 
 FG = FlinnEngdahl()
 
+# Number of documents whose data is retrieved with a single query.
+DOCUMENT_CHUNK_SIZE = 50
+
+# Maps the FDSN orderby values to the JSON key, its type, and the sort
+# direction.
+ORDERINGS = {
+    "time": ("origin_time", "UTCDateTime", True),
+    "time-asc": ("origin_time", "UTCDateTime", False),
+    "magnitude": ("magnitude", "float", True),
+    "magnitude-asc": ("magnitude", "float", False)
+}
+
 
 def query_event(fh, nodata, orderby, format, starttime=None, endtime=None,
                 minlatitude=None, maxlatitude=None, minlongitude=None,
                 maxlongitude=None, mindepth_in_km=None, maxdepth_in_km=None,
                 minmagnitude=None, maxmagnitude=None, latitude=None,
                 longitude=None, minradius=None, maxradius=None,
-                contributor=None, eventid=None, author=None):
+                contributor=None, eventid=None, author=None, limit=None,
+                offset=None):
     """
     Process query and generate a combined QuakeML or event text file.
     Parameters are interpreted as in the FDSNWS definition. Results are
@@ -32,15 +49,6 @@ def query_event(fh, nodata, orderby, format, starttime=None, endtime=None,
     if endtime is not None:
         kwargs["max_origin_time"] = UTCDateTime(endtime)
 
-    # Spatial constraints.
-    if minlatitude is not None:
-        kwargs["min_latitude"] = minlatitude
-    if maxlatitude is not None:
-        kwargs["max_latitude"] = maxlatitude
-    if minlongitude is not None:
-        kwargs["min_longitude"] = minlongitude
-    if maxlongitude is not None:
-        kwargs["max_longitude"] = maxlongitude
     if mindepth_in_km is not None:
         kwargs["min_depth_in_m"] = mindepth_in_km * 1000
     if maxdepth_in_km is not None:
@@ -48,7 +56,7 @@ def query_event(fh, nodata, orderby, format, starttime=None, endtime=None,
     if minmagnitude is not None:
         kwargs["min_magnitude"] = minmagnitude
     if maxmagnitude is not None:
-        kwargs["max_magnitude"] = minmagnitude
+        kwargs["max_magnitude"] = maxmagnitude
 
     # Jane maps the contributor to the agency.
     if contributor is not None:
@@ -62,25 +70,18 @@ def query_event(fh, nodata, orderby, format, starttime=None, endtime=None,
     query = DocumentIndex.objects.get_filtered_queryset(
         document_type="quakeml", **kwargs)
 
-    # Apply the ordering on the JSON fields.
-    # XXX: Can be replaced in Django 1.9 with the native JSON fields. Maybe
-    # there is some other nice way in the meantime?
-    if orderby == "time":
-        query = query \
-            .extra(select={"origin_time": "json->>'origin_time'"}) \
-            .extra(order_by=["-origin_time"])
-    elif orderby == "time-asc":
-        query = query \
-            .extra(select={"origin_time": "json->>'origin_time'"}) \
-            .extra(order_by=["origin_time"])
-    elif orderby == "magnitude":
-        query = query\
-            .extra(select={"magnitude": "json->>'magnitude'"})\
-            .extra(order_by=["-magnitude"])
-    elif orderby == "magnitude-asc":
-        query = query \
-            .extra(select={"magnitude": "json->>'magnitude'"}) \
-            .extra(order_by=["magnitude"])
+    # Rectangular spatial constraints.
+    query = DocumentIndex.objects.filter_by_bounding_box(
+        queryset=query, min_latitude=minlatitude, max_latitude=maxlatitude,
+        min_longitude=minlongitude, max_longitude=maxlongitude)
+
+    # Apply the ordering on the JSON fields. Use the typed expressions so the
+    # expression indices can be used for the ordering.
+    if orderby in ORDERINGS:
+        key, value_type, descending = ORDERINGS[orderby]
+        template = DocumentIndex.objects.JSON_ORDERING_TEMPLATE[value_type]
+        query = query.order_by(OrderBy(RawSQL(template % key, []),
+                                       descending=descending))
 
     # Radial queries.
     if latitude is not None:
@@ -89,6 +90,13 @@ def query_event(fh, nodata, orderby, format, starttime=None, endtime=None,
             central_latitude=latitude, central_longitude=longitude,
             min_radius=minradius, max_radius=maxradius)
 
+    # Push limit and offset to the database. The FDSN offset starts at 1.
+    start = (offset - 1) if offset else 0
+    if limit is not None:
+        query = query[start:start + limit]
+    elif start:
+        query = query[start:]
+
     results = query.all()
     if not results:
         return nodata
@@ -103,12 +111,30 @@ def query_event(fh, nodata, orderby, format, starttime=None, endtime=None,
         root_el.append(catalog_el)
         # Inverse is true for the stations.
 
-        # Now things get a bit more interesting and this might actually require
-        # a different approach to be fast enough.
+        # Group the requested events per document so each document has to
+        # be retrieved and parsed only once.
+        event_ids = collections.OrderedDict()
+        order = []
         for result in results:
             quakeml_id = result.json["quakeml_id"]
-            data = io.BytesIO(result.document.data)
-            event = get_event_node(data, quakeml_id)
+            event_ids.setdefault(result.document_id, set()).add(quakeml_id)
+            order.append((result.document_id, quakeml_id))
+
+        events = {}
+        document_ids = list(event_ids.keys())
+        for i in range(0, len(document_ids), DOCUMENT_CHUNK_SIZE):
+            chunk = document_ids[i:i + DOCUMENT_CHUNK_SIZE]
+            documents = Document.objects.filter(pk__in=chunk).values_list(
+                "pk", "data", "sha1", "compression")
+            for pk, data, sha1, compression in documents:
+                with open_blob(data, sha1, compression) as buf:
+                    nodes = get_event_nodes(buf, event_ids[pk])
+                for quakeml_id, node in nodes.items():
+                    events[(pk, quakeml_id)] = node
+
+        # Write them in the requested order.
+        for key in order:
+            event = events.pop(key, None)
             if event is None:
                 continue
             catalog_el.append(event)
@@ -138,7 +164,11 @@ def query_event(fh, nodata, orderby, format, starttime=None, endtime=None,
                     # Convert depth to km.
                     row[4] /= 1000.0
 
-                if row[2] is not None and row[3] is not None:
+                # The region is computed during indexing. Only documents
+                # that have not been reindexed since then lack it.
+                if "region" in result.json:
+                    row.append(result.json["region"] or "")
+                elif row[2] is not None and row[3] is not None:
                     row.append(FG.get_region(row[3], row[2]))
                 else:
                     row.append("")
@@ -152,23 +182,32 @@ def query_event(fh, nodata, orderby, format, starttime=None, endtime=None,
     return 200
 
 
-def get_event_node(buffer, event_id):
+def get_event_nodes(buffer, event_ids):
     """
-    Really fast way to extract the event node from QuakeML file with the
-    correct event_id.
+    Really fast way to extract all event nodes with the given ids from a
+    QuakeML file in a single pass.
+
+    Returns a dictionary mapping the event ids to the event nodes. Events
+    that cannot be found are not part of the dictionary.
     """
     event_tag = "{http://quakeml.org/xmlns/bed/1.2}event"
+    event_ids = set(event_ids)
 
-    context = etree.iterparse(buffer, events=("start", ),
+    context = etree.iterparse(buffer, events=("end", ),
                               tag=(event_tag,))
 
-    event = []
+    events = {}
     for _, elem in context:
-        if elem.attrib["publicID"] == event_id:
-            event.append(elem)
-            break
+        event_id = elem.attrib.get("publicID")
+        if event_id in event_ids and event_id not in events:
+            # Detach it so it survives the clean-up below.
+            elem.getparent().remove(elem)
+            events[event_id] = elem
+            if len(events) == len(event_ids):
+                break
+            continue
+        # Free memory of all events that are not needed.
+        elem.clear()
         while elem.getprevious() is not None:
             del elem.getparent()[0]
-    if event:
-        return event[0]
-    return None
+    return events
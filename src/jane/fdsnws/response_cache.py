@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the responses of the FDSN event and station queries.
+
+The keys contain the normalized query parameters, what the user is allowed
+to see, and the data version of the document type which changes with every
+document, index, or restriction. Cached responses are thus never outdated
+and nothing has to be invalidated explicitly.
+
+Small responses are stored in Django's default cache, larger ones in files
+below ``JANE_FDSNWS_CACHE_ROOT``. The hash of the key doubles as the ETag
+of the response so clients can revalidate their copies without any query
+being run.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.shortcuts import get_object_or_404
+
+from jane.documents.models import DocumentIndex, DocumentType
+
+
+def _get_file_cache():
+    if not settings.JANE_FDSNWS_CACHE_ROOT:
+        return None
+    return FileBasedCache(settings.JANE_FDSNWS_CACHE_ROOT, {
+        "TIMEOUT": settings.JANE_FDSNWS_CACHE_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": settings.JANE_FDSNWS_CACHE_MAX_FILES}})
+
+
+def get_cache_key(service, document_type, params, user):
+    """
+    Cache key of a query.
+
+    :param service: The name of the FDSN service.
+    :param document_type: The name of the queried document type.
+    :param params: Dictionary with the parsed query parameters.
+    :param user: The user the query is run for, None for anonymous users.
+    """
+    doctype = get_object_or_404(DocumentType, name=document_type)
+    scope = list(DocumentIndex.objects.get_retrieve_permission_scope(
+        doctype, user))
+    # Users without some permission might still see more than anonymous
+    # users, e.g. the stations of restrictions they are part of.
+    if user is not None and user.is_authenticated() and \
+            len(scope) < doctype.retrieve_permissions.count():
+        scope.append("user:%i" % user.pk)
+    query = hashlib.sha1(json.dumps(
+        [sorted(params.items()), scope], default=str).encode()).hexdigest()
+    return "jane_fdsnws:%s:%s:%i:%s" % (service, document_type,
+                                        doctype.data_version, query)
+
+
+def get_validators(key, document_type):
+    """
+    The ETag, without quotes, and the Last-Modified time of the response of
+    a query.
+
+    :param key: The cache key of the query.
+    :param document_type: The name of the queried document type.
+    """
+    etag = hashlib.sha1(key.encode()).hexdigest()
+    last_modified = DocumentType.objects.filter(
+        name=document_type).values_list("data_modified_at", flat=True).first()
+    return etag, last_modified
+
+
+def get(key):
+    """
+    The cached response data of a key or None.
+    """
+    if not settings.JANE_FDSNWS_CACHE_TIMEOUT:
+        return None
+    data = cache.get(key)
+    if data is None:
+        file_cache = _get_file_cache()
+        if file_cache is not None:
+            data = file_cache.get(key)
+    return data
+
+
+def set(key, data):
+    """
+    Cache the response data of a key.
+    """
+    if not settings.JANE_FDSNWS_CACHE_TIMEOUT:
+        return
+    if len(data) <= settings.JANE_FDSNWS_CACHE_MAX_MEMORY_SIZE:
+        cache.set(key, data, settings.JANE_FDSNWS_CACHE_TIMEOUT)
+        return
+    file_cache = _get_file_cache()
+    if file_cache is not None:
+        file_cache.set(key, data)
+
+
+def clear():
+    """
+    Remove all cached responses - and everything else in the default cache.
+    """
+    cache.clear()
+    file_cache = _get_file_cache()
+    if file_cache is not None:
+        file_cache.clear()
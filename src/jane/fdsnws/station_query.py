@@ -12,6 +12,7 @@ from django.conf import settings
 from django.shortcuts import get_object_or_404
 
 import jane
+from jane.documents.json_indices import JSON_INDEX_EXPRESSIONS
 from jane.documents.models import DocumentIndex, DocumentType
 
 
@@ -23,11 +24,12 @@ def _format_time(value):
     return value.strftime("%Y-%m-%dT%H:%M:%S+00:00")
 
 
+# Must match the expression indices in jane.documents.json_indices.
 JSON_QUERY_TEMPLATE_MAP = {
-    int: "CAST(json->>'%s' AS INTEGER) %s %s",
-    float: "CAST(json->>'%s' AS REAL) %s %s",
-    str: "json->>'%s' %s '%s'",
-    UTCDateTime: "CAST(json->>'%s' AS TIMESTAMP) %s TIMESTAMP '%s'"
+    int: JSON_INDEX_EXPRESSIONS["int"] + " %s %s",
+    float: JSON_INDEX_EXPRESSIONS["float"] + " %s %s",
+    str: JSON_INDEX_EXPRESSIONS["str"] + " %s LOWER('%s')",
+    UTCDateTime: JSON_INDEX_EXPRESSIONS["UTCDateTime"] + " %s TIMESTAMP '%s'"
 }
 
 
@@ -150,18 +152,6 @@ def query_stations(fh, url, nodata, level, format, user, starttime=None,
         where.append(
             "((json->>'end_date') is null) OR (" +
             _get_json_query("end_date", ">", UTCDateTime, endafter) + ")")
-    if minlatitude is not None:
-        where.append(
-            _get_json_query("latitude", ">=", float, minlatitude))
-    if maxlatitude is not None:
-        where.append(
-            _get_json_query("latitude", "<=", float, maxlatitude))
-    if minlongitude is not None:
-        where.append(
-            _get_json_query("longitude", ">=", float, minlongitude))
-    if maxlongitude is not None:
-        where.append(
-            _get_json_query("longitude", "<=", float, maxlongitude))
 
     for key in ["network", "station", "location", "channel"]:
         argument = locals()[key]
@@ -173,10 +163,14 @@ def query_stations(fh, url, nodata, level, format, user, starttime=None,
             n = []
             y = []
             for _i in argument:
+                # SEED codes are case insensitive. This also enables the
+                # use of the expression indices.
                 if _i.startswith("-"):
-                    n.append("json->>'%s' NOT LIKE '%s'" % (key, _i[1:]))
+                    n.append("LOWER(json->>'%s') NOT LIKE LOWER('%s')" % (
+                        key, _i[1:]))
                 else:
-                    y.append("json->>'%s' LIKE '%s'" % (key, _i))
+                    y.append("LOWER(json->>'%s') LIKE LOWER('%s')" % (
+                        key, _i))
             if y:
                 where.append(" OR ".join(y))
             if n:
@@ -185,6 +179,11 @@ def query_stations(fh, url, nodata, level, format, user, starttime=None,
     if where:
         query = query.extra(where=where)
 
+    # Rectangular spatial constraints.
+    query = DocumentIndex.objects.filter_by_bounding_box(
+        queryset=query, min_latitude=minlatitude, max_latitude=maxlatitude,
+        min_longitude=minlongitude, max_longitude=maxlongitude)
+
     # Radial queries - also apply the per-user filtering right here!
     if latitude is not None:
         query = DocumentIndex.objects.get_filtered_queryset_radial_distance(
@@ -556,46 +555,45 @@ def assemble_network_elements(results, level, stats):
 
 
 def parse_stationxml_files(results):
-    parsed_docs = []
+    parsed_docs = set()
     final_results = {
         "networks": collections.OrderedDict(),
         "stations": collections.OrderedDict(),
         "channels": collections.OrderedDict()
     }
     for result in results:
-        # The indexed document which contains the data.
-        pk = result.pk
+        # Each document contains many channels - only parse it once.
+        pk = result.document_id
         if pk in parsed_docs:
             continue
-        parsed_docs.append(pk)
-        data = io.BytesIO(result.document.data)
-
-        # Small state machine.
-        net_state, sta_state = [None, None]
-
-        ns = "http://www.fdsn.org/xml/station/1"
-        network_tag = "{%s}Network" % ns
-        station_tag = "{%s}Station" % ns
-        channel_tag = "{%s}Channel" % ns
-
-        tags = (network_tag, station_tag, channel_tag)
-        context = etree.iterparse(data, events=("start", ), tag=tags)
-
-        for _, elem in context:
-            if elem.tag == channel_tag:
-                channel = elem.get('code')
-                location = elem.get('locationCode').strip()
-                starttime = str(UTCDateTime(elem.get('startDate')))
-                endtime = elem.get('endDate')
-                if endtime:
-                    endtime = str(UTCDateTime(endtime))
-                final_results["channels"][(
-                    net_state, sta_state, location, channel, starttime,
-                    endtime)] = elem
-            elif elem.tag == station_tag:
-                sta_state = elem.get('code')
-                final_results["stations"][(net_state, sta_state)] = elem
-            elif elem.tag == network_tag:
-                net_state = elem.get('code')
-                final_results["networks"][net_state] = elem
+        parsed_docs.add(pk)
+        with result.document.open_data() as data:
+            # Small state machine.
+            net_state, sta_state = [None, None]
+
+            ns = "http://www.fdsn.org/xml/station/1"
+            network_tag = "{%s}Network" % ns
+            station_tag = "{%s}Station" % ns
+            channel_tag = "{%s}Channel" % ns
+
+            tags = (network_tag, station_tag, channel_tag)
+            context = etree.iterparse(data, events=("start", ), tag=tags)
+
+            for _, elem in context:
+                if elem.tag == channel_tag:
+                    channel = elem.get('code')
+                    location = elem.get('locationCode').strip()
+                    starttime = str(UTCDateTime(elem.get('startDate')))
+                    endtime = elem.get('endDate')
+                    if endtime:
+                        endtime = str(UTCDateTime(endtime))
+                    final_results["channels"][(
+                        net_state, sta_state, location, channel, starttime,
+                        endtime)] = elem
+                elif elem.tag == station_tag:
+                    sta_state = elem.get('code')
+                    final_results["stations"][(net_state, sta_state)] = elem
+                elif elem.tag == network_tag:
+                    net_state = elem.get('code')
+                    final_results["networks"][net_state] = elem
     return final_results
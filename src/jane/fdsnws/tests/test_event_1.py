@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import os
+from unittest import mock
+
+import django
+from django.contrib.auth.models import User, Permission
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, override_settings
+
+from lxml import etree
+
+from jane.documents.models import Document
+from jane.documents.plugins import initialize_plugins
+from jane.fdsnws import response_cache
+from jane.fdsnws.event_query import get_event_nodes
+
+
+django.setup()
+
+
+PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    __file__))), "quakeml", "tests", "data")
+FILES = {
+    "usgs": os.path.join(PATH, "usgs_event.xml")
+}
+
+EVENT_IDS = [
+    "quakeml:comcat.cr.usgs.gov/fdsnws/event/1/query?eventid=ci37285320"
+    "&amp;format=quakeml",
+    "quakeml:comcat.cr.usgs.gov/fdsnws/event/1/query?eventid=uw60916552"
+    "&amp;format=quakeml"]
+
+
+def _get_event_ids(content):
+    root = etree.fromstring(content)
+    return [_i.get("publicID") for _i in
+            root.iter("{http://quakeml.org/xmlns/bed/1.2}event")]
+
+
+class Event1TestCase(TestCase):
+
+    def setUp(self):
+        # The test case class somehow messes with the plugins - thus we have
+        # to initialize them all the time.
+        initialize_plugins()
+        response_cache.clear()
+
+        self.user = User.objects.get_or_create(
+            username='random', password=make_password('random'))[0]
+        self.user.user_permissions.add(Permission.objects.filter(
+            codename='can_modify_quakeml').first())
+
+        with open(FILES["usgs"], "rb") as fh:
+            Document.objects.add_or_modify_document(
+                document_type="quakeml",
+                name="quake.xml",
+                data=fh.read(),
+                user=self.user)
+
+    def test_get_event_nodes(self):
+        # All events in a single pass.
+        with open(FILES["usgs"], "rb") as fh:
+            nodes = get_event_nodes(fh, EVENT_IDS + ["does_not_exist"])
+        self.assertEqual(sorted(nodes.keys()), sorted(EVENT_IDS))
+        for event_id, node in nodes.items():
+            self.assertEqual(node.get("publicID"), event_id)
+            # Full events with all children.
+            self.assertTrue(node.getchildren())
+
+        # Only a single event.
+        with open(FILES["usgs"], "rb") as fh:
+            nodes = get_event_nodes(fh, EVENT_IDS[1:])
+        self.assertEqual(list(nodes.keys()), EVENT_IDS[1:])
+
+    def test_response_cache(self):
+        path = "/fdsnws/event/1/query?orderby=time"
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+
+        # Served from the cache - also with differently spelled parameters.
+        with mock.patch("jane.fdsnws.views.event_1.query_event") as p:
+            for url in (path, path + "&format=xml",
+                        "/fdsnws/event/1/query?minradius=0"):
+                r = self.client.get(url)
+                self.assertEqual(r.status_code, 200)
+                self.assertEqual(r.content, response.content)
+            self.assertEqual(p.call_count, 0)
+
+        # Large responses are stored as files.
+        with override_settings(JANE_FDSNWS_CACHE_MAX_MEMORY_SIZE=10):
+            path = "/fdsnws/event/1/query?orderby=time-asc"
+            content = self.client.get(path).content
+            with mock.patch("jane.fdsnws.views.event_1.query_event") as p:
+                self.assertEqual(self.client.get(path).content, content)
+            self.assertEqual(p.call_count, 0)
+
+        # Changing the data invalidates the cache.
+        Document.objects.get(name="quake.xml").delete()
+        self.assertEqual(self.client.get(path).status_code, 204)
+
+    def test_conditional_get(self):
+        path = "/fdsnws/event/1/query?orderby=time"
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        # Revalidated copies are not queried again.
+        with mock.patch("jane.fdsnws.views.event_1.query_event") as p:
+            r = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(r.status_code, 304)
+            self.assertEqual(r["ETag"], etag)
+            r = self.client.get(path, HTTP_IF_MODIFIED_SINCE=(
+                response["Last-Modified"]))
+            self.assertEqual(r.status_code, 304)
+        self.assertEqual(p.call_count, 0)
+
+        # Other queries have other ETags.
+        r = self.client.get("/fdsnws/event/1/query?orderby=time-asc",
+                            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+
+        # As does the same query after the data changed.
+        Document.objects.get(name="quake.xml").delete()
+        r = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotEqual(r.status_code, 304)
+
+    def test_query_xml_ordering(self):
+        response = self.client.get("/fdsnws/event/1/query?orderby=time")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_get_event_ids(response.content), EVENT_IDS[::-1])
+
+        response = self.client.get("/fdsnws/event/1/query?orderby=time-asc")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_get_event_ids(response.content), EVENT_IDS)
+
+    def test_query_limit_and_offset(self):
+        response = self.client.get("/fdsnws/event/1/query?limit=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_get_event_ids(response.content), EVENT_IDS[1:])
+
+        response = self.client.get(
+            "/fdsnws/event/1/query?limit=1&offset=2&orderby=time")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_get_event_ids(response.content), EVENT_IDS[:1])
+
+        response = self.client.get("/fdsnws/event/1/query?offset=3")
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get("/fdsnws/event/1/query?limit=0")
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_orderby_magnitude(self):
+        # Magnitudes have to be sorted numerically.
+        response = self.client.get(
+            "/fdsnws/event/1/query?orderby=magnitude")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_get_event_ids(response.content), EVENT_IDS[::-1])
+
+        response = self.client.get(
+            "/fdsnws/event/1/query?orderby=magnitude-asc")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_get_event_ids(response.content), EVENT_IDS)
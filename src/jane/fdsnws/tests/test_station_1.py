@@ -18,6 +18,7 @@ from obspy.io.stationxml.core import validate_stationxml
 
 from jane.documents.models import Document
 from jane.documents.plugins import initialize_plugins
+from jane.fdsnws import response_cache
 from jane.waveforms.models import Restriction
 
 
@@ -37,6 +38,7 @@ class Station1TestCase(TestCase):
         # The test case class somehow messes with the plugins - thus we have
         # to initialize them all the time.
         initialize_plugins()
+        response_cache.clear()
 
         self.user = User.objects.get_or_create(
             username='random', password=make_password('random'))[0]
@@ -434,6 +436,7 @@ class Station1LiveServerTestCase(LiveServerTestCase):
         # The test case class somehow messes with the plugins - thus we have
         # to initialize them all the time.
         initialize_plugins()
+        response_cache.clear()
 
         self.user = User.objects.get_or_create(
             username='random', password=make_password('random'))[0]
@@ -705,6 +708,17 @@ class Station1LiveServerTestCase(LiveServerTestCase):
             client.get_stations(minlatitude=48, maxlatitude=49,
                                 minlongitude=11, maxlongitude=11.4)
 
+        # Boxes crossing the antimeridian.
+        self.assertEqual(
+            len(client.get_stations(
+                minlatitude=48, maxlatitude=49,
+                minlongitude=170, maxlongitude=12).get_contents()["stations"]),
+            1)
+
+        with self.assertRaises(FDSNException):
+            client.get_stations(minlatitude=48, maxlatitude=49,
+                                minlongitude=12, maxlongitude=11)
+
     def test_radial_queries(self):
         client = FDSNClient(self.live_server_url)
         lat = 48.995167 + 1.0
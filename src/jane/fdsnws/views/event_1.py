@@ -10,8 +10,10 @@ from lxml import etree
 from lxml.builder import E
 
 from jane.documents.models import DocumentIndex
+from jane.fdsnws import response_cache
 from jane.fdsnws.event_query import query_event
 from jane.fdsnws.views.utils import fdnsws_error, parse_query_parameters
+from jane.jane.utils import get_not_modified_response, set_validators
 
 import obspy
 
@@ -114,6 +116,16 @@ QUERY_PARAMETERS = {
         "type": str,
         "required": False,
         "default": None},
+    "limit": {
+        "aliases": ["limit"],
+        "type": int,
+        "required": False,
+        "default": None},
+    "offset": {
+        "aliases": ["offset"],
+        "type": int,
+        "required": False,
+        "default": None},
     "orderby": {
         "aliases": ["orderby"],
         "type": str,
@@ -210,6 +222,20 @@ def query(request):
         return _error(request, "nodata must be '204' or '404'.",
                       status_code=400)
 
+    if params.get("orderby") not in ["time", "time-asc", "magnitude",
+                                     "magnitude-asc"]:
+        return _error(request, "orderby must be 'time', 'time-asc', "
+                               "'magnitude', or 'magnitude-asc'.",
+                      status_code=400)
+
+    if params.get("limit") is not None and params["limit"] < 1:
+        return _error(request, "limit must be a positive integer.",
+                      status_code=400)
+
+    if params.get("offset") is not None and params["offset"] < 1:
+        return _error(request, "offset must be a positive integer.",
+                      status_code=400)
+
     if params.get("format") not in ["xml", "text"]:
         return _error(request, "format must be 'xml' or 'text'.",
                       status_code=400)
@@ -221,13 +247,26 @@ def query(request):
     else:
         raise NotImplementedError
 
+    # Events are always queried as an anonymous user.
+    key = response_cache.get_cache_key("event", "quakeml", params, None)
+    etag, last_modified = response_cache.get_validators(key, "quakeml")
+    response = get_not_modified_response(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    data = response_cache.get(key)
+    if data is not None:
+        return set_validators(HttpResponse(data, content_type=content_type),
+                              etag, last_modified)
+
     with io.BytesIO() as fh:
         status = query_event(fh, **params)
-        fh.seek(0, 0)
 
         if status == 200:
-            response = HttpResponse(fh, content_type=content_type)
-            return response
+            data = fh.getvalue()
+            response_cache.set(key, data)
+            response = HttpResponse(data, content_type=content_type)
+            return set_validators(response, etag, last_modified)
         else:
             msg = 'Not Found: No data selected'
             return _error(request, msg, status)
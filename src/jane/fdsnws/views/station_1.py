@@ -7,6 +7,8 @@ from django.shortcuts import render
 import obspy
 
 from jane.jane.decorators import logged_in_or_basicauth
+from jane.jane.utils import get_not_modified_response, set_validators
+from jane.fdsnws import response_cache
 from jane.fdsnws.station_query import query_stations
 from jane.fdsnws.views.utils import fdnsws_error, parse_query_parameters
 
@@ -255,13 +257,27 @@ def query(request):
     else:
         user = None
 
+    # The url is part of the StationXML files and thus of the key.
+    key = response_cache.get_cache_key(
+        "station", "stationxml", dict(params, url=url), user)
+    etag, last_modified = response_cache.get_validators(key, "stationxml")
+    response = get_not_modified_response(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    data = response_cache.get(key)
+    if data is not None:
+        return set_validators(HttpResponse(data, content_type=content_type),
+                              etag, last_modified)
+
     with io.BytesIO() as fh:
         status = query_stations(fh, url=url, user=user, **params)
-        fh.seek(0, 0)
 
         if status == 200:
-            response = HttpResponse(fh, content_type=content_type)
-            return response
+            data = fh.getvalue()
+            response_cache.set(key, data)
+            response = HttpResponse(data, content_type=content_type)
+            return set_validators(response, etag, last_modified)
         else:
             msg = 'Not Found: No data selected'
             return _error(request, msg, status)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Row counts that do not scan large tables.
+
+``COUNT(*)`` has to visit every row in PostgreSQL. Wherever an approximate
+number is good enough, tables with more than
+``JANE_ESTIMATED_COUNT_THRESHOLD`` rows are counted with the estimates of
+the query planner instead - the statistics in ``pg_class`` for whole tables
+and the row estimate of the query plan for filtered querysets. Smaller
+tables are counted exactly.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+
+
+def get_table_estimate(model):
+    """
+    Estimated number of rows of the table of a model from the statistics
+    of PostgreSQL. None if the table has never been analyzed.
+
+    :param model: The model class.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class "
+                       "WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def get_queryset_estimate(queryset):
+    """
+    Number of rows of a queryset as estimated by the query planner.
+
+    :param queryset: The queryset.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimate_count(queryset):
+    """
+    Number of rows of a queryset, estimated if it is larger than
+    ``JANE_ESTIMATED_COUNT_THRESHOLD``.
+
+    :param queryset: The queryset or manager.
+    """
+    queryset = queryset.all()
+    if queryset.query.where or queryset.query.distinct or \
+            queryset.query.group_by is not None:
+        estimate = get_queryset_estimate(queryset.order_by())
+    else:
+        estimate = get_table_estimate(queryset.model)
+    if estimate is None or estimate < settings.JANE_ESTIMATED_COUNT_THRESHOLD:
+        return queryset.count()
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for the admin changelists of large tables. Set
+    ``show_full_result_count = False`` on the admin as well, it otherwise
+    counts the whole table once more.
+    """
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import base64
+import collections
+import datetime
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # Not Django's JSON encoder as it truncates times to milliseconds.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError("%r is not JSON serializable" % value)
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """
+    Cursor based pagination on the ordering key and the primary key.
+
+    The cursor encodes the ordering key and the primary key of the last
+    record of a page and the next page starts right after it. Deep pages thus
+    cost the same as the first page as long as the ordering key is indexed.
+    The total number of records is only counted if ``count=true`` is passed.
+
+    Views can define a ``get_keyset_ordering()`` method returning a tuple of
+    an expression and a flag if it is sorted in descending order, or None to
+    sort by primary key only. Requests with an ``offset`` fall back to the
+    offset pagination.
+    """
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    invalid_cursor_message = "Invalid cursor."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_offset = self.offset_query_param in request.query_params
+        if self.use_offset:
+            return super().paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        # The page numbers of the offset pagination cannot be shown.
+        self.display_page_controls = False
+
+        ordering = None
+        if hasattr(view, "get_keyset_ordering"):
+            ordering = view.get_keyset_ordering()
+        if ordering is None:
+            queryset = queryset.order_by("pk")
+        else:
+            expression, descending = ordering
+            queryset = queryset.annotate(keyset_value=expression)
+            # The primary key is always ascending so records with the same
+            # key have a well defined order.
+            queryset = queryset.order_by(
+                "-keyset_value" if descending else "keyset_value", "pk")
+
+        cursor = self.decode_cursor(request)
+
+        if self.wants_count(request):
+            self.count = queryset.count()
+        else:
+            self.count = None
+
+        if cursor is not None:
+            queryset = queryset.filter(
+                self.get_cursor_filter(cursor, ordering))
+
+        # Fetch one more record to know if there is a next page.
+        results = list(queryset[:self.limit + 1])
+        self.has_next = len(results) > self.limit
+        results = results[:self.limit]
+        if self.has_next:
+            self.next_cursor = self.get_position(results[-1], queryset.model)
+        return results
+
+    def get_position(self, obj, model):
+        """
+        The ordering key and primary key of a model instance or of a
+        dictionary returned by a values queryset.
+        """
+        if isinstance(obj, dict):
+            return [obj.get("keyset_value"), obj[model._meta.pk.attname]]
+        return [getattr(obj, "keyset_value", None), obj.pk]
+
+    def get_cursor_filter(self, cursor, ordering):
+        """
+        Filter for all records after the cursor. NULL values are sorted
+        last in ascending and first in descending order.
+        """
+        value, pk = cursor
+        if ordering is None:
+            return Q(pk__gt=pk)
+        descending = ordering[1]
+        if value is None:
+            after = Q(keyset_value__isnull=True, pk__gt=pk)
+            if descending:
+                after |= Q(keyset_value__isnull=False)
+            return after
+        after = Q(keyset_value=value, pk__gt=pk)
+        if descending:
+            after |= Q(keyset_value__lt=value)
+        else:
+            after |= Q(keyset_value__gt=value) | \
+                Q(keyset_value__isnull=True)
+        return after
+
+    def wants_count(self, request):
+        value = request.query_params.get(self.count_query_param, "")
+        return value.lower() in ("t", "true", "yes", "y", "1")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(
+                encoded.encode("ascii")).decode("utf-8"))
+            value, pk = cursor
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def encode_cursor(self, cursor):
+        return base64.urlsafe_b64encode(json.dumps(
+            cursor, default=_encode_value).encode("utf-8")).decode("ascii")
+
+    def get_next_link(self):
+        if self.use_offset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.next_cursor))
+
+    def get_first_link(self):
+        url = self.request.build_absolute_uri()
+        return remove_query_param(url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        if self.use_offset:
+            return super().get_paginated_response(data)
+        content = collections.OrderedDict()
+        if self.count is not None:
+            content["count"] = self.count
+        content["next"] = self.get_next_link()
+        # Going backwards would require reversing the ordering - just start
+        # again from the first page.
+        content["first"] = self.get_first_link()
+        content["results"] = data
+        return Response(content)
@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
+import calendar
+
+from django.http import HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
 from rest_framework.routers import SimpleRouter
 
 
@@ -17,3 +21,51 @@ class OptionalTrailingSlashSimpleRouter(SimpleRouter):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.trailing_slash = "/?"
+
+
+def get_not_modified_response(request, etag, last_modified=None):
+    """
+    A "304 Not Modified" response if the copy of the client is current,
+    otherwise None. Call it before doing any work for the response.
+
+    :param request: The request with the conditional headers.
+    :param etag: The strong ETag of the current response, without quotes.
+    :param last_modified: The time of the last change of the response as a
+        timezone aware datetime, if known.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        # Takes precedence over If-Modified-Since. GET requests use the
+        # weak comparison.
+        etags = [_i.strip() for _i in if_none_match.split(",")]
+        etags = [_i[2:] if _i.startswith("W/") else _i for _i in etags]
+        if '"%s"' % etag not in etags and "*" not in etags:
+            return None
+    else:
+        if_modified_since = parse_http_date_safe(
+            request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+        if last_modified is None or if_modified_since is None or \
+                calendar.timegm(last_modified.utctimetuple()) > \
+                if_modified_since:
+            return None
+
+    return set_validators(HttpResponseNotModified(), etag, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    """
+    Add the ETag and Last-Modified headers to a response.
+
+    :param response: The response.
+    :param etag: The strong ETag of the response, without quotes.
+    :param last_modified: The time of the last change of the response as a
+        timezone aware datetime, if known.
+    """
+    response["ETag"] = '"%s"' % etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(
+            calendar.timegm(last_modified.utctimetuple()))
+    return response
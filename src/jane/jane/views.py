@@ -2,6 +2,7 @@
 from collections import OrderedDict
 
 from django.conf import settings
+from django.db.models import Sum
 from django.shortcuts import render
 
 from rest_framework.decorators import api_view
@@ -10,6 +11,7 @@ from rest_framework.reverse import reverse
 
 import jane
 from jane.documents import models, views
+from jane.jane.counts import estimate_count
 from jane.waveforms.models import ContinuousTrace
 
 from .serializer import UserSerializer
@@ -50,20 +52,26 @@ def rest_root(request, format=None):
     </div>
     """
     if request.method == "GET":
+        # The number of traces is estimated for large tables, those of the
+        # documents and indices are maintained by the database.
+        totals = models.DocumentType.objects.aggregate(
+            documents=Sum("document_count"), indices=Sum("index_count"))
+
         # Use OrderedDicts to force the order of keys. Is there a different
         # way to do this within DRF?
         waveforms = OrderedDict()
         waveforms["name"] = "waveforms"
         waveforms["url"] = reverse('rest_waveforms-list', request=request)
         waveforms["description"] = ("REST view of Jane's waveform database")
-        waveforms["available_traces"] = ContinuousTrace.objects.count()
+        waveforms["available_traces"] = estimate_count(
+            ContinuousTrace.objects)
 
         documents = OrderedDict()
         documents["name"] = "documents"
         documents["url"] = reverse(views.documents_rest_root, request=request)
         documents["description"] = ("Jane's document database at the "
                                     "document level")
-        documents["available_documents"] = models.Document.objects.count()
+        documents["available_documents"] = totals["documents"] or 0
 
         document_indices = OrderedDict()
         document_indices["name"] = "document_indices"
@@ -71,8 +79,7 @@ def rest_root(request, format=None):
                                           request=request)
         document_indices["description"] = (
             "Jane's document database at the index level")
-        document_indices["available_indices"] = \
-            models.DocumentIndex.objects.count()
+        document_indices["available_indices"] = totals["indices"] or 0
 
         return Response([waveforms, documents, document_indices])
 
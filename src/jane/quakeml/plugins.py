@@ -7,11 +7,27 @@ thus extensively commented.
 """
 # In the interest of quick import/startup times, please try to import within
 # the functions and not at the file level.
+import os
+
 from jane.documents.plugins import (ValidatorPluginPoint, IndexerPluginPoint,
                                     DocumentPluginPoint,
                                     RetrievePermissionPluginPoint)
 
 
+_FLINN_ENGDAHL = None
+
+
+def _get_flinn_engdahl():
+    """
+    Cached FlinnEngdahl instance as its initialization is slow.
+    """
+    global _FLINN_ENGDAHL
+    if _FLINN_ENGDAHL is None:
+        from obspy.geodetics import FlinnEngdahl
+        _FLINN_ENGDAHL = FlinnEngdahl()
+    return _FLINN_ENGDAHL
+
+
 class QuakeMLPlugin(DocumentPluginPoint):
     """
     Each document type for Jane's Document Database must have a
@@ -41,9 +57,14 @@ class QuakeMLValidatorPlugin(ValidatorPluginPoint):
     title = 'QuakeML XMLSchema Validator'
 
     def validate(self, document):
-        from obspy.io.quakeml.core import _validate as validate_quakeml  # NOQA
+        # Same as obspy.io.quakeml.core._validate() but with the shared tree
+        # and the cached schema.
+        import obspy.io.quakeml.core
+        from jane.documents.document_data import get_xml_schema, get_xml_tree
+        schema = os.path.join(os.path.dirname(obspy.io.quakeml.core.__file__),
+                              "data", "QuakeML-1.2.rng")
         try:
-            is_valid = validate_quakeml(document)
+            is_valid = get_xml_schema(schema).validate(get_xml_tree(document))
         except:
             is_valid = False
         return is_valid
@@ -61,6 +82,10 @@ class CanSeePrivateEventsRetrievePermissionPlugin(
     permission_codename = 'can_see_private_events'
     permission_name = 'Can See Private Events'
 
+    # Users without the permission only see public events. Jane maintains
+    # partial indices restricted to this predicate.
+    index_predicate = "(json->'public') = 'true'::jsonb"
+
     def filter_queryset_user_has_permission(self, queryset, model_type, user):
         # If the user has the permission, everything is fine and the
         # original queryset can be returned.
@@ -75,8 +100,9 @@ class CanSeePrivateEventsRetrievePermissionPlugin(
         elif model_type == "index":
             # Modify the queryset to only contain indices that are public.
             # Events that have null for public are considered to be private
-            # and will not be shown here.
-            queryset = queryset.filter(json__public=True)
+            # and will not be shown here. Use the raw predicate so the
+            # partial indices apply.
+            queryset = queryset.extra(where=[self.index_predicate])
         else:
             raise NotImplementedError()
         return queryset
@@ -98,6 +124,14 @@ class QuakeMLIndexerPlugin(IndexerPluginPoint):
     name = 'quakeml'
     title = 'QuakeML Indexer'
 
+    # Each event has a unique id. Used to only rewrite the indices of
+    # changed events upon reindexing.
+    index_key = ("quakeml_id",)
+
+    # Keys with few distinct values that are counted in the facet store.
+    facets = ("magnitude_type", "agency", "author", "evaluation_mode",
+              "event_type", "region")
+
     # The meta property defines what keys from the indices can be searched
     # on. For this to work it has to know the type for each key. Possible
     # values for the type are "str", "int", "float", "bool", and "UTCDateTime".
@@ -124,6 +158,7 @@ class QuakeMLIndexerPlugin(IndexerPluginPoint):
         "horizontal_uncertainty_max": "float",
         "horizontal_uncertainty_min": "float",
         "horizontal_uncertainty_max_azimuth": "float",
+        "region": "str",
     }
 
     def index(self, document):
@@ -140,6 +175,7 @@ class QuakeMLIndexerPlugin(IndexerPluginPoint):
         indices = []
 
         inv = read_events(document, format="quakeml")
+        flinn_engdahl = _get_flinn_engdahl()
 
         for event in inv:
             if event.origins:
@@ -200,8 +236,13 @@ class QuakeMLIndexerPlugin(IndexerPluginPoint):
                 horizontal_uncertainty_min = None
                 horizontal_uncertainty_max_azimuth = None
 
+            # Origins without coordinates have neither a location nor a
+            # region.
+            has_coordinates = org is not None and \
+                org.latitude is not None and org.longitude is not None
+
             geometry = None
-            if org:
+            if has_coordinates:
                 geometry = [Point(org.longitude, org.latitude)]
                 if all(value is not None for value in (
                         horizontal_uncertainty_max, horizontal_uncertainty_min,
@@ -289,6 +330,11 @@ class QuakeMLIndexerPlugin(IndexerPluginPoint):
                 "horizontal_uncertainty_min": horizontal_uncertainty_min,
                 "horizontal_uncertainty_max_azimuth":
                     horizontal_uncertainty_max_azimuth,
+                # Flinn-Engdahl region name. Stored here so it does not have
+                # to be computed for every request of the event service.
+                "region": flinn_engdahl.get_region(org.longitude,
+                                                   org.latitude)
+                if has_coordinates else None,
             })
 
         return indices
@@ -1,18 +1,31 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import gzip
+import hashlib
+import json
 import os
+import re
+import shutil
+import tempfile
+from unittest import mock
 
 import django
 from django.contrib.auth.models import User, Permission
 from django.contrib.auth.hashers import make_password
 from django.contrib.gis.geos import Point, LineString, MultiLineString
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
 
 from jane.quakeml.plugins import QuakeMLIndexerPlugin
-from jane.documents import JaneDocumentsValidationException
-from jane.documents.models import DocumentIndex
+from jane.documents import (JaneDocumentsValidationException, indexing_queue,
+                            serializer, signals)
+from jane.documents.management.commands.upload_documents import \
+    _upload_chunk
+from jane.documents.models import (Document, DocumentIndex, DocumentType,
+                                   Facet)
 from jane.documents.plugins import initialize_plugins
+from jane.jane.counts import EstimatedCountPaginator, estimate_count
 
 
 django.setup()
@@ -83,6 +96,7 @@ class QuakeMLPluginTestCase(TestCase):
              'magnitude_type': 'ml',
              'origin_time': '2014-11-06T00:24:42.240000Z',
              'public': True,
+             'region': 'CENTRAL CALIFORNIA',
              'quakeml_id': 'quakeml:comcat.cr.usgs.gov/fdsnws/event/1/'
                            'query?eventid=ci37285320&amp;format=quakeml'},
             {'agency': 'uw',
@@ -111,6 +125,7 @@ class QuakeMLPluginTestCase(TestCase):
              'magnitude_type': 'Md',
              'origin_time': '2014-11-14T21:07:48.200000Z',
              'public': True,
+             'region': 'OREGON',
              'quakeml_id': 'quakeml:comcat.cr.usgs.gov/fdsnws/event/1/'
                            'query?eventid=uw60916552&amp;format=quakeml'}]
         expected_focmec = [
@@ -131,6 +146,7 @@ class QuakeMLPluginTestCase(TestCase):
              'magnitude_type': None,
              'origin_time': None,
              'public': True,
+             'region': None,
              'quakeml_id': 'smi:ISC/evid=11713537'}]
         indexer = QuakeMLIndexerPlugin()
         result_usgs = indexer.index(FILES['usgs'])
@@ -138,6 +154,22 @@ class QuakeMLPluginTestCase(TestCase):
         self.assertEqual(expected_usgs, result_usgs)
         self.assertEqual(expected_focmec, result_focmec)
 
+    def test_indexing_origin_without_coordinates(self):
+        with open(FILES["usgs"], "rt") as fh:
+            data = re.sub(r"<(latitude|longitude)>.*?</\1>", "", fh.read(),
+                          flags=re.DOTALL)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "quake.xml")
+            with open(filename, "wt") as fh:
+                fh.write(data)
+            indices = QuakeMLIndexerPlugin().index(filename)
+        self.assertEqual(len(indices), 2)
+        for index in indices:
+            self.assertIsNone(index["latitude"])
+            self.assertIsNone(index["region"])
+            self.assertIsNone(index["geometry"])
+            self.assertIsNotNone(index["origin_time"])
+
     def test_quakeml_uploading(self):
         """
         Also a bit of an integration test for the plugin system which
@@ -406,6 +438,335 @@ class QuakeMLPluginTestCase(TestCase):
         self.assertEqual(ev[0]["indexed_data"]["depth_in_m"], 10.0)
         self.assertEqual(ev[1]["indexed_data"]["depth_in_m"], 0.0)
 
+    def test_keyset_pagination(self):
+        """
+        The indices are paginated with a cursor and only counted on request.
+        """
+        path = "/rest/document_indices/quakeml"
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+
+        r = self.client.get(path + "?limit=1&ordering=latitude").json()
+        self.assertNotIn("count", r)
+        self.assertEqual(len(r["results"]), 1)
+        self.assertEqual(r["results"][0]["indexed_data"]["depth_in_m"], 10.0)
+        self.assertIn("cursor=", r["next"])
+
+        r = self.client.get(r["next"]).json()
+        self.assertEqual(len(r["results"]), 1)
+        self.assertEqual(r["results"][0]["indexed_data"]["depth_in_m"], 0.0)
+        self.assertEqual(r["next"], None)
+
+        r = self.client.get(path + "?limit=1&count=true").json()
+        self.assertEqual(r["count"], 2)
+
+        # The offset pagination still works.
+        r = self.client.get(path + "?limit=1&offset=1").json()
+        self.assertEqual(r["count"], 2)
+        self.assertEqual(len(r["results"]), 1)
+        self.assertEqual(r["next"], None)
+
+        self.assertEqual(self.client.get(path + "?cursor=abc").status_code,
+                         404)
+
+    def test_fast_serialization(self):
+        """
+        Lists are serialized with the fast serializer which must give the
+        same results as the serializer of the detail view.
+        """
+        path = "/rest/document_indices/quakeml"
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        for name in ("usgs", "focmec"):
+            with open(FILES[name], "rb") as fh:
+                r = self.client.put("/rest/documents/quakeml/%s.xml" % name,
+                                    data=fh.read(), **self.valid_auth_headers)
+            self.assertEqual(r.status_code, 201)
+
+        indices = self.client.get(path).json()["results"]
+        self.assertEqual(len(indices), 3)
+        for index in indices:
+            self.assertEqual(index, self.client.get(index["url"]).json())
+
+        # Also with a format suffix.
+        request = RequestFactory().get(path + ".json")
+        fast_serializer = serializer.FastDocumentIndexSerializer(
+            "quakeml", request=request, format="json")
+        queryset = DocumentIndex.objects.order_by("pk")
+        fast = fast_serializer.serialize(
+            queryset.values(*fast_serializer.values))
+        default = serializer.DocumentIndexSerializer(
+            queryset, many=True,
+            context={"request": request, "format": "json"}).data
+        self.assertTrue(fast[0]["url"].endswith(".json"))
+        self.assertEqual(json.loads(json.dumps(fast)),
+                         json.loads(json.dumps(default)))
+
+    def test_streaming_export(self):
+        path = "/rest/document_indices/quakeml/export"
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+
+        r = self.client.get(path + ".geojson?min_magnitude=1.55")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "application/geo+json")
+        collection = json.loads(b"".join(r.streaming_content).decode())
+        self.assertEqual(collection["type"], "FeatureCollection")
+        self.assertEqual(len(collection["features"]), 1)
+        feature = collection["features"][0]
+        self.assertEqual(feature["properties"]["magnitude"], 1.6)
+        self.assertEqual(feature["geometry"]["type"], "GeometryCollection")
+
+        r = self.client.get(path + ".ndjson?fields=latitude,magnitude"
+                                   "&geometry=point")
+        self.assertEqual(r["Content-Type"], "application/x-ndjson")
+        features = [json.loads(_i) for _i in
+                    b"".join(r.streaming_content).decode().splitlines()]
+        self.assertEqual(len(features), 2)
+        self.assertEqual(features[0]["properties"],
+                         {"latitude": 35.0476667, "magnitude": 1.54})
+        self.assertEqual(features[0]["geometry"],
+                         {"type": "Point",
+                          "coordinates": [-117.662333, 35.047667]})
+
+        r = self.client.get(path + ".ndjson?fields=random")
+        self.assertEqual(r.status_code, 400)
+
+    @override_settings(JANE_TILE_GRID_SIZE=1)
+    def test_tiles(self):
+        cache.clear()
+        path = "/rest/tiles/quakeml"
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+
+        # Both events are in the north-western quarter of the world.
+        r = self.client.get(path + "/1/0/0")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "application/geo+json")
+        features = r.json()["features"]
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]["properties"],
+                         {"count": 2, "id": None})
+        self.assertEqual(self.client.get(
+            path + "/1/1/0.geojson").json()["features"], [])
+
+        # The single tile of the whole world.
+        features = self.client.get(path + "/0/0/0").json()["features"]
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]["properties"],
+                         {"count": 2, "id": None})
+
+        # Filters apply.
+        features = self.client.get(
+            path + "/1/0/0?min_magnitude=1.55").json()["features"]
+        self.assertEqual(features[0]["properties"]["count"], 1)
+
+        # Modifying the data results in new tiles.
+        self.client.delete("/rest/documents/quakeml/quake.xml",
+                           **self.valid_auth_headers)
+        self.assertEqual(self.client.get(
+            path + "/1/0/0").json()["features"], [])
+
+        self.assertEqual(self.client.get(path + "/1/2/0").status_code, 404)
+
+    def test_change_feed(self):
+        path = "/rest/changes"
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        r = self.client.get(path).json()
+        self.assertEqual(r["results"], [])
+        self.assertEqual(r["cursor"], 0)
+
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+
+        r = self.client.get(path).json()
+        changes = [(_i["object_type"], _i["action"]) for _i in r["results"]]
+        self.assertEqual(changes, [("document", "create"),
+                                   ("index", "create"), ("index", "create")])
+        self.assertEqual(r["cursor"], r["results"][-1]["id"])
+        self.assertFalse(r["has_more"])
+        # Cursor paging.
+        r = self.client.get(path + "?limit=2").json()
+        self.assertEqual(len(r["results"]), 2)
+        self.assertTrue(r["has_more"])
+        r = self.client.get(r["next"]).json()
+        self.assertEqual(len(r["results"]), 1)
+        self.assertEqual(self.client.get(r["next"]).json()["results"], [])
+        cursor = r["cursor"]
+        # Invalid and too large limits.
+        for limit in ("0", "-5", "a"):
+            self.assertEqual(self.client.get(
+                path + "?limit=" + limit).status_code, 400)
+        with override_settings(JANE_CHANGES_MAX_LIMIT=1):
+            r = self.client.get(path + "?limit=100").json()
+            self.assertEqual(len(r["results"]), 1)
+            self.assertTrue(r["has_more"])
+
+        # Private events are hidden from users who cannot see them.
+        with open(FILES["private"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/private.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+        r = self.client.get(path + "?since=%i" % cursor).json()
+        self.assertEqual([_i["object_type"] for _i in r["results"]],
+                         ["document"])
+        cursor = r["cursor"]
+
+        # Deletions leave a trace.
+        self.client.delete("/rest/documents/quakeml/quake.xml",
+                           **self.valid_auth_headers)
+        r = self.client.get(path + "?since=%i&wait=1" % cursor).json()
+        changes = [(_i["object_type"], _i["action"], _i["url"])
+                   for _i in r["results"]]
+        self.assertEqual(changes, [("index", "delete", None),
+                                   ("index", "delete", None),
+                                   ("document", "delete", None)])
+        self.assertEqual(self.client.get(
+            path + "?since=now").json()["results"], [])
+
+    def test_facets(self):
+        path = "/rest/document_indices/quakeml/facets"
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        for name in ("usgs", "private"):
+            with open(FILES[name], "rb") as fh:
+                r = self.client.put("/rest/documents/quakeml/%s.xml" % name,
+                                    data=fh.read(), **self.valid_auth_headers)
+            self.assertEqual(r.status_code, 201)
+
+        # The store counts all indices.
+        self.assertEqual(
+            sorted(Facet.objects.filter(
+                document_type="quakeml", key__in=["agency", "event_type"])
+                .values_list("key", "value", "count")),
+            [("agency", "ci", 1), ("agency", "uw", 1),
+             ("event_type", "quarry blast", 3)])
+
+        # The private event is not counted for anonymous users.
+        r = self.client.get(path + "/event_type").json()
+        self.assertEqual(r, {"event_type": [
+            {"value": "quarry blast", "count": 2}]})
+        p = Permission.objects.filter(codename="can_see_private_events")\
+            .first()
+        self.user.user_permissions.add(p)
+        r = self.client.get(path, **self.valid_auth_headers).json()
+        self.assertEqual(list(r.keys()), list(QuakeMLIndexerPlugin.facets))
+        self.assertEqual(r["event_type"], [
+            {"value": "quarry blast", "count": 3}])
+        self.assertEqual(r["agency"], [{"value": "ci", "count": 1},
+                                       {"value": "uw", "count": 1}])
+        # Filters are applied.
+        r = self.client.get(path + "/agency?agency=uw",
+                            **self.valid_auth_headers).json()
+        self.assertEqual(r, {"agency": [{"value": "uw", "count": 1}]})
+        self.assertEqual(self.client.get(path + "/latitude").status_code, 404)
+
+        # Reindexing and rebuilding do not change the counts.
+        counts = sorted(Facet.objects.values_list("key", "value", "count"))
+        signals.index_document(
+            sender=None, instance=Document.objects.get(name="usgs.xml"),
+            created=None)
+        self.assertEqual(
+            sorted(Facet.objects.values_list("key", "value", "count")),
+            counts)
+        Facet.objects.rebuild("quakeml", QuakeMLIndexerPlugin.facets)
+        self.assertEqual(
+            sorted(Facet.objects.values_list("key", "value", "count")),
+            counts)
+
+        # Deleting the documents removes their values.
+        for name in ("usgs", "private"):
+            self.client.delete("/rest/documents/quakeml/%s.xml" % name,
+                               **self.valid_auth_headers)
+        self.assertEqual(Facet.objects.count(), 0)
+
+        # Other values are stored as json->>key renders them, as when
+        # rebuilding.
+        indices = [{"value": True}, {"value": 1e-05}, {"value": 2.0},
+                   {"value": None}, {}]
+        Facet.objects.update_counts("quakeml", ["value"], added=indices)
+        self.assertEqual(
+            sorted(Facet.objects.values_list("value", "count")),
+            [("0.00001", 1), ("2.0", 1), ("true", 1)])
+        Facet.objects.update_counts("quakeml", ["value"], removed=indices)
+        self.assertEqual(Facet.objects.count(), 0)
+
+    def test_counts(self):
+        """
+        The number of documents and indices in the REST roots are maintained
+        with every change.
+        """
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+
+        r = self.client.get("/rest").json()
+        self.assertEqual(r[1]["available_documents"], 1)
+        self.assertEqual(r[2]["available_indices"], 2)
+        self.assertEqual(
+            self.client.get("/rest/documents").json()[0]
+            ["available_documents"], 1)
+        self.assertEqual(
+            self.client.get("/rest/document_indices").json()[0]
+            ["available_documents"], 2)
+
+        # Small tables are counted exactly, larger ones estimated.
+        queryset = DocumentIndex.objects.filter(json__agency="ci")
+        self.assertEqual(estimate_count(queryset), 1)
+        with override_settings(JANE_ESTIMATED_COUNT_THRESHOLD=0):
+            self.assertIsInstance(estimate_count(queryset), int)
+            self.assertIsInstance(
+                EstimatedCountPaginator(queryset, 10).count, int)
+
+        # Replaced by a document with a single index.
+        with open(FILES["focmec"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 204)
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake2.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+        r = self.client.get("/rest").json()
+        self.assertEqual(r[1]["available_documents"], 2)
+        self.assertEqual(r[2]["available_indices"], 3)
+
+        self.client.delete("/rest/documents/quakeml/quake.xml",
+                           **self.valid_auth_headers)
+        r = self.client.get("/rest").json()
+        self.assertEqual(r[1]["available_documents"], 1)
+        self.assertEqual(r[2]["available_indices"], 2)
+
+        # Also when deleted in bulk, e.g. in the admin.
+        Document.objects.all().delete()
+        r = self.client.get("/rest").json()
+        self.assertEqual(r[1]["available_documents"], 0)
+        self.assertEqual(r[2]["available_indices"], 0)
+
+        # Documents failing to index are not stored.
+        with mock.patch.object(QuakeMLIndexerPlugin, "index",
+                               side_effect=ValueError):
+            with open(FILES["usgs"], "rb") as fh:
+                with self.assertRaises(ValueError):
+                    Document.objects.add_or_modify_document(
+                        document_type="quakeml", name="quake.xml",
+                        data=fh.read(), user=self.user)
+        self.assertFalse(Document.objects.exists())
+        self.assertEqual(self.client.get("/rest").json()[1]
+                         ["available_documents"], 0)
+
     def test_radial_query_quakeml(self):
         """
         Test radial queries with QuakeML.
@@ -646,6 +1007,8 @@ class QuakeMLPluginTestCase(TestCase):
         self.assertEqual(r.status_code, 201)
         self.assertEqual(self.client.get(a_path).json()["count"], 2)
         a_id_2 = self.client.get(a_path).json()["results"][-1]["id"]
+        self.assertEqual(self.client.get(
+            path).json()["results"][0]["attachments_count"], 2)
 
         # Delete both. Must be authorized.
         r = self.client.delete(a_path + "/%i" % a_id)
@@ -663,6 +1026,8 @@ class QuakeMLPluginTestCase(TestCase):
                                **self.valid_auth_headers)
         self.assertEqual(r.status_code, 204)
         self.assertEqual(self.client.get(a_path).json()["count"], 1)
+        self.assertEqual(self.client.get(
+            path).json()["results"][0]["attachments_count"], 1)
         r = self.client.delete(a_path + "/%i" % a_id_2,
                                **self.valid_auth_headers)
         self.assertEqual(r.status_code, 204)
@@ -686,3 +1051,202 @@ class QuakeMLPluginTestCase(TestCase):
 
         r = self.client.get("/rest/documents/quakeml/quake.xml/data")
         self.assertEqual(r.content, data)
+
+    def test_conditional_document_data(self):
+        """
+        Unchanged data is revalidated with a 304 response.
+        """
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with open(FILES["focmec"], "rb") as fh:
+            data = fh.read()
+        r = self.client.put("/rest/documents/quakeml/quake.xml",
+                            data=data, **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+
+        path = "/rest/documents/quakeml/quake.xml/data"
+        r = self.client.get(path)
+        self.assertEqual(r["ETag"], '"%s"' % hashlib.sha1(data).hexdigest())
+        etag, last_modified = r["ETag"], r["Last-Modified"]
+
+        for headers in ({"HTTP_IF_NONE_MATCH": etag},
+                        {"HTTP_IF_NONE_MATCH": '"abc", W/%s' % etag},
+                        {"HTTP_IF_MODIFIED_SINCE": last_modified}):
+            r = self.client.get(path, **headers)
+            self.assertEqual(r.status_code, 304)
+            self.assertEqual(r.content, b"")
+            self.assertEqual(r["ETag"], etag)
+
+        # If-None-Match takes precedence.
+        r = self.client.get(path, HTTP_IF_NONE_MATCH='"abc"',
+                            HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, data)
+
+        # Other data has another ETag.
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 204)
+        r = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+
+    @override_settings(JANE_DOCUMENT_COMPRESSION="gzip")
+    def test_compressed_documents(self):
+        """
+        Compressed documents are served compressed only if the client
+        accepts it.
+        """
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with open(FILES["usgs"], "rb") as fh:
+            data = fh.read()
+        r = self.client.put("/rest/documents/quakeml/quake.xml",
+                            data=data, **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+
+        document = Document.objects.get(name="quake.xml")
+        self.assertEqual(document.compression, "gzip")
+        self.assertEqual(document.filesize, len(data))
+        self.assertEqual(document.get_data(), data)
+        # Still fully indexed.
+        self.assertEqual(DocumentIndex.objects.count(), 2)
+
+        r = self.client.get("/rest/documents/quakeml/quake.xml/data")
+        self.assertFalse(r.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(r.streaming_content), data)
+
+        r = self.client.get("/rest/documents/quakeml/quake.xml/data",
+                            HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(r["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(r.content), data)
+        # Both representations have their own ETag.
+        self.assertEqual(r["ETag"], '"%s-gzip"' % document.sha1)
+
+    def test_reindexing_only_writes_changed_indices(self):
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+        document = Document.objects.get(name="quake.xml")
+        pks = sorted(DocumentIndex.objects.values_list("pk", flat=True))
+        self.assertEqual(len(pks), 2)
+        # Stamped with the version of the indexer.
+        self.assertEqual(document.indexer_version,
+                         QuakeMLIndexerPlugin.version)
+        self.assertIsNotNone(document.indexed_at)
+
+        # Nothing changed - the indices are kept.
+        signals.index_document(sender=None, instance=document, created=None)
+        self.assertEqual(
+            sorted(DocumentIndex.objects.values_list("pk", flat=True)), pks)
+
+        # Changed indices are updated in place and missing ones recreated.
+        index = DocumentIndex.objects.get(pk=pks[0])
+        expected = index.json
+        index.json = dict(expected, magnitude=-1.0)
+        index.save()
+        DocumentIndex.objects.filter(pk=pks[1]).delete()
+
+        signals.index_document(sender=None, instance=document, created=None)
+        new_pks = sorted(DocumentIndex.objects.values_list("pk", flat=True))
+        self.assertEqual(len(new_pks), 2)
+        self.assertEqual(new_pks[0], pks[0])
+        self.assertNotEqual(new_pks[1], pks[1])
+        self.assertEqual(DocumentIndex.objects.get(pk=pks[0]).json, expected)
+
+    def test_upload_chunk(self):
+        """
+        The upload command hashes each file once and skips duplicates.
+        """
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            copy = os.path.join(tmpdir, "copy.xml")
+            shutil.copy(FILES["usgs"], copy)
+            args = ([FILES["usgs"], copy, FILES["focmec"]], "quakeml",
+                    self.user.username, False)
+
+            uploaded, skipped, _, errors = _upload_chunk(args)
+            self.assertEqual((uploaded, skipped, errors), (2, 1, []))
+            with open(FILES["usgs"], "rb") as fh:
+                self.assertEqual(
+                    Document.objects.get(name="usgs_event.xml").sha1,
+                    hashlib.sha1(fh.read()).hexdigest())
+            self.assertEqual(DocumentIndex.objects.count(), 3)
+
+            uploaded, skipped, _, errors = _upload_chunk(args)
+            self.assertEqual((uploaded, skipped, errors), (0, 3, []))
+
+    def test_upload_chunk_in_a_single_transaction(self):
+        """
+        The data version and the counts change once per chunk.
+        """
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        version = DocumentType.get_data_version("quakeml")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            invalid = os.path.join(tmpdir, "invalid.xml")
+            with open(invalid, "wb") as fh:
+                fh.write(b"<a>b</a>")
+            args = ([FILES["usgs"], invalid, FILES["focmec"]], "quakeml",
+                    self.user.username, True)
+            uploaded, skipped, _, errors = _upload_chunk(args)
+        self.assertEqual((uploaded, skipped), (2, 0))
+        self.assertEqual([_i[0] for _i in errors], [invalid])
+
+        document_type = DocumentType.objects.get(name="quakeml")
+        self.assertEqual(document_type.data_version, version + 1)
+        self.assertEqual(document_type.document_count, 2)
+        self.assertEqual(document_type.index_count, 3)
+
+    def test_indexing_outdated_document(self):
+        """
+        Indexing, e.g. by a queued job, always indexes the current data.
+        """
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+        outdated = Document.objects.get(name="quake.xml")
+
+        with open(FILES["focmec"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 204)
+        self.assertEqual(DocumentIndex.objects.count(), 1)
+
+        signals.index_document(sender=None, instance=outdated, created=None)
+        self.assertEqual(DocumentIndex.objects.count(), 1)
+
+        # Nothing to do for deleted documents.
+        Document.objects.get(name="quake.xml").delete()
+        signals.index_document(sender=None, instance=outdated, created=None)
+        self.assertEqual(DocumentIndex.objects.count(), 0)
+
+    @override_settings(JANE_ASYNC_INDEXING=True)
+    def test_async_indexing(self):
+        self.user.user_permissions.add(self.can_modify_quakeml_permission)
+        with open(FILES["usgs"], "rb") as fh:
+            r = self.client.put("/rest/documents/quakeml/quake.xml",
+                                data=fh.read(), HTTP_PREFER="respond-async",
+                                **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 202)
+        job_url = r.json()["job"]
+        self.assertEqual(r["Location"], job_url)
+        # Stored but not yet indexed.
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertEqual(DocumentIndex.objects.count(), 0)
+
+        self.assertEqual(self.client.get("/rest/indexing_jobs").json(),
+                         {"queued": 1, "running": 0, "done": 0, "failed": 0})
+        self.assertEqual(self.client.get(job_url).json()["status"], "queued")
+
+        job_id = indexing_queue.claim_job()
+        self.assertIsNotNone(job_id)
+        self.assertIsNone(indexing_queue.claim_job())
+        indexing_queue.run_job(job_id, timeout=60)
+
+        r = self.client.get(job_url).json()
+        self.assertEqual(r["status"], "done")
+        self.assertIsNone(r["error"])
+        self.assertEqual(DocumentIndex.objects.count(), 2)
@@ -218,6 +218,15 @@ REST_FRAMEWORK = {
         'jane.jane.rest_exception_handler.custom_exception_handler'
 }
 
+# Much faster JSON rendering with ?format=orjson if orjson is installed.
+try:
+    import orjson  # NOQA
+except ImportError:
+    pass
+else:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += (
+        'jane.jane.renderers.ORJSONRenderer',)
+
 
 ###############################################################################
 # corsheader
@@ -276,6 +285,52 @@ JANE_ACCENT_COLOR = "#D9230F"
 # Constants written to StationXML files created by Jane.
 JANE_FDSN_STATIONXML_SENDER = "Jane"
 JANE_FDSN_STATIONXML_SOURCE = "Jane"
+# Storage backend for the data of documents and attachments. Use
+# "jane.documents.storage.FileSystemBlobStorage" to store it on disk in
+# JANE_BLOB_STORAGE_ROOT instead of in the database.
+JANE_BLOB_STORAGE_BACKEND = "jane.documents.storage.DatabaseBlobStorage"
+JANE_BLOB_STORAGE_ROOT = os.path.abspath(os.path.join(PROJECT_DIR, '..', '..',
+                                                      'blobs'))
+# How blobs on disk are served: None streams them from Django,
+# "x-sendfile" and "x-accel-redirect" hand them off to the web server. The
+# latter requires an internal location at JANE_BLOB_STORAGE_SERVE_URL that
+# maps to JANE_BLOB_STORAGE_ROOT.
+JANE_BLOB_STORAGE_SERVE_METHOD = None
+JANE_BLOB_STORAGE_SERVE_URL = "/protected_blobs/"
+# Compress the data of new documents with "gzip" or "zstd" (requires the
+# zstandard module). None stores them uncompressed.
+JANE_DOCUMENT_COMPRESSION = None
+# Allow clients to upload documents with the "Prefer: respond-async" header.
+# These are indexed in the background by the run_indexing_workers command
+# which must be running.
+JANE_ASYNC_INDEXING = False
+# Default number of worker processes and timeout in seconds per document.
+JANE_INDEXING_WORKERS = 2
+JANE_INDEXING_TIMEOUT = 600
+# Cache of the attachments created on demand, e.g. the response plots.
+JANE_LAZY_ATTACHMENT_ROOT = os.path.abspath(os.path.join(
+    PROJECT_DIR, '..', '..', 'lazy_attachments'))
+# Map tiles of the indices: number of clustering grid cells along each side
+# of a tile and how long to cache them in seconds.
+JANE_TILE_GRID_SIZE = 8
+JANE_TILE_CACHE_TIMEOUT = 60 * 60 * 24
+# Maximum time in seconds requests to the change feed wait for new changes.
+JANE_CHANGES_MAX_WAIT = 30
+# Maximum number of changes per request to the change feed.
+JANE_CHANGES_MAX_LIMIT = 1000
+# Tables and queries with more rows than this are counted with the estimates
+# of PostgreSQL where exact numbers are not needed, e.g. in the admin.
+JANE_ESTIMATED_COUNT_THRESHOLD = 100000
+# Cache of the responses of the FDSN event and station queries: how long to
+# keep them in seconds (0 disables the cache), responses larger than
+# JANE_FDSNWS_CACHE_MAX_MEMORY_SIZE bytes are stored as files in
+# JANE_FDSNWS_CACHE_ROOT (None to not cache them), and the maximum number of
+# these files.
+JANE_FDSNWS_CACHE_TIMEOUT = 60 * 60 * 24
+JANE_FDSNWS_CACHE_MAX_MEMORY_SIZE = 1024 * 1024
+JANE_FDSNWS_CACHE_ROOT = os.path.abspath(os.path.join(
+    PROJECT_DIR, '..', '..', 'fdsnws_cache'))
+JANE_FDSNWS_CACHE_MAX_FILES = 1000
 
 ###############################################################################
 # Import local settings
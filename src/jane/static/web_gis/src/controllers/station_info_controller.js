@@ -14,15 +14,9 @@ baynetApp.controller('stationInfoController', function ($scope, $log, stations)
         $scope.channels = j.properties.channels;
         for (var i = 0; i < $scope.channels.length; i++) {
             var chan = $scope.channels[i];
-            // A bit ugly but I'm currently not sure how to do it in a
-            // better way. Should work well enough I guess.
-            jQuery.ajax({
-                url: chan["attachments_url"],
-                success: function (result) {
-                    chan["attachments"] = result.results;
-                },
-                async: false
-            });
+            // The response plots are created on demand by the server.
+            chan["response_plot_url"] = chan["url"].replace(/\/$/, "") +
+                "/lazy_attachments/response";
         }
         break;
     }
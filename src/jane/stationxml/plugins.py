@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
+import glob
+import hashlib
 import io
+import json
+import os
 
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.gis.geos.point import Point
@@ -9,9 +13,11 @@ import matplotlib
 matplotlib.use('agg')
 import matplotlib.pylab as plt  # noqa
 
-from obspy.io.stationxml.core import validate_stationxml  # noqa
+from lxml import etree  # noqa
 import obspy  # noqa
+import obspy.io.stationxml.core  # noqa
 
+from jane.documents.document_data import get_xml_schema, get_xml_tree  # noqa
 from jane.documents.plugins import (
     ValidatorPluginPoint, IndexerPluginPoint, DocumentPluginPoint,
     RetrievePermissionPluginPoint)  # noqa
@@ -29,9 +35,15 @@ class StationValidatorPlugin(ValidatorPluginPoint):
     title = 'StationXML XMLSchema Validator'
 
     def validate(self, document):
-        is_stationxml, error = validate_stationxml(document)
-        if not is_stationxml:
-            raise ValueError(error)
+        # Same as obspy's validate_stationxml() but with the shared tree and
+        # the cached schema.
+        try:
+            tree = get_xml_tree(document)
+        except etree.XMLSyntaxError:
+            raise ValueError(("Not a XML file.",))
+        schema = get_xml_schema(_get_stationxml_schema_file(tree))
+        if not schema.validate(tree):
+            raise ValueError([str(_i) for _i in schema.error_log])
         return True
 
 
@@ -72,10 +84,103 @@ class CanSeeAllStations(RetrievePermissionPluginPoint):
         return queryset
 
 
+def _get_stationxml_schema_file(tree):
+    """
+    The StationXML schema shipped with obspy matching the version of a
+    document. Falls back to the latest one.
+    """
+    directory = os.path.join(
+        os.path.dirname(obspy.io.stationxml.core.__file__), "data")
+    filename = os.path.join(directory, "fdsn-station-%s.xsd" %
+                            tree.getroot().get("schemaVersion", "1.0"))
+    if not os.path.exists(filename):
+        filename = sorted(glob.glob(os.path.join(
+            directory, "fdsn-station-*.xsd")))[-1]
+    return filename
+
+
+def _get_canonical_value(value):
+    """
+    JSON serializable form of the values in a response that only depends on
+    the values themselves and not on the attribute order, the pickle
+    protocol, or the ObsPy version. The uncertainties of numbers are
+    dropped.
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, complex):
+        return [float(value.real), float(value.imag)]
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return {str(k): _get_canonical_value(v) for k, v in value.items()}
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_get_canonical_value(_i) for _i in value]
+    if hasattr(value, "__dict__"):
+        # ObsPy keeps many values in underscored attributes behind
+        # properties.
+        return {k.lstrip("_"): _get_canonical_value(v)
+                for k, v in vars(value).items()}
+    return str(value)
+
+
+def _get_response_hash(channel):
+    """
+    Hash of the response of a channel. Channels with the same response and
+    sampling rate share the same response plot.
+    """
+    if not channel.response:
+        return None
+    return hashlib.sha1(json.dumps({
+        "sample_rate": _get_canonical_value(channel.sample_rate),
+        "response": _get_canonical_value(channel.response)},
+        sort_keys=True).encode()).hexdigest()
+
+
+def _plot_response(channel):
+    """
+    Plot the response of a channel. Returns the PNG data or None if it
+    cannot be plotted.
+    """
+    try:
+        plt.close()
+    except:
+        pass
+
+    # Sometimes fails. Wrap in try/except.
+    try:
+        with io.BytesIO() as plot:
+            channel.plot(min_freq=1E-3, outfile=plot)
+            plot.seek(0)
+            return plot.read()
+    except Exception:
+        return None
+    finally:
+        try:
+            plt.close()
+        except:
+            pass
+
+
 class StationIndexerPlugin(IndexerPluginPoint):
     name = 'stationxml'
     title = 'StationXML Indexer'
 
+    # The response plots are no longer created during indexing.
+    version = 2
+
+    # One index per channel epoch.
+    index_key = ("network", "station", "location", "channel", "start_date")
+
+    # Keys with few distinct values that are counted in the facet store.
+    facets = ("network", "station", "location", "channel", "sensor_type")
+
+    # The response plots are only created when requested as plotting them
+    # takes most of the indexing time and few are ever looked at.
+    lazy_attachments = {"response": "image/png"}
+
     meta = {
         "network": "str",
         "station": "str",
@@ -154,34 +259,33 @@ class StationIndexerPlugin(IndexerPluginPoint):
                         "total_sensitivity": total_sensitivity,
                         "sensitivity_frequency": sensitivity_frequency,
                         "units_after_sensitivity": units_after_sensitivity,
+                        # Key of the lazily created response plot.
+                        "response_hash": _get_response_hash(channel),
 
                         # Geometry for PostGIS.
                         "geometry": [Point(channel.longitude,
                                            channel.latitude)],
                     }
 
-                    try:
-                        plt.close()
-                    except:
-                        pass
-
-                    # Sometimes fails. Wrap in try/except.
-                    try:
-                        # Plot response.
-                        with io.BytesIO() as plot:
-                            channel.plot(min_freq=1E-3, outfile=plot)
-                            plot.seek(0)
-                            index["attachments"] = {
-                                "response": {"content-type": "image/png",
-                                             "data": plot.read()}}
-                    except Exception:
-                        pass
-                    finally:
-                        try:
-                            plt.close()
-                        except:
-                            pass
-
                     indices.append(index)
 
         return indices
+
+    def get_lazy_attachment_key(self, category, index):
+        return index.get("response_hash")
+
+    def create_lazy_attachments(self, category, document, indices):
+        inv = obspy.read_inventory(document, format="stationxml")
+        channels = {}
+        for network in inv:
+            for station in network:
+                for channel in station:
+                    channels[(network.code, station.code,
+                              channel.location_code, channel.code,
+                              str(channel.start_date))] = channel
+
+        plots = []
+        for index in indices:
+            channel = channels.get(tuple(index[_i] for _i in self.index_key))
+            plots.append(_plot_response(channel) if channel else None)
+        return plots
@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import copy
 import os
+import tempfile
 
 import django
 from django.contrib.auth.models import User, Permission
 from django.contrib.auth.hashers import make_password
 from django.test import TestCase
+import obspy
 
+from jane.documents import signals
+from jane.documents.models import (Document, DocumentIndex,
+                                   DocumentIndexAttachment)
 from jane.documents.plugins import initialize_plugins
+from jane.stationxml.plugins import _get_response_hash
 
 
 django.setup()
@@ -40,6 +47,49 @@ class StationXMLPluginTestCase(TestCase):
             'HTTP_AUTHORIZATION': 'Basic ' + credentials.decode("ISO-8859-1")
         }
 
+    def test_response_hash(self):
+        channel = obspy.read_inventory(FILES["bw.altm"])[0][0][0]
+        response_hash = _get_response_hash(channel)
+        self.assertEqual(len(response_hash), 40)
+
+        # Only depends on the values.
+        other = copy.deepcopy(channel)
+        stage = other.response.response_stages[0]
+        stage.__dict__ = dict(reversed(list(stage.__dict__.items())))
+        self.assertEqual(_get_response_hash(other), response_hash)
+
+        # The plot also depends on the sampling rate.
+        other.sample_rate = channel.sample_rate * 2
+        self.assertNotEqual(_get_response_hash(other), response_hash)
+
+        channel.response = None
+        self.assertIsNone(_get_response_hash(channel))
+
+    def test_reindexing_deletes_stored_response_plots(self):
+        self.user.user_permissions.add(self.can_modify_stationxml_permission)
+        with open(FILES["bw.altm"], "rb") as fh:
+            r = self.client.put("/rest/documents/stationxml/BW.ALTM.xml",
+                                data=fh.read(), **self.valid_auth_headers)
+        self.assertEqual(r.status_code, 201)
+
+        # A response plot stored by an older version of the indexer.
+        index = DocumentIndex.objects.order_by("pk").first()
+        DocumentIndexAttachment(
+            index=index, category="response", content_type="image/png",
+            data=b"\x89PNG", created_by=self.user,
+            modified_by=self.user).save()
+        DocumentIndex.objects.update_attachments_count([index.pk])
+        index.refresh_from_db()
+        self.assertEqual(index.attachments_count, 1)
+
+        document = Document.objects.get(name="BW.ALTM.xml")
+        signals.index_document(sender=None, instance=document, created=None)
+        # The index itself is kept but the plot is now created on demand.
+        index.refresh_from_db()
+        self.assertEqual(index.attachments_count, 0)
+        self.assertFalse(DocumentIndexAttachment.objects.filter(
+            index=index).exists())
+
     def test_uploading(self):
         self.user.user_permissions.add(self.can_modify_stationxml_permission)
         with open(FILES["bw.altm"], "rb") as fh:
@@ -49,6 +99,12 @@ class StationXMLPluginTestCase(TestCase):
         r = self.client.get("/rest/document_indices/stationxml").json()
         self.assertEqual(len(r["results"]), 3)
 
+        # The hash identifying the response plot.
+        response_hashes = [_i["indexed_data"].pop("response_hash")
+                           for _i in r["results"]]
+        for response_hash in response_hashes:
+            self.assertEqual(len(response_hash), 40)
+
         self.assertEqual(r["results"][0]["data_content_type"], "text/xml")
 
         self.assertEqual(r["results"][0]["indexed_data"], {
@@ -117,17 +173,27 @@ class StationXMLPluginTestCase(TestCase):
             'total_sensitivity': 251650000.0,
             'units_after_sensitivity': 'M/S'})
 
-        # Everything should also have an attachment!
-        self.assertEqual(r["results"][0]["attachments_count"], 1)
-        self.assertEqual(r["results"][1]["attachments_count"], 1)
-        self.assertEqual(r["results"][2]["attachments_count"], 1)
-
-        # Get the attachment and make sure it is a picture.
-        r = self.client.get(r["results"][0]["attachments_url"])
-        r = r.json()["results"]
-        self.assertEqual(len(r), 1)
-        self.assertEqual(r[0]["content_type"], "image/png")
-        self.assertEqual(r[0]["category"], "response")
-        # Just make sure it at least returns something.
-        attachment_data = self.client.get(r[0]["data_url"]).content
-        self.assertTrue(len(attachment_data) > 100)
+        # The response plots are only created on demand.
+        self.assertEqual(r["results"][0]["attachments_count"], 0)
+        self.assertEqual(r["results"][1]["attachments_count"], 0)
+        self.assertEqual(r["results"][2]["attachments_count"], 0)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.settings(JANE_LAZY_ATTACHMENT_ROOT=tmpdir):
+                url = "/rest/document_indices/stationxml/%i/" \
+                    "lazy_attachments/response" % r["results"][0]["id"]
+                # Make sure it is a picture and the second request is served
+                # from the cache.
+                for _ in range(2):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response["Content-Type"], "image/png")
+                    data = b"".join(response.streaming_content)
+                    self.assertTrue(data.startswith(b"\x89PNG"))
+                self.assertTrue(os.path.exists(os.path.join(
+                    tmpdir, response_hashes[0][:2], response_hashes[0][2:4],
+                    response_hashes[0])))
+
+                # Unknown categories.
+                response = self.client.get(url.replace("response", "other"))
+                self.assertEqual(response.status_code, 404)
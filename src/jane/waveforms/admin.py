@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
 from django.contrib import admin
-from django.contrib.admin.filters import SimpleListFilter
+from django.contrib.admin.filters import (AllValuesFieldListFilter,
+                                          SimpleListFilter)
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models.aggregates import Count
 from django.conf.urls import url
+from django.db.models import Prefetch
 from django.http import HttpResponse
 
+from jane.jane.counts import EstimatedCountPaginator
 from jane.waveforms import models
 
 import time
@@ -69,6 +72,20 @@ class HasOverlapsFilter(SimpleListFilter):
         return queryset
 
 
+class CachedValuesFieldListFilter(AllValuesFieldListFilter):
+    """
+    Offers the values cached in the ContinuousTraceValue model instead of
+    selecting the distinct values of the whole trace table.
+    """
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        super().__init__(field, request, params, model, model_admin,
+                         field_path)
+        # Replaces the lazy queryset of the parent class.
+        self.lookup_choices = models.ContinuousTraceValue.objects.get_values(
+            field_path)
+
+
 @admin.register(models.File)
 class FileAdmin(admin.ModelAdmin):
     list_display = ['name', 'path', 'format', 'format_trace_count', 'gaps',
@@ -78,6 +95,9 @@ class FileAdmin(admin.ModelAdmin):
     readonly_fields = ['path', 'name', 'format', 'mtime', 'ctime', 'size',
                        'format_traces', 'gaps', 'overlaps', 'created_at']
     list_filter = ['format', HasGapsFilter, HasOverlapsFilter]
+    # Do not count all files for every page.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         ('', {
             'fields': ('path', 'name', 'mtime', 'ctime', 'size', 'created_at')
@@ -88,8 +108,22 @@ class FileAdmin(admin.ModelAdmin):
     )
 
     def get_queryset(self, request):  # @UnusedVariable
-        return models.File.objects.\
-            annotate(trace_count=Count('traces'))
+        # A subquery is only evaluated for the files on the page while an
+        # annotation would count the traces of all files.
+        return models.File.objects.extra(select={
+            "trace_count": "SELECT COUNT(*) FROM waveforms_continuoustrace "
+                           "WHERE waveforms_continuoustrace.file_id = "
+                           "waveforms_file.id"})
+
+    def get_object(self, request, object_id, from_field=None):
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None:
+            # All traces for format_traces() in one query without the
+            # preview data.
+            obj = models.File.objects.prefetch_related(Prefetch(
+                'traces', queryset=models.ContinuousTrace.objects.defer(
+                    'preview_trace'))).get(pk=obj.pk)
+        return obj
 
     def has_add_permission(self, request, obj=None):  # @UnusedVariable
         return False
@@ -116,8 +150,11 @@ class ContinuousTraceAdmin(admin.ModelAdmin):
                     'starttime', 'endtime', 'sampling_rate', 'npts',
                     'quality']
     search_fields = ['network', 'station', 'location', 'channel']
-    list_filter = ['network', 'station', 'location', 'channel',
-                   'sampling_rate', 'quality']
+    list_filter = [(_i, CachedValuesFieldListFilter)
+                   for _i in models.ContinuousTraceValue.FIELDS]
+    # Do not count all traces for every page.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = [
         'file', 'format_path', 'pos', 'network', 'station', 'location',
         'channel', 'starttime', 'endtime', 'duration', 'sampling_rate', 'npts',
@@ -56,6 +56,14 @@ class WaveformFileCrawler(object):
                 logger.error("Error deleting path '%s': Not part of the "
                              "database" % path)
 
+    def _prune_values(self):
+        """
+        Remove the cached values of the admin filters that no trace has
+        any more.
+        """
+        count = models.ContinuousTraceValue.objects.prune()
+        logger.debug("Pruned %i stale trace value(s)." % count)
+
     def _select(self, path=None):
         """
         Fetch entry from database.
@@ -114,9 +122,12 @@ class WaveformFileCrawler(object):
                     msg = 'work_queue still has %s items'
                     logger.debug(msg % len(self.work_queue))
                 time.sleep(10)
+            self._prune_values()
             logger.debug('Crawler stopped by option run_once.')
             sys.exit()
             return
+        if getattr(self, 'first_run_complete', False):
+            self._prune_values()
         logger.debug('Crawler restarted.')
         # reset attributes
         self._current_path = None
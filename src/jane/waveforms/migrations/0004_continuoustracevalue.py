@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+FIELDS = ("network", "station", "location", "channel", "sampling_rate",
+          "quality")
+
+
+def collect_values(apps, schema_editor):
+    ContinuousTrace = apps.get_model("waveforms", "ContinuousTrace")
+    ContinuousTraceValue = apps.get_model("waveforms", "ContinuousTraceValue")
+    ContinuousTraceValue.objects.bulk_create([
+        ContinuousTraceValue(field=field, value=str(value))
+        for field in FIELDS
+        for value in ContinuousTrace.objects.order_by()
+        .values_list(field, flat=True).distinct()
+        if value is not None], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0003_auto_waveform_continuoustrace_unique_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContinuousTraceValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=255)),
+            ],
+            options={
+                'ordering': ['field', 'value'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='continuoustracevalue',
+            unique_together=set([('field', 'value')]),
+        ),
+        migrations.AlterField(
+            model_name='continuoustrace',
+            name='sampling_rate',
+            field=models.FloatField(db_index=True, default=1),
+        ),
+        migrations.RunPython(collect_values, migrations.RunPython.noop),
+    ]
@@ -5,8 +5,10 @@ import os
 
 from django.conf import settings
 from django.core.exceptions import ValidationError, ImproperlyConfigured
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.postgres.fields import DateTimeRangeField, ArrayField
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 
 from jane.waveforms.utils import to_datetime
 
@@ -87,7 +89,7 @@ class ContinuousTrace(models.Model):
     timerange = DateTimeRangeField(verbose_name="Temporal Range (UTC)",
                                    db_index=True)
     duration = models.FloatField('Duration (s)', db_index=True, default=0)
-    sampling_rate = models.FloatField(default=1)
+    sampling_rate = models.FloatField(default=1, db_index=True)
     npts = models.IntegerField(verbose_name="Samples", default=0)
     preview_trace = ArrayField(base_field=models.FloatField(), blank=True,
                                null=True)
@@ -180,9 +182,93 @@ class ContinuousTrace(models.Model):
             row.save()
             count += 1
 
+        ContinuousTraceValue.objects.rebuild()
         return count
 
 
+class ContinuousTraceValueManager(models.Manager):
+    def add(self, traces):
+        """
+        Add the values of some traces that are not yet known.
+
+        :param traces: List of ContinuousTrace objects.
+        """
+        values = set(
+            (field, str(getattr(trace, field)))
+            for trace in traces
+            for field in ContinuousTraceValue.FIELDS
+            if getattr(trace, field) is not None)
+        if not values:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany("""
+                INSERT INTO waveforms_continuoustracevalue (field, value)
+                VALUES (%s, %s)
+                ON CONFLICT (field, value) DO NOTHING
+            """, sorted(values))
+
+    def prune(self):
+        """
+        Remove the values no trace has any more. Every check is a lookup in
+        the index of the column.
+        """
+        stale = [
+            pk for pk, field, value in
+            self.values_list("pk", "field", "value").iterator()
+            if not ContinuousTrace.objects.filter(
+                **{field: value}).exists()]
+        self.filter(pk__in=stale).delete()
+        return len(stale)
+
+    def rebuild(self):
+        """
+        Collect the values of all traces from scratch. Scans the whole
+        table.
+        """
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([
+                ContinuousTraceValue(field=field, value=str(value))
+                for field in ContinuousTraceValue.FIELDS
+                for value in ContinuousTrace.objects.order_by()
+                .values_list(field, flat=True).distinct()
+                if value is not None], batch_size=1000)
+
+    def get_values(self, field):
+        """
+        Sorted distinct values of a column of the traces.
+
+        :param field: The name of the column.
+        """
+        to_python = ContinuousTrace._meta.get_field(field).to_python
+        return sorted(self.filter(field=field).values_list(
+            "value", flat=True), key=to_python)
+
+
+class ContinuousTraceValue(models.Model):
+    """
+    Distinct value of a column of the continuous traces. Caches the choices
+    of the admin filters which would otherwise scan the whole trace table.
+
+    The waveform indexer adds the values of every file it indexes and prunes
+    those of deleted traces after each pass over the waveform directories.
+    """
+    FIELDS = ("network", "station", "location", "channel", "sampling_rate",
+              "quality")
+
+    field = models.CharField(max_length=20)
+    value = models.CharField(max_length=255)
+
+    objects = ContinuousTraceValueManager()
+
+    class Meta:
+        ordering = ['field', 'value']
+        unique_together = ['field', 'value']
+
+    def __str__(self):
+        return "%s: %s" % (self.field, self.value)
+
+
 class Mapping(models.Model):
     timerange = DateTimeRangeField(verbose_name="Temporal Range (UTC)",
                                    db_index=True)
@@ -251,3 +337,16 @@ class Restriction(models.Model):
         self.network = self.network.upper().strip()
         self.station = self.station.upper().strip()
         super(Restriction, self).save(*args, **kwargs)
+
+
+@receiver([post_save, post_delete], sender=Restriction)
+@receiver(m2m_changed, sender=Restriction.users.through)
+def restrictions_changed(sender, **kwargs):  # @UnusedVariable
+    """
+    The restrictions also apply to documents, e.g. to the stations of the
+    StationXML documents, thus data cached for them is outdated.
+    """
+    if kwargs.get("action", "post_").startswith("post_"):
+        # Avoid circular imports.
+        from jane.documents.models import DocumentType
+        DocumentType.bump_data_version()
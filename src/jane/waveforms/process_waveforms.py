@@ -161,6 +161,9 @@ def process_file(filename):
                     "preview_trace": preview_trace,
                     "pos": pos}
 
+        # The saved traces for the cached values of the admin filters.
+        saved = []
+
         # Get all existing traces.
         for tr_db in models.ContinuousTrace.objects.filter(file=file):
             # Attempt to get the existing trace object.
@@ -183,6 +186,7 @@ def process_file(filename):
                 tr_db.preview_trace = tr["preview_trace"]
                 tr_db.pos = tr["pos"]
                 tr_db.save()
+                saved.append(tr_db)
 
             # If it does not exist in the waveform file, delete it here as
             # it is (for whatever reason) no longer in the file..
@@ -207,3 +211,6 @@ def process_file(filename):
             tr_db.preview_trace = tr["preview_trace"]
             tr_db.pos = tr["pos"]
             tr_db.save()
+            saved.append(tr_db)
+
+        models.ContinuousTraceValue.objects.add(saved)
@@ -3,6 +3,7 @@
 import datetime
 import os
 
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.test.testcases import TestCase
 from psycopg2._range import DateTimeTZRange
@@ -125,6 +126,51 @@ class CoreTestCase(TestCase):
         self.assertEqual(expected_ids, ids)
         delete_indexed_waveforms()
 
+    def test_cached_trace_values(self):
+        """
+        The values offered by the admin filters are cached.
+        """
+        filename = os.path.join(os.path.dirname(os.path.dirname(self.path)),
+                                "fdsnws", "tests", "data", "TA.A25A.mseed")
+        process_file(filename)
+        self.assertEqual(
+            models.ContinuousTraceValue.objects.get_values("network"), ["TA"])
+        channels = models.ContinuousTraceValue.objects.get_values("channel")
+        self.assertEqual(channels, sorted(set(
+            models.ContinuousTrace.objects.values_list(
+                "channel", flat=True))))
+        rates = models.ContinuousTraceValue.objects.get_values(
+            "sampling_rate")
+        self.assertEqual(sorted(rates, key=float), rates)
+
+        # Rebuilding does not change anything.
+        values = sorted(models.ContinuousTraceValue.objects.values_list(
+            "field", "value"))
+        models.ContinuousTraceValue.objects.rebuild()
+        self.assertEqual(sorted(models.ContinuousTraceValue.objects
+                                .values_list("field", "value")), values)
+
+        # Values of deleted traces are pruned.
+        models.ContinuousTrace.objects.filter(channel="BHE").delete()
+        self.assertEqual(models.ContinuousTraceValue.objects.prune(), 1)
+        self.assertNotIn(
+            "BHE", models.ContinuousTraceValue.objects.get_values("channel"))
+
+        # The admin changelist uses them.
+        user = User.objects.create_superuser("admin", "admin@example.com",
+                                             "admin")
+        self.client.force_login(user)
+        r = self.client.get("/admin/waveforms/continuoustrace/")
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, "?channel=BHN")
+        self.assertNotContains(r, "?channel=BHE")
+        r = self.client.get("/admin/waveforms/file/")
+        self.assertEqual(r.status_code, 200)
+        file = models.File.objects.get()
+        r = self.client.get("/admin/waveforms/file/%i/change/" % file.pk)
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, "TA.A25A..BHN")
+
     def test_creation_of_mappings(self):
         # First create two compatible ones.
         models.Mapping(
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 import os
 
+from django.db.models import F
 from rest_framework import viewsets, renderers, filters
 from rest_framework.response import Response
 from rest_framework.decorators import detail_route
 
+from jane.jane.pagination import KeysetPagination
 from jane.waveforms import models, serializer
 
 
@@ -47,6 +49,18 @@ class WaveformView(viewsets.ReadOnlyModelViewSet):
     serializer_class = serializer.WaveformSerializer
     filter_backends = (filters.OrderingFilter,)
     ordering_fields = '__all__'
+    pagination_class = KeysetPagination
+
+    def get_keyset_ordering(self):
+        """
+        The traces are paginated by the first field given with ``ordering``.
+        """
+        ordering = filters.OrderingFilter().get_ordering(
+            self.request, self.get_queryset(), self)
+        if not ordering:
+            return None
+        field = ordering[0]
+        return F(field.lstrip("-")), field.startswith("-")
 
     @detail_route(renderer_classes=[PNGRenderer])
     def plot(self, request, *args, **kwargs):